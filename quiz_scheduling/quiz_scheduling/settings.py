@@ -111,6 +111,9 @@ DATABASES = {
     }
 }
 
+# MySQL skips partial indexes (used on SQLite/PostgreSQL only, see Vote.Meta)
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -207,15 +210,30 @@ SIMPLE_JWT = {
 }
 
 
+# Shared cache: notification unread counters and password reset tokens must
+# be visible to every web and django-q worker process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
 Q_CLUSTER = {
     'name': 'quiz_scheduling',
     'workers': 4,
     'recycle': 500,
     'timeout': 60,
+    # Re-run tasks of crashed workers; must be longer than timeout.
+    # Notification fan-out jobs are safe to run twice.
+    'retry': 120,
     'compress': True,
     'save_limit': 250,
     'queue_limit': 500,
     'cpu_affinity': 1,
+    # Workers start the tabula parser pool (services/tabula_pool.py), and
+    # daemonic processes may not have children
+    'daemonize_workers': False,
     'label': 'Django Q',
     'redis': {
         'host': '127.0.0.1',
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, Period, Course, Schedule, Vote, 
-    VoteOption, StudentVote, Notification, OTPCode
+    VoteOption, StudentVote, Notification, OTPCode, Broadcast,
+    OutboundEmail, UploadJob, ParsedSchedule
 )
 
 class CustomUserAdmin(UserAdmin):
@@ -18,4 +19,15 @@ admin.site.register(Vote)
 admin.site.register(VoteOption)
 admin.site.register(StudentVote)
 admin.site.register(Notification)
-admin.site.register(OTPCode)
\ No newline at end of file
+admin.site.register(Broadcast)
+admin.site.register(OTPCode)
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    # Bodies of pending emails may hold OTP and password reset codes
+    exclude = ('body',)
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+admin.site.register(UploadJob)
+admin.site.register(ParsedSchedule)
\ No newline at end of file
@@ -0,0 +1,64 @@
+# quiz_scheduling_app/events.py
+
+"""
+Domain events.
+
+Views, tasks and signals publish what happened (a vote was created, a vote
+was completed) instead of sending notifications themselves. Events are
+collected in the current transaction and dispatched once it commits
+(right away when there is no transaction), so a rolled back request never
+notifies anyone.
+
+Each event is dispatched exactly once:
+- publishing the same event twice in one transaction dispatches it once
+- handlers store a unique event key (Broadcast.event_key), so an event
+  published again later, e.g. by a retried task, is ignored
+"""
+
+import logging
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+VOTE_CREATED = 'vote_created'
+VOTE_COMPLETED = 'vote_completed'
+
+_handlers = {}
+
+
+def subscribe(event_type):
+    """Register a handler, called with the event payload as keyword arguments"""
+    def register(handler):
+        _handlers.setdefault(event_type, []).append(handler)
+        return handler
+    return register
+
+
+def event_key(event_type, **payload):
+    """Stable identity of an event, e.g. 'vote_created:vote_id=12'"""
+    values = ','.join(f"{name}={value}" for name, value in sorted(payload.items()))
+    return f"{event_type}:{values}"
+
+
+def publish(event_type, **payload):
+    key = event_key(event_type, **payload)
+
+    # Every publish registers its own callback, so Django still discards
+    # the ones of rolled back savepoints; the first callback that runs
+    # takes the key out of the queued set and the others skip it
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'queued_event_keys'):
+        connection.queued_event_keys = set()
+    connection.queued_event_keys.add(key)
+
+    def dispatch():
+        if key not in connection.queued_event_keys:
+            return
+        connection.queued_event_keys.discard(key)
+        for handler in _handlers.get(event_type, []):
+            try:
+                handler(event_key=key, **payload)
+            except Exception as e:
+                logger.error(f"Handler {handler.__name__} failed for {key}: {str(e)}", exc_info=True)
+
+    transaction.on_commit(dispatch)
@@ -0,0 +1,142 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from quiz_scheduling_app.models import Course, Notification, ProfessorAnnouncement, Section, User
+from quiz_scheduling_app.services.notification_service import NotificationService
+
+
+def legacy_announcement(section, professor, title, message):
+    """The original one-INSERT-per-student loop, kept only as a baseline"""
+    with transaction.atomic():
+        announcement = ProfessorAnnouncement.objects.create(
+            professor=professor,
+            section=section,
+            title=title,
+            message=message
+        )
+        for student in section.students.all():
+            Notification.objects.create(
+                recipient=student,
+                sender=professor,
+                notification_type='announcement',
+                title=title,
+                message=message,
+                section=section,
+                announcement_id=announcement.id
+            )
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark announcement fan-out (request latency and background delivery) '
+        'against the original per-student INSERT loop on synthetic sections'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 400, 2000, 10000])
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[200, 1000])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--legacy-limit', type=int, default=2000,
+            help='Skip the original loop for sections larger than this'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'students':>9} {'pipeline':>12} {'ms':>10} {'queries':>8}")
+
+        for size in options['sizes']:
+            # All synthetic rows are rolled back once the size is measured
+            try:
+                with transaction.atomic():
+                    section, professor = self._build_section(size)
+                    rows = self._measure(section, professor, size, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            for row in rows:
+                self.stdout.write(row)
+
+    def _measure(self, section, professor, size, options):
+        # What the professor waits for: the announcement and broadcast rows.
+        # Delivery jobs are queued on commit, which never comes here.
+        ms, queries = self._time(
+            lambda: NotificationService.create_announcement(
+                section, professor, 'Benchmark', 'Benchmark message'
+            ),
+            options['repeat']
+        )
+        rows = [f"{size:>9} {'request':>12} {ms:>10.2f} {queries:>8}"]
+
+        # What the workers do: every chunk job, run inline
+        for batch_size in options['batch_sizes']:
+            ms, queries = self._time(
+                lambda: self._deliver(section, professor, batch_size),
+                options['repeat']
+            )
+            rows.append(f"{size:>9} {f'batch {batch_size}':>12} {ms:>10.2f} {queries:>8}")
+
+        if size <= options['legacy_limit']:
+            ms, queries = self._time(
+                lambda: legacy_announcement(section, professor, 'Benchmark', 'Benchmark message'),
+                1
+            )
+            rows.append(f"{size:>9} {'legacy':>12} {ms:>10.2f} {queries:>8}")
+        else:
+            rows.append(f"{size:>9} {'legacy':>12} {'skipped':>10} {'-':>8}")
+        return rows
+
+    def _deliver(self, section, professor, batch_size):
+        broadcast = NotificationService.create_announcement(
+            section, professor, 'Benchmark', 'Benchmark message'
+        )
+        after_student_id = 0
+        while after_student_id is not None:
+            after_student_id = NotificationService.deliver_chunk(broadcast.id, after_student_id, batch_size)
+
+    def _time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), len(queries)
+
+    def _build_section(self, size):
+        tag = f"fanout{size}"
+        professor = User.objects.create(
+            university_id=f"{tag}-prof",
+            username=f"{tag}-prof",
+            email=f"{tag}-prof@example.com",
+            user_type='faculty',
+            phone=''
+        )
+        # Course codes are at most 10 characters
+        course = Course.objects.create(code=f"FO{size}", name='Benchmark course')
+        section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=professor
+        )
+
+        students = User.objects.bulk_create([
+            User(
+                university_id=f"{tag}-{i}",
+                username=f"{tag}-{i}",
+                email=f"{tag}-{i}@example.com",
+                user_type='student',
+                phone=''
+            )
+            for i in range(size)
+        ])
+        Enrollment = Section.students.through
+        Enrollment.objects.bulk_create(
+            [Enrollment(section_id=section.id, user_id=student.id) for student in students],
+            batch_size=5000
+        )
+        return section, professor
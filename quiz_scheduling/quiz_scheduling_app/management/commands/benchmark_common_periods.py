@@ -0,0 +1,171 @@
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from quiz_scheduling_app.models import Course, Period, Quiz, Schedule, Section, User
+from quiz_scheduling_app.services.busy_slot_service import BusySlotService
+from quiz_scheduling_app.services.common_time_service import CommonTimeService
+
+
+def legacy_available_periods(section_id, date):
+    """The original per-student, per-period loop, kept only as a baseline"""
+    section = Section.objects.get(id=section_id)
+    students = section.students.all()
+    day_of_week = date.strftime('%A').lower()
+    periods = Period.objects.filter(number__lte=15).order_by('number')
+
+    students_with_two_quizzes = Quiz.objects.filter(
+        date=date,
+        section__students__in=students
+    ).values('section__students').annotate(
+        quiz_count=Count('id')
+    ).filter(quiz_count__gte=2)
+
+    if students_with_two_quizzes.exists():
+        return {"status": "success", "data": []}
+
+    available_periods = []
+    for period in periods:
+        is_available = True
+        for student in students:
+            has_class = Schedule.objects.filter(
+                section__students=student,
+                day=day_of_week,
+                period=period
+            ).exists()
+            has_quiz = Quiz.objects.filter(
+                section__students=student,
+                date=date,
+                period=period
+            ).exists()
+            if has_class or has_quiz:
+                is_available = False
+                break
+
+        if is_available:
+            available_periods.append({
+                'period_number': period.number,
+                'start_time': period.start_time.strftime('%H:%M'),
+                'end_time': period.end_time.strftime('%H:%M'),
+                'is_online': period.number >= 9,
+            })
+
+    return {"status": "success", "data": available_periods}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the common periods lookup against the original per-student loop on synthetic rosters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[50, 500, 5000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--legacy-limit', type=int, default=None,
+            help='Skip the original loop for rosters larger than this'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.stdout.write(f"{'students':>9} {'engine ms':>10} {'queries':>8} {'legacy ms':>10} {'queries':>8} {'same':>5}")
+
+        for size in options['sizes']:
+            # All synthetic rows are rolled back once the size is measured
+            try:
+                with transaction.atomic():
+                    section, quiz_date = self._build_roster(size)
+                    row = self._measure(section.id, quiz_date, size, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(row)
+
+    def _measure(self, section_id, quiz_date, size, options):
+        engine_ms, engine_queries, engine_result = self._time(
+            CommonTimeService.get_available_periods, section_id, quiz_date, options['repeat']
+        )
+
+        legacy_limit = options['legacy_limit']
+        if legacy_limit is not None and size > legacy_limit:
+            return f"{size:>9} {engine_ms:>10.2f} {engine_queries:>8} {'skipped':>10} {'-':>8} {'-':>5}"
+
+        legacy_ms, legacy_queries, legacy_result = self._time(
+            legacy_available_periods, section_id, quiz_date, 1
+        )
+        same = 'yes' if legacy_result == engine_result else 'NO'
+        return (f"{size:>9} {engine_ms:>10.2f} {engine_queries:>8} "
+                f"{legacy_ms:>10.2f} {legacy_queries:>8} {same:>5}")
+
+    def _time(self, func, section_id, quiz_date, repeat):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                result = func(section_id, quiz_date)
+                timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), len(queries), result
+
+    def _build_roster(self, size):
+        tag = f"bench{size}"
+        periods = {}
+        for number in range(1, 16):
+            periods[number], _ = Period.objects.get_or_create(
+                number=number,
+                defaults={
+                    'start_time': dtime(7 + (number - 1) % 15),
+                    'end_time': dtime(7 + (number - 1) % 15, 50),
+                    'is_online': number >= 9
+                }
+            )
+
+        course = Course.objects.create(code=tag.upper(), name='Benchmark course')
+        target = Section.objects.create(course=course, section_number='1', activity_type='Lecture')
+        # A pool of other sections students are also enrolled in
+        pool = Section.objects.bulk_create([
+            Section(course=course, section_number=str(i), activity_type='Lab')
+            for i in range(2, 42)
+        ])
+
+        days = [choice[0] for choice in Schedule.DAYS_OF_WEEK]
+        schedules = []
+        for section in pool:
+            for day in random.sample(days, 2):
+                schedules.append(Schedule(section=section, day=day, period=periods[random.randint(1, 8)]))
+        Schedule.objects.bulk_create(schedules, ignore_conflicts=True)
+
+        students = User.objects.bulk_create([
+            User(
+                university_id=f"{tag}-{i}",
+                username=f"{tag}-{i}",
+                email=f"{tag}-{i}@example.com",
+                user_type='student',
+                phone=''
+            )
+            for i in range(size)
+        ])
+
+        Enrollment = Section.students.through
+        enrollments = [Enrollment(section_id=target.id, user_id=student.id) for student in students]
+        for student in students:
+            for section in random.sample(pool, 5):
+                enrollments.append(Enrollment(section_id=section.id, user_id=student.id))
+        Enrollment.objects.bulk_create(enrollments, batch_size=5000)
+
+        # Next Sunday, with one existing quiz in the pool
+        quiz_date = date.today() + timedelta(days=(6 - date.today().weekday()) % 7 or 7)
+        Quiz.objects.create(section=pool[0], date=quiz_date, period=periods[10], room='B1')
+
+        # Bulk inserts skip the signals that maintain busy slots
+        BusySlotService.rebuild([target.id] + [section.id for section in pool])
+
+        return target, quiz_date
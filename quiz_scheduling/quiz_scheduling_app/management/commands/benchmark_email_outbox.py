@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from quiz_scheduling_app.models import OutboundEmail
+from quiz_scheduling_app.services.email_service import EmailService
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the email outbox (one SMTP connection per batch) against one '
+        'send_mail call per email. Point it at a local SMTP stand-in, e.g. '
+        '`python -m aiosmtpd -n -l localhost:1025` with --host localhost --port 1025, '
+        'or use --locmem to leave the network out entirely.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[20, 100])
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--locmem', action='store_true', help='Use the in-memory email backend')
+
+    def handle(self, *args, **options):
+        if options['locmem']:
+            email_settings = {'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend'}
+        else:
+            email_settings = {
+                'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+                'EMAIL_HOST': options['host'],
+                'EMAIL_PORT': options['port'],
+                'EMAIL_USE_TLS': False,
+                'EMAIL_HOST_USER': '',
+                'EMAIL_HOST_PASSWORD': '',
+            }
+
+        count = options['count']
+        self.stdout.write(f"{'pipeline':>12} {'emails':>7} {'ms':>10} {'emails/s':>10}")
+        with override_settings(**email_settings):
+            ms = self._time(lambda: self._send_directly(count))
+            self._report('send_mail', count, ms)
+
+            for batch_size in options['batch_sizes']:
+                # Outbox rows are rolled back once they are sent
+                try:
+                    with transaction.atomic():
+                        ms = self._time(lambda: self._send_outbox(count, batch_size))
+                        raise Rollback
+                except Rollback:
+                    pass
+                self._report(f'outbox {batch_size}', count, ms)
+
+    def _send_directly(self, count):
+        for i in range(count):
+            send_mail('Benchmark', f'Message {i}', settings.EMAIL_HOST_USER, [f'bench{i}@example.com'])
+
+    def _send_outbox(self, count, batch_size):
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(to_email=f'bench{i}@example.com', subject='Benchmark', body=f'Message {i}')
+            for i in range(count)
+        ])
+        sent = 0
+        while True:
+            emails = EmailService.claim_batch(batch_size)
+            if not emails:
+                break
+            sent += EmailService.send_batch(emails)
+        if sent != count:
+            self.stderr.write(f'Only {sent} of {count} emails were sent')
+
+    def _time(self, func):
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+    def _report(self, pipeline, count, ms):
+        rate = count / (ms / 1000) if ms else 0.0
+        self.stdout.write(f"{pipeline:>12} {count:>7} {ms:>10.2f} {rate:>10.1f}")
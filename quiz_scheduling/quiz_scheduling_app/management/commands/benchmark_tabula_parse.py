@@ -0,0 +1,63 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_scheduling_app.services.tabula_pool import TabulaPool, read_tables
+
+PARSE_OPTIONS = {'pages': 'all', 'multiple_tables': True, 'lattice': True}
+
+
+def percentile(timings, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(timings)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark schedule PDF parse latency (p50/p95) with a cold parser process '
+        'per upload against a warm tabula pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdf', help='Schedule PDF to parse')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--pool-size', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['pdf'], 'rb') as pdf_file:
+                file_bytes = pdf_file.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        runs = options['runs']
+        self.stdout.write(f"{'mode':>6} {'runs':>5} {'p50 ms':>10} {'p95 ms':>10}")
+
+        # Cold: a fresh process and JVM for every parse
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            executor = TabulaPool.create_executor(size=1, warm=False)
+            executor.submit(read_tables, file_bytes, PARSE_OPTIONS).result()
+            timings.append((time.perf_counter() - start) * 1000)
+            executor.shutdown()
+        self._report('cold', timings)
+
+        # Warm: the pool is started and warmed up before timing
+        executor = TabulaPool.create_executor(size=options['pool_size'], warm=True)
+        try:
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                executor.submit(read_tables, file_bytes, PARSE_OPTIONS).result()
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            executor.shutdown()
+        self._report('warm', timings)
+
+    def _report(self, mode, timings):
+        self.stdout.write(
+            f"{mode:>6} {len(timings):>5} {percentile(timings, 0.5):>10.2f} {percentile(timings, 0.95):>10.2f}"
+        )
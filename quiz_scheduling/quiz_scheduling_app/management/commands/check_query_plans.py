@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from quiz_scheduling_app.models import Notification, Quiz, Schedule, Section, StudentBusySlot, Vote
+from quiz_scheduling_app.services.availability_service import AvailabilityService
+from quiz_scheduling_app.services.digest_service import DigestService
+
+
+def hot_queries():
+    """
+    (name, table that must be read through an index, queryset) for every
+    conflict / availability / expiry / feed / digest query on the hot paths. Placeholder ids are
+    fine: only the plan matters, not the result.
+    """
+    today = date.today()
+    roster = Section.students.through.objects.filter(section_id=1).values('user_id')
+
+    return [
+        (
+            'quiz by date and period',
+            Quiz._meta.db_table,
+            Quiz.objects.filter(date=today, period_id=1),
+        ),
+        (
+            'quiz conflicts of a roster',
+            StudentBusySlot._meta.db_table,
+            Vote.busy_quiz_rows(roster, [today], [1], conflicts_only=True),
+        ),
+        (
+            'weekly busy slots of a section',
+            StudentBusySlot._meta.db_table,
+            AvailabilityService.weekly_busy_rows(1, ['sunday']),
+        ),
+        (
+            'occupied weekly slots of a section',
+            StudentBusySlot._meta.db_table,
+            AvailabilityService.occupied_weekly_rows(1),
+        ),
+        (
+            'quiz busy slots of a section',
+            StudentBusySlot._meta.db_table,
+            AvailabilityService.quiz_busy_rows(1, today, today + timedelta(days=7)),
+        ),
+        (
+            'schedule by section, day and period',
+            Schedule._meta.db_table,
+            Schedule.objects.filter(section_id=1, day='sunday', period_id=1),
+        ),
+        (
+            'expired active votes',
+            Vote._meta.db_table,
+            Vote.objects.filter(is_active=True, ends_at__lte=timezone.now()),
+        ),
+        (
+            'next vote deadline',
+            Vote._meta.db_table,
+            Vote.objects.filter(is_active=True, ends_at__isnull=False).order_by('ends_at')[:1],
+        ),
+        (
+            'unread notifications of a user',
+            Notification._meta.db_table,
+            Notification.objects.filter(recipient_id=1, is_read=False).order_by('-created_at'),
+        ),
+        (
+            'notifications feed page',
+            Notification._meta.db_table,
+            Notification.objects.filter(
+                Q(created_at__lt=timezone.now()) | Q(created_at=timezone.now(), id__lt=1),
+                recipient_id=1
+            ).order_by('-created_at', '-id')[:21],
+        ),
+        (
+            'users due a digest',
+            Notification._meta.db_table,
+            DigestService.due(timezone.now()),
+        ),
+    ]
+
+
+def full_scans(queryset, table):
+    """Plan lines showing a full scan of `table`, for the current database vendor"""
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [
+                f"{row['table']}: type=ALL"
+                for row in rows
+                if row.get('type') == 'ALL' and row.get('table') == table
+            ]
+
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            return [
+                detail for detail in details
+                if detail.startswith(f'SCAN {table}') and 'USING' not in detail
+            ]
+
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [
+                row[0].strip() for row in cursor.fetchall()
+                if f'Seq Scan on {table}' in row[0]
+            ]
+
+    raise CommandError(f"EXPLAIN checks are not supported for {connection.vendor}")
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the hot conflict, expiry and notification queries and fail '
+        'if any of them falls back to a full table scan. Run it against a database '
+        'with realistic data: optimizers may pick full scans on nearly empty tables.'
+    )
+
+    def handle(self, *args, **options):
+        regressions = []
+
+        for name, table, queryset in hot_queries():
+            scans = full_scans(queryset, table)
+            if scans:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}"))
+                for line in scans:
+                    self.stdout.write(f"           {line}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK         {name}"))
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} hot queries fall back to a full scan: {', '.join(regressions)}"
+            )
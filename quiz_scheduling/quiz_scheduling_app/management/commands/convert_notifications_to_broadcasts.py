@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from quiz_scheduling_app.models import Broadcast, Notification
+
+# Notification types that are sent to a whole section
+BROADCAST_TYPES = ('announcement', 'vote_created', 'vote_completed')
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert notifications that carry their own copy of the title and message '
+        'into Broadcast rows with per-recipient receipts. Safe to run again: only '
+        'rows without a broadcast are converted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Notifications converted per transaction'
+        )
+        parser.add_argument(
+            '--gap-seconds', type=int, default=60,
+            help='Longest pause between two rows of the same fan-out'
+        )
+
+    @staticmethod
+    def content_key(notification):
+        return (
+            notification.sender_id,
+            notification.notification_type,
+            notification.section_id,
+            notification.vote_id,
+            notification.announcement_id,
+            notification.title,
+            notification.message,
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        gap = timedelta(seconds=options['gap_seconds'])
+        # Fan-out still open per content key: rows of one fan-out share their
+        # content and follow each other within the gap, so a group only ends
+        # when the next row with that content comes later than that
+        open_groups = {}
+        converted = 0
+        created = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                Notification.objects.filter(
+                    broadcast__isnull=True,
+                    notification_type__in=BROADCAST_TYPES,
+                    id__gt=last_id
+                ).order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            members = {}
+            for notification in batch:
+                key = self.content_key(notification)
+                group = open_groups.get(key)
+                if group is None or abs(notification.created_at - group['last_created_at']) > gap:
+                    group = open_groups[key] = {'broadcast_id': None, 'first': notification}
+                group['last_created_at'] = notification.created_at
+                members.setdefault(id(group), (group, []))[1].append(notification)
+
+            with transaction.atomic():
+                for group, notifications in members.values():
+                    if group['broadcast_id'] is None:
+                        first = group['first']
+                        broadcast = Broadcast.objects.create(
+                            sender_id=first.sender_id,
+                            notification_type=first.notification_type,
+                            title=first.title,
+                            message=first.message,
+                            section_id=first.section_id,
+                            vote_id=first.vote_id,
+                            announcement_id=first.announcement_id,
+                            delivery_status='delivered',
+                            completed_at=first.created_at
+                        )
+                        # created_at is auto_now_add, keep the original time
+                        Broadcast.objects.filter(id=broadcast.id).update(created_at=first.created_at)
+                        group['broadcast_id'] = broadcast.id
+                        created += 1
+
+                    Broadcast.objects.filter(id=group['broadcast_id']).update(
+                        recipient_count=F('recipient_count') + len(notifications),
+                        delivered_count=F('delivered_count') + len(notifications)
+                    )
+                    Notification.objects.filter(
+                        id__in=[notification.id for notification in notifications]
+                    ).update(broadcast_id=group['broadcast_id'], title='', message='')
+
+            # Only fan-outs the next batch can still extend are kept
+            horizon = batch[-1].created_at - gap
+            open_groups = {
+                key: group for key, group in open_groups.items() if group['last_created_at'] >= horizon
+            }
+
+            converted += len(batch)
+            self.stdout.write(f'Converted {converted} notifications')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully converted {converted} notifications into {created} broadcasts'
+            )
+        )
@@ -0,0 +1,244 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quiz_scheduling_app.models import Schedule, User
+from quiz_scheduling_app.services.busy_slot_service import BusySlotService
+from quiz_scheduling_app.services.schedule_importer import ScheduleImporter
+
+DAYS = {value for value, _ in Schedule.DAYS_OF_WEEK}
+DAY_ABBREVIATIONS = {value[:3]: value for value in DAYS}
+
+# Longest values the columns accept
+MAX_LENGTHS = {'course_code': 10, 'course_name': 100, 'section_number': 10, 'activity_type': 50}
+
+# Rejected rows printed in full; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_schedule(value):
+    """
+    {'sunday': [1, 3]} from either a JSON object or the CSV form
+    'Sunday:1,3;Tue:2'. Empty values mean the section has no classes.
+    """
+    if not value:
+        return {}
+    if isinstance(value, str):
+        pairs = []
+        for part in value.split(';'):
+            if not part.strip():
+                continue
+            day, _, numbers = part.partition(':')
+            pairs.append((day, [n for n in numbers.split(',') if n.strip()]))
+    elif isinstance(value, dict):
+        pairs = value.items()
+    else:
+        raise RowError(f"Invalid schedule: {value!r}")
+
+    schedule = {}
+    for day, numbers in pairs:
+        day = str(day).strip().lower()
+        day = DAY_ABBREVIATIONS.get(day, day)
+        if day not in DAYS:
+            raise RowError(f"Unknown day: {day!r}")
+        try:
+            schedule.setdefault(day, []).extend(int(str(n).strip()) for n in numbers)
+        except ValueError:
+            raise RowError(f"Invalid period numbers for {day}: {numbers!r}")
+    return schedule
+
+
+def validate_row(row, period_ids):
+    """Clean copy of a registrar row, or RowError"""
+    cleaned = {}
+    for field in MAX_LENGTHS:
+        value = str(row.get(field) or '').strip()
+        if not value:
+            raise RowError(f"Missing {field}")
+        if len(value) > MAX_LENGTHS[field]:
+            raise RowError(f"{field} longer than {MAX_LENGTHS[field]} characters: {value!r}")
+        cleaned[field] = value
+    cleaned['student_id'] = str(row.get('student_id') or '').strip()
+    cleaned['professor_id'] = str(row.get('professor_id') or '').strip()
+    cleaned['schedule'] = parse_schedule(row.get('schedule'))
+    for day, numbers in cleaned['schedule'].items():
+        unknown = [n for n in numbers if n not in period_ids]
+        if unknown:
+            raise RowError(f"Unknown period numbers for {day}: {unknown}")
+    return cleaned
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a registrar export of courses, sections, schedules and enrollments. '
+        'One row per enrollment: student_id, course_code, course_name, section_number, '
+        'activity_type, professor_id (optional) and schedule ("Sunday:1,3;Tuesday:2", quoted in CSV); '
+        'rows without a student_id only define a section. Reads CSV or JSON Lines.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Registrar export (.csv, or .jsonl with one object per line)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows written per transaction')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument(
+            '--skip-busy-slots', action='store_true',
+            help='Leave busy slots for a later rebuild_busy_slots run'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        source = {'size': os.path.getsize(path), 'mtime': int(os.path.getmtime(path))}
+        state = {'source': source, 'rows': 0, 'imported': 0, 'rejected': 0, 'unknown_students': 0, 'section_ids': []}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state['source'] != source:
+                raise CommandError(
+                    f"{path} changed since the checkpoint was written; use --restart to import it from the start"
+                )
+            self.stdout.write(f"Resuming after row {state['rows']}")
+
+        if ScheduleImporter.period_ids_by_number() == {}:
+            raise CommandError("No periods found; run initialize_periods first")
+
+        self.course_ids = {}
+        self.section_ids = {}
+        section_ids = set(state['section_ids'])
+        start = time.perf_counter()
+
+        with open(path, newline='', encoding='utf-8-sig') as source_file:
+            rows = self._read(source_file, file_format)
+            # Rows up to the checkpoint are read again but not written
+            for _ in range(state['rows']):
+                if next(rows, None) is None:
+                    break
+
+            chunk = []
+            for line_number, row in rows:
+                chunk.append((line_number, row))
+                if len(chunk) == chunk_size:
+                    self._load_chunk(chunk, state, section_ids, checkpoint_path)
+                    chunk = []
+            if chunk:
+                self._load_chunk(chunk, state, section_ids, checkpoint_path)
+
+        if not options['skip_busy_slots']:
+            self.stdout.write(f"Rebuilding busy slots of {len(section_ids)} sections")
+            BusySlotService.rebuild(section_ids)
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['imported']} of {state['rows']} rows in {time.perf_counter() - start:.1f}s: "
+            f"{state['rejected']} rejected, {state['unknown_students']} with an unregistered student"
+        ))
+
+    def _read(self, source_file, file_format):
+        """(line number, row) pairs, one at a time"""
+        if file_format == 'csv':
+            reader = csv.DictReader(source_file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(source_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = RowError(f"Invalid JSON: {e}")
+            yield line_number, row
+
+    def _load_chunk(self, chunk, state, section_ids, checkpoint_path):
+        period_ids = ScheduleImporter.period_ids_by_number()
+        rows = []
+        for line_number, row in chunk:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                if not isinstance(row, dict):
+                    raise RowError("Row is not an object")
+                rows.append(validate_row(row, period_ids))
+            except RowError as e:
+                state['rejected'] += 1
+                if state['rejected'] <= MAX_REPORTED_ERRORS:
+                    self.stderr.write(f"Line {line_number}: {e}")
+
+        with transaction.atomic():
+            self._write(rows, state, section_ids, period_ids)
+        state['rows'] += len(chunk)
+        state['section_ids'] = sorted(section_ids)
+        self._save_checkpoint(checkpoint_path, state)
+        self.stdout.write(f"{state['rows']} rows read, {state['imported']} imported")
+
+    def _write(self, rows, state, section_ids, period_ids):
+        university_ids = {row['student_id'] for row in rows if row['student_id']}
+        student_ids = dict(User.objects.filter(
+            university_id__in=university_ids, user_type='student'
+        ).values_list('university_id', 'id'))
+        professor_ids = dict(User.objects.filter(
+            university_id__in={row['professor_id'] for row in rows if row['professor_id']}, user_type='faculty'
+        ).values_list('university_id', 'id'))
+
+        # Courses and sections already seen by this run are not looked up again
+        new_courses = {
+            row['course_code']: row['course_name'] for row in rows if row['course_code'] not in self.course_ids
+        }
+        if new_courses:
+            self.course_ids.update(ScheduleImporter.upsert_courses(new_courses))
+
+        keys = [
+            (self.course_ids[row['course_code']], row['section_number'], row['activity_type'])
+            for row in rows
+        ]
+        assigned = {
+            key: professor_ids[row['professor_id']]
+            for row, key in zip(rows, keys) if row['professor_id'] in professor_ids
+        }
+        new_keys = [key for key in keys if key not in self.section_ids or key in assigned]
+        if new_keys:
+            self.section_ids.update(ScheduleImporter.upsert_sections(new_keys, assigned))
+
+        slots = set()
+        enrollments = set()
+        for row, key in zip(rows, keys):
+            section_id = self.section_ids[key]
+            section_ids.add(section_id)
+            for day, numbers in row['schedule'].items():
+                for number in numbers:
+                    slots.add((section_id, day, period_ids[number]))
+            if row['student_id']:
+                if row['student_id'] not in student_ids:
+                    state['unknown_students'] += 1
+                    continue
+                enrollments.add((section_id, student_ids[row['student_id']]))
+            state['imported'] += 1
+
+        ScheduleImporter.insert_schedules(slots)
+        ScheduleImporter.insert_enrollments(enrollments)
+
+    def _save_checkpoint(self, checkpoint_path, state):
+        # Written after the chunk commits: a crash in between replays at most
+        # one chunk, and every write skips rows that already exist
+        temporary_path = f"{checkpoint_path}.tmp"
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temporary_path, checkpoint_path)
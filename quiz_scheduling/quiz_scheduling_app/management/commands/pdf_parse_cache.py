@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from quiz_scheduling_app.models import ParsedSchedule
+from quiz_scheduling_app.services.parse_cache_service import ParseCacheService
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the parsed schedule PDF cache, or clear it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Delete every cached entry and reset the counters')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = ParsedSchedule.objects.all().delete()
+            ParseCacheService.reset_stats()
+            self.stdout.write(self.style.SUCCESS(f'Cleared {deleted} cached PDFs'))
+            return
+
+        stats = ParseCacheService.stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']} "
+            f"entries={stats['entries']}/{stats['max_entries']}"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from quiz_scheduling_app.services.busy_slot_service import BusySlotService
+
+class Command(BaseCommand):
+    help = 'Rebuild the StudentBusySlot table from enrolments, schedules and quizzes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--section', type=int, action='append', dest='sections',
+            help='Only rebuild these section ids (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = BusySlotService.rebuild(options['sections'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt busy slots ({written} rows)')
+        )
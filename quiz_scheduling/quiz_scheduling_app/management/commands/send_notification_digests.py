@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django_q.models import Schedule as TaskSchedule
+from quiz_scheduling_app.services.digest_service import (
+    DIGEST_FUNC, DIGEST_SCHEDULE_NAME, NOTIFICATION_DIGEST_RUN_MINUTES, DigestService
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue email digests of unread notifications for every due user. '
+        'With --schedule, install the recurring django-q schedule that does this instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help=f'Run every NOTIFICATION_DIGEST_RUN_MINUTES ({NOTIFICATION_DIGEST_RUN_MINUTES}) minutes on the cluster'
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            TaskSchedule.objects.update_or_create(
+                name=DIGEST_SCHEDULE_NAME,
+                defaults={
+                    'func': DIGEST_FUNC,
+                    'schedule_type': TaskSchedule.MINUTES,
+                    'minutes': NOTIFICATION_DIGEST_RUN_MINUTES,
+                    'repeats': -1,
+                }
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Digests scheduled every {NOTIFICATION_DIGEST_RUN_MINUTES} minutes')
+            )
+            return
+
+        queued = DigestService.send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Successfully queued {queued} digest emails'))
@@ -1,6 +1,7 @@
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Count, Q
 
 class User(AbstractUser):
     USER_TYPES = (
@@ -80,6 +81,10 @@ class Quiz(models.Model):
 
     class Meta:
         unique_together = ['section', 'date', 'period']
+        indexes = [
+            # Conflict checks look up quizzes by date, then period
+            models.Index(fields=['date', 'period'], name='quiz_date_period_idx'),
+        ]
 
 
 # class Vote(models.Model):
@@ -105,6 +110,16 @@ class Vote(models.Model):
     ends_at = models.DateTimeField(null=True, blank=True)
     needs_room = models.BooleanField(default=False)  # Flag for automatic completion
 
+    class Meta:
+        indexes = [
+            # Expiry sweep and next-deadline lookup
+            models.Index(fields=['is_active', 'ends_at'], name='vote_active_ends_at_idx'),
+            # The same for SQLite and PostgreSQL, which write is_active=True as a
+            # bare "is_active" that SQLite cannot match to the index above.
+            # MySQL has no partial indexes and skips this one (check W037).
+            models.Index(fields=['ends_at'], condition=Q(is_active=True), name='vote_open_ends_at_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.ends_at and self.duration:
             self.ends_at = timezone.now() + timezone.timedelta(days=self.duration)
@@ -114,32 +129,145 @@ class Vote(models.Model):
     def is_expired(self):
         return self.ends_at and timezone.now() >= self.ends_at
     
+    @staticmethod
+    def busy_quiz_rows(students, dates, period_ids, conflicts_only=False):
+        """The aggregated StudentBusySlot query behind busy_quiz_days"""
+        slot_counts = {
+            f'quizzes_in_period_{period_id}': Count('quiz_id', filter=Q(period_id=period_id), distinct=True)
+            for period_id in period_ids
+        }
+        rows = StudentBusySlot.objects.filter(
+            student_id__in=students,
+            date__in=set(dates)
+        ).values(
+            'student_id', 'student__university_id', 'date'
+        ).annotate(
+            quizzes_on_day=Count('quiz_id', distinct=True),
+            **slot_counts
+        )
+
+        if conflicts_only:
+            has_conflict = Q(quizzes_on_day__gte=2)
+            for alias in slot_counts:
+                has_conflict |= Q(**{f'{alias}__gt': 0})
+            rows = rows.filter(has_conflict)
+        return rows
+
+    @staticmethod
+    def busy_quiz_days(students, dates, period_ids, conflicts_only=False):
+        """
+        Quizzes of some students on some dates, grouped by (student, date) in
+        one aggregated query with one conditional count per candidate period.
+
+        students is a list of ids or a values('user_id') subquery. Returns
+        {date: {student_id: {'university_id', 'quizzes', 'periods'}}}, where
+        quizzes counts the student's quizzes that day and periods maps each
+        candidate period id to the quizzes in it. With conflicts_only, days
+        where no candidate period is taken and there are fewer than two
+        quizzes are left out.
+        """
+        period_ids = sorted(set(period_ids))
+        rows = Vote.busy_quiz_rows(students, dates, period_ids, conflicts_only)
+
+        busy_days = {}
+        for row in rows.order_by('student_id'):
+            busy_days.setdefault(row['date'], {})[row['student_id']] = {
+                'university_id': row['student__university_id'],
+                'quizzes': row['quizzes_on_day'],
+                'periods': {period_id: row[f'quizzes_in_period_{period_id}'] for period_id in period_ids}
+            }
+        return busy_days
+
+    @staticmethod
+    def option_conflicts(option, busy_days, student_ids=None):
+        """
+        Students of busy_days who cannot take a quiz at the option's date and
+        period, ordered by student id; only those in student_ids if given.
+        """
+        day = busy_days.get(option.date, {})
+        conflicts = []
+        for student_id in sorted(day):
+            if student_ids is not None and student_id not in student_ids:
+                continue
+            busy = day[student_id]
+            university_id = busy['university_id']
+            if busy['periods'].get(option.period_id):
+                reason = 'same_time'
+                message = f"Student {university_id} already has a quiz scheduled at this time"
+            elif busy['quizzes'] >= 2:
+                reason = 'two_quizzes'
+                message = f"Student {university_id} already has two quizzes on this date"
+            else:
+                continue
+
+            conflicts.append({
+                'student_id': student_id,
+                'university_id': university_id,
+                'reason': reason,
+                'message': message
+            })
+        return conflicts
+
+    def get_quiz_conflicts_for_options(self, options, busy_days=None, student_ids=None):
+        """
+        Returns {option.id: [conflict, ...]} for several candidate options,
+        from a single busy_quiz_days query, so validating N options costs the
+        same as validating one. Conflicts are ordered by student id.
+
+        Callers validating the votes of several sections at once pass one
+        busy_days covering all of them, with this section's student_ids.
+        """
+        options = list(options)
+        if not options:
+            return {}
+
+        if busy_days is None:
+            roster = Section.students.through.objects.filter(
+                section_id=self.section_id
+            ).values('user_id')
+            busy_days = Vote.busy_quiz_days(
+                roster,
+                {option.date for option in options},
+                {option.period_id for option in options},
+                conflicts_only=True
+            )
+
+        return {
+            option.id: Vote.option_conflicts(option, busy_days, student_ids)
+            for option in options
+        }
+
+    def get_quiz_conflicts(self, option):
+        """
+        Returns every student of the section who cannot take a quiz at the
+        option's date and period, ordered by student id.
+        """
+        return self.get_quiz_conflicts_for_options([option])[option.id]
+
+    def select_valid_option(self, options, busy_days=None, student_ids=None):
+        """
+        Picks the first of several candidate options that every student can
+        attend. Returns (option, "") or (None, error_message) using the
+        error of the last candidate, as the serial validation did.
+        """
+        options = list(options)
+        conflicts = self.get_quiz_conflicts_for_options(options, busy_days, student_ids)
+
+        error_message = None
+        for option in options:
+            if not conflicts[option.id]:
+                return option, ""
+            error_message = conflicts[option.id][0]['message']
+        return None, error_message
+
     def validate_quiz_time(self, option):
         """
         Validates if the selected option time is available for all students.
         Returns (bool, str) tuple: (is_valid, error_message)
         """
-        students = self.section.students.all()
-        
-        for student in students:
-            # Check for existing quiz at the same time
-            existing_quiz = Quiz.objects.filter(
-                section__students=student,
-                date=option.date,
-                period=option.period
-            ).exists()
-            
-            if existing_quiz:
-                return False, f"Student {student.university_id} already has a quiz scheduled at this time"
-            
-            # Check for two quizzes on the same day
-            quizzes_on_day = Quiz.objects.filter(
-                section__students=student,
-                date=option.date
-            ).count()
-            
-            if quizzes_on_day >= 2:
-                return False, f"Student {student.university_id} already has two quizzes on this date"
+        conflicts = self.get_quiz_conflicts(option)
+        if conflicts:
+            return False, conflicts[0]['message']
         
         return True, ""
 
@@ -157,6 +285,8 @@ class ProfessorAnnouncement(models.Model):
     title = models.CharField(max_length=200)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Number of students notified, stored at fan-out (null for older announcements)
+    recipient_count = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
@@ -170,6 +300,28 @@ class StudentVote(models.Model):
     class Meta:
         unique_together = ['vote', 'student']
 
+class StudentBusySlot(models.Model):
+    """
+    Denormalized "student is busy" rows: one per student for every weekly
+    class (day + period) and every dated quiz (date + period) of the
+    sections they are enrolled in. Kept in sync by the signals in
+    signals.py; rebuild with `manage.py rebuild_busy_slots`.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='busy_slots')
+    section = models.ForeignKey(Section, on_delete=models.CASCADE)
+    period = models.ForeignKey(Period, on_delete=models.CASCADE)
+    day = models.CharField(max_length=15, choices=Schedule.DAYS_OF_WEEK, null=True, blank=True)  # Weekly class
+    date = models.DateField(null=True, blank=True)  # Quiz
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, null=True, blank=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, null=True, blank=True)
+
+    class Meta:
+        unique_together = [['student', 'schedule'], ['student', 'quiz']]
+        indexes = [
+            models.Index(fields=['student', 'day', 'period'], name='busy_student_day_idx'),
+            models.Index(fields=['student', 'date', 'period'], name='busy_student_date_idx'),
+        ]
+
 class OTPCode(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
@@ -181,20 +333,168 @@ class OTPCode(models.Model):
         from django.utils import timezone
         return not self.is_used and self.expires_at > timezone.now()
 
+class OutboundEmail(models.Model):
+    """
+    Email waiting to be sent. Requests only insert a row; a background job
+    sends due rows in batches over one SMTP connection and retries
+    failures with backoff.
+    """
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not sent before this time; pushed back after every failed attempt
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # When a job claimed the row, so rows of crashed jobs can be reclaimed
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} - To: {self.to_email} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Due rows of the outbox, oldest first
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+class UploadJob(models.Model):
+    """
+    Schedule PDF uploaded for background processing. The request stores
+    the file and queues a job; clients poll the status until it is done.
+    """
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('parsing', 'Parsing'),
+        ('importing', 'Importing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_jobs')
+    file = models.FileField(upload_to='schedule_uploads/')
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    message = models.TextField(blank=True, default='')
+    # Response of the import: processed sections, as returned by PDFProcessor
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Upload {self.id} by {self.user.university_id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+
+class ParsedSchedule(models.Model):
+    """
+    Rows parsed from a schedule PDF, keyed by the SHA-256 of its bytes, so
+    re-uploading the same file skips tabula. Least recently used entries
+    are evicted once the table is full.
+    """
+    sha256 = models.CharField(max_length=64)
+    # 'faculty' or 'student': the two layouts are parsed differently
+    kind = models.CharField(max_length=10)
+    # Bumped when the parsing code changes, so stale rows are never used
+    parser_version = models.PositiveSmallIntegerField()
+    rows = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.sha256[:12]} ({self.hits} hits)"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'kind', 'parser_version'], name='parsed_schedule_key_uniq'),
+        ]
+
+class Broadcast(models.Model):
+    """
+    Content of a notification sent to many students at once. Each student
+    gets a lightweight Notification receipt pointing here instead of a copy
+    of the title and message.
+    """
+    DELIVERY_STATUSES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='broadcasts')
+    notification_type = models.CharField(max_length=20)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    section = models.ForeignKey(Section, on_delete=models.CASCADE, null=True, blank=True)
+    vote = models.ForeignKey(Vote, on_delete=models.CASCADE, null=True, blank=True)
+    announcement_id = models.IntegerField(null=True, blank=True)
+    # Students to notify, and receipts written so far by the background jobs
+    recipient_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    delivery_status = models.CharField(max_length=10, choices=DELIVERY_STATUSES, default='pending')
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Domain event that produced the broadcast, so it is never sent twice
+    event_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.notification_type} - {self.title} - To: {self.recipient_count} students"
+
+    class Meta:
+        ordering = ['-created_at']
+
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_notifications')
     notification_type = models.CharField(max_length=20)
-    title = models.CharField(max_length=200)
-    message = models.TextField()
+    # Empty on broadcast receipts, which read them from the broadcast
+    title = models.CharField(max_length=200, blank=True, default='')
+    message = models.TextField(blank=True, default='')
     section = models.ForeignKey(Section, on_delete=models.CASCADE, null=True, blank=True)
     vote = models.ForeignKey(Vote, on_delete=models.CASCADE, null=True, blank=True)  # Add this field
     announcement_id = models.IntegerField(null=True, blank=True) 
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, null=True, blank=True, related_name='receipts')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the notification was included in an email digest
+    emailed_at = models.DateTimeField(null=True, blank=True)
     is_read = models.BooleanField(default=False)
 
+    @property
+    def content_title(self):
+        return self.broadcast.title if self.broadcast_id else self.title
+
+    @property
+    def content_message(self):
+        return self.broadcast.message if self.broadcast_id else self.message
+
     def __str__(self):
-        return f"{self.notification_type} - {self.title} - To: {self.recipient.university_id}"
+        return f"{self.notification_type} - {self.content_title} - To: {self.recipient.university_id}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user feed and unread lookups, newest first
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_read_idx'),
+            # Keyset pagination of the feed on (created_at, id)
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_feed_idx'),
+            # Unread notifications not emailed yet, for the digest runs
+            models.Index(fields=['emailed_at', 'is_read', 'created_at'], name='notif_digest_idx'),
+        ]
+        constraints = [
+            # Lets fan-out jobs be retried without duplicating receipts
+            models.UniqueConstraint(fields=['broadcast', 'recipient'], name='notif_broadcast_recipient_uniq'),
+        ]
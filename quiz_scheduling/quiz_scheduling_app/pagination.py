@@ -0,0 +1,97 @@
+# quiz_scheduling_app/pagination.py
+
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+class FeedCursorPagination:
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    A cursor is an opaque token of the (created_at, id) of a row. Pages
+    filter on that key instead of using OFFSET, so fetching a page costs
+    the same no matter how long the feed is.
+
+    - ?cursor=<next> returns the page of rows older than the cursor
+    - ?since=<latest> returns rows newer than the cursor, for polling
+    - ?limit=<n> sets the page size (capped at max_page_size)
+    """
+    page_size = 20
+    max_page_size = 100
+
+    def __init__(self):
+        self.next_cursor = None
+        self.latest_cursor = None
+        self.has_more = False
+
+    @staticmethod
+    def encode_cursor(obj):
+        raw = f"{obj.created_at.isoformat()}|{obj.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            created_at, pk = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk)
+        except (ValueError, UnicodeError):
+            raise ValidationError({"cursor": "Invalid cursor"})
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+        except ValueError:
+            raise ValidationError({"limit": "Limit must be a number"})
+        return max(1, min(limit, self.max_page_size))
+
+    @staticmethod
+    def newer_than(queryset, cursor, limit):
+        """Up to `limit` rows after a cursor, oldest first so none are skipped"""
+        created_at, pk = FeedCursorPagination.decode_cursor(cursor)
+        return list(
+            queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')[:limit]
+        )
+
+    def paginate_queryset(self, queryset, request):
+        limit = self.get_limit(request)
+        since = request.query_params.get('since')
+        cursor = request.query_params.get('cursor')
+
+        if since:
+            # Returned newest first like every other page
+            rows = self.newer_than(queryset, since, limit + 1)
+            self.has_more = len(rows) > limit
+            rows = rows[:limit][::-1]
+            self.latest_cursor = self.encode_cursor(rows[0]) if rows else since
+            return rows
+
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        rows = list(queryset[:limit + 1])
+        self.has_more = len(rows) > limit
+        rows = rows[:limit]
+        if self.has_more:
+            self.next_cursor = self.encode_cursor(rows[-1])
+        if rows and not cursor:
+            self.latest_cursor = self.encode_cursor(rows[0])
+        return rows
+
+    def get_pagination_data(self):
+        return {
+            "next": self.next_cursor,
+            "latest": self.latest_cursor,
+            "has_more": self.has_more
+        }
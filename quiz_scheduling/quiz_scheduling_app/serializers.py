@@ -1,4 +1,5 @@
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Prefetch
 from rest_framework import serializers
 
 from .models import (
@@ -128,6 +129,10 @@ class VoteOptionSerializer(serializers.ModelSerializer):
         model = VoteOption
         fields = ['id', 'date', 'period', 'period_details', 'vote_count', 'voters', 'has_voted']
 
+    @staticmethod
+    def _has_prefetched_votes(obj):
+        return 'studentvote_set' in getattr(obj, '_prefetched_objects_cache', {})
+
     def get_voters(self, obj):
         request = self.context.get('request')
         if not request or request.user.user_type != 'faculty':
@@ -143,12 +148,34 @@ class VoteOptionSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        
+
+        if self._has_prefetched_votes(obj):
+            return any(vote.student_id == request.user.id for vote in obj.studentvote_set.all())
         return obj.studentvote_set.filter(student=request.user).exists()
 
     def get_vote_count(self, obj):
+        # Annotated by VoteSerializer.setup_eager_loading
+        if hasattr(obj, 'vote_count'):
+            return obj.vote_count
         return obj.studentvote_set.count()
 
+
+class VoteListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Look up the requesting student's own votes for the whole list at once
+        request = self.context.get('request')
+        if request and not request.user.is_anonymous and request.user.user_type == 'student':
+            votes = list(data.all() if hasattr(data, 'all') else data)
+            self.context['student_votes'] = {
+                student_vote.vote_id: student_vote
+                for student_vote in StudentVote.objects.filter(
+                    student=request.user,
+                    vote__in=[vote.id for vote in votes]
+                )
+            }
+            data = votes
+        return super().to_representation(data)
+
 class VoteSerializer(serializers.ModelSerializer):
     section = SectionSerializer()
     options = VoteOptionSerializer(many=True, read_only=True)
@@ -161,20 +188,44 @@ class VoteSerializer(serializers.ModelSerializer):
             'id', 'section', 'professor', 'created_at', 'is_active',
             'selected_option', 'room', 'options', 'student_vote'
         ]
+        list_serializer_class = VoteListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything a vote list renders with a fixed number of queries:
+        section/course/professor joined in, options and the selected option
+        with annotated vote counts and their voters prefetched.
+        """
+        options = VoteOption.objects.select_related('period').annotate(
+            vote_count=Count('studentvote')
+        ).prefetch_related(
+            Prefetch('studentvote_set', queryset=StudentVote.objects.select_related('student'))
+        )
+        return queryset.select_related(
+            'section__course', 'section__professor'
+        ).prefetch_related(
+            Prefetch('options', queryset=options),
+            Prefetch('selected_option', queryset=options)
+        )
 
     def get_student_vote(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous or request.user.user_type != 'student':
             return None
-        
-        student_vote = StudentVote.objects.filter(
-            vote=obj,
-            student=request.user
-        ).first()
+
+        student_votes = self.context.get('student_votes')
+        if student_votes is not None:
+            student_vote = student_votes.get(obj.id)
+        else:
+            student_vote = StudentVote.objects.filter(
+                vote=obj,
+                student=request.user
+            ).first()
         
         if student_vote:
             return {
-                'option_id': student_vote.option.id,
+                'option_id': student_vote.option_id,
                 'voted_at': student_vote.created_at
             }
         return None
@@ -222,6 +273,8 @@ class StudentVoteSerializer(serializers.ModelSerializer):
         return data
 
 class NotificationSerializer(serializers.ModelSerializer):
+    title = serializers.SerializerMethodField()
+    message = serializers.SerializerMethodField()
     sender_name = serializers.SerializerMethodField()
     section_details = SectionSerializer(source='section', read_only=True)
     recipient_count = serializers.SerializerMethodField()
@@ -242,18 +295,48 @@ class NotificationSerializer(serializers.ModelSerializer):
             'recipient_count'
         ]
 
+    # Nested representations that are only rendered when asked for
+    EXPANDABLE_FIELDS = ('section_details', 'vote_details')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # context['expand'] lists the expandable fields to keep; without it
+        # every field is rendered
+        expand = self.context.get('expand')
+        if expand is not None:
+            for name in self.EXPANDABLE_FIELDS:
+                if name not in expand:
+                    self.fields.pop(name)
+
+    def get_title(self, obj):
+        return obj.content_title
+
+    def get_message(self, obj):
+        return obj.content_message
+
     def get_sender_name(self, obj):
         return f"{obj.sender.first_name} {obj.sender.last_name}"
 
     def get_recipient_count(self, obj):
-        if self.context['request'].user.user_type == 'faculty':
-            return Notification.objects.filter(
-                sender=obj.sender,
-                title=obj.title,
-                message=obj.message,
-                created_at=obj.created_at
-            ).count()
-        return None
+        if self.context['request'].user.user_type != 'faculty':
+            return None
+
+        # Annotated from ProfessorAnnouncement.recipient_count by NotificationViewSet
+        recipient_count = getattr(obj, 'recipient_count', None)
+        if recipient_count is not None:
+            return recipient_count
+        if obj.broadcast_id:
+            return obj.broadcast.recipient_count
+
+        # Announcements sent before the count was stored
+        if obj.announcement_id:
+            return Notification.objects.filter(announcement_id=obj.announcement_id).count()
+        return Notification.objects.filter(
+            sender=obj.sender,
+            title=obj.title,
+            message=obj.message,
+            created_at=obj.created_at
+        ).count()
 
 class CreateAnnouncementSerializer(serializers.Serializer):
     section_id = serializers.IntegerField()
@@ -0,0 +1,171 @@
+# quiz_scheduling_app/services/availability_service.py
+
+from collections import defaultdict
+from datetime import date as date_type, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+from ..models import Period, Section, StudentBusySlot
+
+# Only periods 1-15 are ever offered for quizzes
+MAX_PERIOD_NUMBER = 15
+
+
+def period_bit(number: int) -> int:
+    """Bit used for a period number inside a busy/free mask"""
+    return 1 << number
+
+
+def mask_to_numbers(mask: int) -> List[int]:
+    """Expand a mask back into sorted period numbers"""
+    return [number for number in range(1, MAX_PERIOD_NUMBER + 1) if mask & period_bit(number)]
+
+
+class AvailabilityService:
+    """
+    Set-based availability engine.
+
+    Every student gets an integer bitmask where bit N is set when the
+    student is busy in period N. Masks are built from a constant number of
+    indexed lookups on StudentBusySlot no matter how many students are
+    enrolled, and the section-wide free mask is simply the complement of
+    all busy masks OR-ed together.
+    """
+
+    @staticmethod
+    def roster_ids(section_id: int) -> List[int]:
+        """Ids of all students enrolled in a section"""
+        return list(
+            Section.students.through.objects.filter(
+                section_id=section_id
+            ).values_list('user_id', flat=True)
+        )
+
+    @staticmethod
+    def _roster_subquery(section_id: int):
+        return Section.students.through.objects.filter(
+            section_id=section_id
+        ).values('user_id')
+
+    @staticmethod
+    def weekly_busy_rows(section_id: int, days: Iterable[str]):
+        """(student_id, day, period number) of the weekly classes of a section's students"""
+        return StudentBusySlot.objects.filter(
+            student_id__in=AvailabilityService._roster_subquery(section_id),
+            day__in=list(days),
+            period__number__lte=MAX_PERIOD_NUMBER
+        ).values_list('student_id', 'day', 'period__number')
+
+    @staticmethod
+    def weekly_busy_masks(section_id: int, days: Iterable[str]) -> Dict[str, Dict[int, int]]:
+        """Busy mask per day and student from their regular weekly classes"""
+        rows = AvailabilityService.weekly_busy_rows(section_id, days)
+
+        masks = defaultdict(lambda: defaultdict(int))
+        for student_id, day, number in rows:
+            masks[day][student_id] |= period_bit(number)
+        return masks
+
+    @staticmethod
+    def occupied_weekly_rows(section_id: int, max_period: int = MAX_PERIOD_NUMBER):
+        """Distinct (day, period number) rows behind occupied_weekly_slots"""
+        return StudentBusySlot.objects.filter(
+            student_id__in=AvailabilityService._roster_subquery(section_id),
+            day__isnull=False,
+            period__number__lte=max_period
+        ).values_list('day', 'period__number').distinct()
+
+    @staticmethod
+    def occupied_weekly_slots(section_id: int, max_period: int = MAX_PERIOD_NUMBER) -> Set[Tuple[str, int]]:
+        """(day, period number) pairs in which any student of a section has a class"""
+        return set(AvailabilityService.occupied_weekly_rows(section_id, max_period))
+
+    @staticmethod
+    def quiz_busy_rows(section_id: int, start: date_type, end: date_type):
+        """(student_id, date, quiz_id, period number) of quizzes of a section's students"""
+        return StudentBusySlot.objects.filter(
+            student_id__in=AvailabilityService._roster_subquery(section_id),
+            date__range=(start, end)
+        ).values_list('student_id', 'date', 'quiz_id', 'period__number')
+
+    @staticmethod
+    def quiz_busy_masks(section_id: int, start: date_type, end: date_type) -> Dict[date_type, Dict[int, Dict]]:
+        """
+        Busy mask and quiz ids per date and student from quizzes already
+        scheduled between two dates (inclusive).
+        """
+        rows = AvailabilityService.quiz_busy_rows(section_id, start, end)
+
+        quizzes = defaultdict(lambda: defaultdict(lambda: {'mask': 0, 'quiz_ids': set()}))
+        for student_id, quiz_date, quiz_id, number in rows:
+            entry = quizzes[quiz_date][student_id]
+            entry['quiz_ids'].add(quiz_id)
+            if number <= MAX_PERIOD_NUMBER:
+                entry['mask'] |= period_bit(number)
+        return quizzes
+
+    @staticmethod
+    def combine_busy_masks(masks: Iterable[int]) -> int:
+        """OR all student busy masks together into one section-wide mask"""
+        combined = 0
+        for mask in masks:
+            combined |= mask
+        return combined
+
+    @staticmethod
+    def free_masks(section_id: int, start: date_type, end: date_type) -> Dict[date_type, int]:
+        """
+        Mask of periods free for every student of a section, for each date
+        between start and end (inclusive). A date maps to 0 when any student
+        already has two quizzes that day.
+
+        The weekly schedule and the quizzes of the whole window are loaded
+        once, so the cost is roughly constant in the number of days.
+        """
+        dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        days = {day.strftime('%A').lower() for day in dates}
+
+        weekly = AvailabilityService.weekly_busy_masks(section_id, days)
+        quizzes = AvailabilityService.quiz_busy_masks(section_id, start, end)
+
+        weekly_busy = {
+            day: AvailabilityService.combine_busy_masks(weekly[day].values())
+            for day in days
+        }
+
+        all_periods = 0
+        for number in range(1, MAX_PERIOD_NUMBER + 1):
+            all_periods |= period_bit(number)
+
+        result = {}
+        for day in dates:
+            day_quizzes = quizzes.get(day, {})
+
+            # Maximum 2 quizzes per day rule
+            if any(len(entry['quiz_ids']) >= 2 for entry in day_quizzes.values()):
+                result[day] = 0
+                continue
+
+            busy = weekly_busy[day.strftime('%A').lower()]
+            busy |= AvailabilityService.combine_busy_masks(
+                entry['mask'] for entry in day_quizzes.values()
+            )
+            result[day] = all_periods & ~busy
+        return result
+
+    @staticmethod
+    def free_mask(section_id: int, date: date_type) -> int:
+        """Mask of periods free for every student of a section on one date"""
+        return AvailabilityService.free_masks(section_id, date, date)[date]
+
+    @staticmethod
+    def serialize_periods(periods: Iterable[Period], mask: int) -> List[Dict]:
+        """Payload used by the common periods endpoint for the periods in a mask"""
+        return [
+            {
+                'period_number': period.number,
+                'start_time': period.start_time.strftime('%H:%M'),
+                'end_time': period.end_time.strftime('%H:%M'),
+                'is_online': period.number >= 9,
+            }
+            for period in periods
+            if mask & period_bit(period.number)
+        ]
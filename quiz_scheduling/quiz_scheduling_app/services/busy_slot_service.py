@@ -0,0 +1,150 @@
+# quiz_scheduling_app/services/busy_slot_service.py
+
+from typing import Iterable, List
+from ..models import Quiz, Schedule, Section, StudentBusySlot
+
+# Rows written per INSERT when (re)building busy slots
+BUSY_SLOT_BATCH_SIZE = 2000
+
+
+class BusySlotService:
+    """Keeps the StudentBusySlot table in sync with enrolments, schedules and quizzes"""
+
+    @staticmethod
+    def _rows_for(student_ids: Iterable[int], schedules: Iterable[Schedule], quizzes: Iterable[Quiz]) -> List[StudentBusySlot]:
+        rows = []
+        for student_id in student_ids:
+            for schedule in schedules:
+                rows.append(StudentBusySlot(
+                    student_id=student_id,
+                    section_id=schedule.section_id,
+                    period_id=schedule.period_id,
+                    day=schedule.day,
+                    schedule_id=schedule.id
+                ))
+            for quiz in quizzes:
+                rows.append(StudentBusySlot(
+                    student_id=student_id,
+                    section_id=quiz.section_id,
+                    period_id=quiz.period_id,
+                    date=quiz.date,
+                    quiz_id=quiz.id
+                ))
+        return rows
+
+    @staticmethod
+    def _insert(rows: List[StudentBusySlot]):
+        if rows:
+            StudentBusySlot.objects.bulk_create(rows, batch_size=BUSY_SLOT_BATCH_SIZE, ignore_conflicts=True)
+
+    @staticmethod
+    def add_enrollments(section_id: int, student_ids: Iterable[int]):
+        """Students joined a section: copy its classes and quizzes to them"""
+        schedules = list(Schedule.objects.filter(section_id=section_id))
+        quizzes = list(Quiz.objects.filter(section_id=section_id))
+        BusySlotService._insert(BusySlotService._rows_for(student_ids, schedules, quizzes))
+
+    @staticmethod
+    def add_student_sections(student_id: int, section_ids: Iterable[int]):
+        """A student joined several sections"""
+        schedules = list(Schedule.objects.filter(section_id__in=section_ids))
+        quizzes = list(Quiz.objects.filter(section_id__in=section_ids))
+        BusySlotService._insert(BusySlotService._rows_for([student_id], schedules, quizzes))
+
+    @staticmethod
+    def remove_enrollments(section_ids: Iterable[int], student_ids: Iterable[int]):
+        StudentBusySlot.objects.filter(
+            section_id__in=list(section_ids),
+            student_id__in=list(student_ids)
+        ).delete()
+
+    @staticmethod
+    def clear_section(section_id: int):
+        StudentBusySlot.objects.filter(section_id=section_id).delete()
+
+    @staticmethod
+    def clear_student(student_id: int):
+        StudentBusySlot.objects.filter(student_id=student_id).delete()
+
+    @staticmethod
+    def _roster(section_id: int) -> List[int]:
+        return list(
+            Section.students.through.objects.filter(
+                section_id=section_id
+            ).values_list('user_id', flat=True)
+        )
+
+    @staticmethod
+    def sync_schedule(schedule: Schedule):
+        """A weekly class was created or changed"""
+        StudentBusySlot.objects.filter(schedule_id=schedule.id).delete()
+        BusySlotService._insert(
+            BusySlotService._rows_for(BusySlotService._roster(schedule.section_id), [schedule], [])
+        )
+
+    @staticmethod
+    def sync_quiz(quiz: Quiz):
+        """A quiz was created or changed"""
+        StudentBusySlot.objects.filter(quiz_id=quiz.id).delete()
+        BusySlotService._insert(
+            BusySlotService._rows_for(BusySlotService._roster(quiz.section_id), [], [quiz])
+        )
+
+    @staticmethod
+    def add_quizzes(quizzes, rosters=None):
+        """
+        Quizzes inserted with bulk_create (no post_save signal). Accepts a
+        Quiz queryset, since bulk inserts do not always return primary keys.
+        Rosters already loaded by the caller ({section_id: student ids}) are
+        not queried again.
+        """
+        rosters = dict(rosters or {})
+        rows = []
+        for quiz in quizzes:
+            if quiz.section_id not in rosters:
+                rosters[quiz.section_id] = BusySlotService._roster(quiz.section_id)
+            rows.extend(BusySlotService._rows_for(rosters[quiz.section_id], [], [quiz]))
+        BusySlotService._insert(rows)
+
+    @staticmethod
+    def add_schedules(schedules: Iterable[Schedule]):
+        """
+        Weekly classes inserted with bulk_create (no post_save signal):
+        copy them to their sections' students. Slots of other classes are
+        not touched.
+        """
+        schedules = list(schedules)
+        rosters = {}
+        for section_id, student_id in Section.students.through.objects.filter(
+            section_id__in={schedule.section_id for schedule in schedules}
+        ).values_list('section_id', 'user_id'):
+            rosters.setdefault(section_id, []).append(student_id)
+
+        rows = []
+        for schedule in schedules:
+            rows.extend(BusySlotService._rows_for(rosters.get(schedule.section_id, []), [schedule], []))
+        BusySlotService._insert(rows)
+
+    @staticmethod
+    def rebuild(section_ids: Iterable[int] = None) -> int:
+        """
+        Recompute busy slots from scratch, for some sections or for all of
+        them. Returns the number of rows written.
+        """
+        sections = Section.objects.all()
+        if section_ids is not None:
+            sections = sections.filter(id__in=list(section_ids))
+            StudentBusySlot.objects.filter(section__in=sections).delete()
+        else:
+            StudentBusySlot.objects.all().delete()
+
+        written = 0
+        for section_id in sections.order_by('id').values_list('id', flat=True).iterator():
+            schedules = list(Schedule.objects.filter(section_id=section_id))
+            quizzes = list(Quiz.objects.filter(section_id=section_id))
+            if not schedules and not quizzes:
+                continue
+            rows = BusySlotService._rows_for(BusySlotService._roster(section_id), schedules, quizzes)
+            BusySlotService._insert(rows)
+            written += len(rows)
+        return written
@@ -1,10 +1,13 @@
 # quiz_scheduling_app/services/common_time_service.py
 
 from typing import List, Dict
-from django.db.models import Q, Count
-from ..models import Quiz, Section, Period, Schedule
+from ..models import Section, Period
+from .availability_service import AvailabilityService, MAX_PERIOD_NUMBER
 from datetime import datetime
 
+# Longest window the range lookup will compute in one request
+MAX_RANGE_DAYS = 31
+
 # class CommonTimeService:
 #     @staticmethod
 #     def get_available_periods(section_id: int, date: datetime.date) -> Dict:
@@ -97,72 +100,85 @@ class CommonTimeService:
         - Existing quizzes
         - Maximum 2 quizzes per day rule
         - Only periods 1-15 are considered
+
+        Availability is computed with per-student busy bitmasks (see
+        AvailabilityService), so the number of queries does not grow with
+        the size of the section.
         """
         try:
-            section = Section.objects.get(id=section_id)
-            students = section.students.all()
+            if not Section.objects.filter(id=section_id).exists():
+                raise Section.DoesNotExist
 
-            if not students:
+            if not AvailabilityService.roster_ids(section_id):
                 return {
                     "status": "error",
                     "message": "No students enrolled in this section"
                 }
 
-            # Get day of week from the date
-            day_of_week = date.strftime('%A').lower()
-
             # Get periods 1-15 only
-            periods = Period.objects.filter(number__lte=15).order_by('number')
-
-            # Check students' quiz count for the given date
-            students_with_two_quizzes = Quiz.objects.filter(
-                date=date,
-                section__students__in=students
-            ).values('section__students').annotate(
-                quiz_count=Count('id')
-            ).filter(quiz_count__gte=2)
-
-            # If any student has 2 quizzes, no periods are available
-            if students_with_two_quizzes.exists():
+            periods = Period.objects.filter(
+                number__lte=MAX_PERIOD_NUMBER
+            ).order_by('number')
+
+            free_mask = AvailabilityService.free_mask(section_id, date)
+
+            return {
+                "status": "success",
+                "data": AvailabilityService.serialize_periods(periods, free_mask)
+            }
+
+        except Section.DoesNotExist:
+            return {
+                "status": "error", 
+                "message": "Section not found"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+    @staticmethod
+    def get_available_periods_range(section_id: int, start: datetime.date, end: datetime.date) -> Dict:
+        """
+        Get common free periods for every date between start and end (inclusive)
+        in a single pass. Same rules as get_available_periods, keyed by date.
+        """
+        try:
+            if end < start:
+                return {
+                    "status": "error",
+                    "message": "End date must not be before start date"
+                }
+
+            if (end - start).days + 1 > MAX_RANGE_DAYS:
                 return {
-                    "status": "success",
-                    "data": []
+                    "status": "error",
+                    "message": f"Date range cannot exceed {MAX_RANGE_DAYS} days"
                 }
 
-            available_periods = []
-            for period in periods:
-                is_available = True
-                
-                for student in students:
-                    # Check regular schedule for this day
-                    has_class = Schedule.objects.filter(
-                        section__students=student,
-                        day=day_of_week,
-                        period=period
-                    ).exists()
-
-                    # Check if student has a quiz at this period
-                    has_quiz = Quiz.objects.filter(
-                        section__students=student,
-                        date=date,
-                        period=period
-                    ).exists()
-
-                    if has_class or has_quiz:
-                        is_available = False
-                        break
-
-                if is_available:
-                    available_periods.append({
-                        'period_number': period.number,
-                        'start_time': period.start_time.strftime('%H:%M'),
-                        'end_time': period.end_time.strftime('%H:%M'),
-                        'is_online': period.number >= 9,
-                    })
+            if not Section.objects.filter(id=section_id).exists():
+                raise Section.DoesNotExist
+
+            if not AvailabilityService.roster_ids(section_id):
+                return {
+                    "status": "error",
+                    "message": "No students enrolled in this section"
+                }
+
+            # Get periods 1-15 only
+            periods = list(Period.objects.filter(
+                number__lte=MAX_PERIOD_NUMBER
+            ).order_by('number'))
+
+            free_masks = AvailabilityService.free_masks(section_id, start, end)
 
             return {
                 "status": "success",
-                "data": available_periods
+                "data": {
+                    day.strftime('%Y-%m-%d'): AvailabilityService.serialize_periods(periods, mask)
+                    for day, mask in free_masks.items()
+                }
             }
 
         except Section.DoesNotExist:
@@ -0,0 +1,107 @@
+# quiz_scheduling_app/services/digest_service.py
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from ..models import Notification, OutboundEmail, User
+from .email_service import EmailService
+
+# A user is emailed at most once per window: a digest goes out once their
+# oldest unread, not yet emailed notification is this old
+NOTIFICATION_DIGEST_WINDOW_MINUTES = getattr(settings, 'NOTIFICATION_DIGEST_WINDOW_MINUTES', 60)
+# Older notifications are never emailed, e.g. the backlog present when
+# digests are first turned on
+NOTIFICATION_DIGEST_MAX_AGE_HOURS = getattr(settings, 'NOTIFICATION_DIGEST_MAX_AGE_HOURS', 48)
+# Users whose digests are rendered and queued per transaction
+NOTIFICATION_DIGEST_BATCH_SIZE = getattr(settings, 'NOTIFICATION_DIGEST_BATCH_SIZE', 500)
+
+# How often the django-q schedule installed by send_notification_digests runs
+NOTIFICATION_DIGEST_RUN_MINUTES = getattr(settings, 'NOTIFICATION_DIGEST_RUN_MINUTES', 15)
+
+DIGEST_SCHEDULE_NAME = 'notification-digests'
+DIGEST_FUNC = 'quiz_scheduling_app.tasks.send_notification_digests'
+DIGEST_TEMPLATE = 'quiz_scheduling_app/emails/notification_digest.txt'
+
+
+class DigestService:
+    """
+    Email digests of unread notifications.
+
+    Each run collects the unread notifications of every user who is due,
+    renders one message per user and adds them to the email outbox in
+    bulk, where they are sent in batches over one connection. Mail volume
+    follows the number of users per window, not the number of
+    notifications.
+    """
+
+    @staticmethod
+    def pending(now):
+        return Notification.objects.filter(
+            emailed_at__isnull=True,
+            is_read=False,
+            created_at__gt=now - timedelta(hours=NOTIFICATION_DIGEST_MAX_AGE_HOURS),
+            created_at__lte=now
+        )
+
+    @staticmethod
+    def due(now):
+        """Recipient ids of unread notifications waiting for longer than the window"""
+        cutoff = now - timedelta(minutes=NOTIFICATION_DIGEST_WINDOW_MINUTES)
+        return DigestService.pending(now).filter(
+            created_at__lte=cutoff
+        ).order_by('recipient_id').values_list('recipient_id', flat=True).distinct()
+
+    @staticmethod
+    def due_user_ids(now=None):
+        """Users with an unread notification waiting for longer than the window"""
+        return list(DigestService.due(now or timezone.now()))
+
+    @staticmethod
+    def send_digests(now=None, batch_size=None):
+        """Queue one digest email for every due user. Returns the number queued."""
+        now = now or timezone.now()
+        batch_size = batch_size or NOTIFICATION_DIGEST_BATCH_SIZE
+        template = get_template(DIGEST_TEMPLATE)
+        user_ids = DigestService.due_user_ids(now)
+
+        queued = 0
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                queued += DigestService._queue_chunk(chunk, now, template)
+        return queued
+
+    @staticmethod
+    def _queue_chunk(user_ids, now, template):
+        users = {user.id: user for user in User.objects.filter(id__in=user_ids).only(
+            'id', 'email', 'first_name', 'university_id'
+        )}
+        notifications = DigestService.pending(now).filter(
+            recipient_id__in=user_ids
+        ).select_related('broadcast', 'section__course').order_by('recipient_id', 'created_at', 'id')
+
+        by_user = {}
+        for notification in notifications:
+            by_user.setdefault(notification.recipient_id, []).append(notification)
+
+        emails = []
+        emailed_ids = []
+        for user_id, user_notifications in by_user.items():
+            user = users[user_id]
+            emailed_ids.extend(notification.id for notification in user_notifications)
+            if not user.email:
+                continue
+            count = len(user_notifications)
+            emails.append(OutboundEmail(
+                to_email=user.email,
+                subject=f"Quiz Scheduling - {count} new notification{'s' if count != 1 else ''}",
+                body=template.render({'user': user, 'notifications': user_notifications})
+            ))
+
+        OutboundEmail.objects.bulk_create(emails)
+        Notification.objects.filter(id__in=emailed_ids).update(emailed_at=now)
+        if emails:
+            transaction.on_commit(EmailService.queue_delivery)
+        return len(emails)
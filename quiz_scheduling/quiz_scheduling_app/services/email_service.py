@@ -1,28 +1,168 @@
 # quiz_scheduling_app/services/email_service.py
-from django.core.mail import send_mail
+from datetime import timedelta
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django_q.tasks import async_task
+from ..models import OutboundEmail
+from .timer_service import TimerService
+
+# Emails sent over one SMTP connection by a job
+EMAIL_OUTBOX_BATCH_SIZE = getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+# Attempts before an email is marked as failed
+EMAIL_OUTBOX_MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+# Retry delay after the first failure, doubled after every further failure
+EMAIL_OUTBOX_RETRY_SECONDS = getattr(settings, 'EMAIL_OUTBOX_RETRY_SECONDS', 30)
+EMAIL_OUTBOX_MAX_RETRY_SECONDS = getattr(settings, 'EMAIL_OUTBOX_MAX_RETRY_SECONDS', 60 * 60)
+# Rows claimed longer ago than this belong to a crashed job and are sent again
+EMAIL_OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'EMAIL_OUTBOX_CLAIM_TIMEOUT', 5 * 60)
+
+SEND_OUTBOX_FUNC = 'quiz_scheduling_app.tasks.send_outbound_emails'
+RETRY_TIMER_NAME = 'email-outbox-retry'
 
 class EmailService:
+    @staticmethod
+    def queue_email(to_email, subject, body):
+        """
+        Add an email to the outbox. It is sent by a background job queued
+        once the current transaction commits, so callers never wait on SMTP.
+        """
+        email = OutboundEmail.objects.create(to_email=to_email, subject=subject, body=body)
+        transaction.on_commit(EmailService.queue_delivery)
+        return email
+
+    @staticmethod
+    def queue_delivery():
+        async_task(SEND_OUTBOX_FUNC)
+
     @staticmethod
     def send_otp_email(email, otp):
         subject = 'Quiz Scheduling - OTP Verification'
         message = f'Your OTP code is: {otp}\nThis code will expire in 5 minutes.'
-        send_mail(
-            subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-        )
+        return EmailService.queue_email(email, subject, message)
 
     @staticmethod
     def send_password_reset_email(email, otp):
         subject = 'Quiz Scheduling - Password Reset'
         message = f'Your password reset code is: {otp}\nThis code will expire in 15 minutes.'
-        send_mail(
-            subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-        )
\ No newline at end of file
+        return EmailService.queue_email(email, subject, message)
+
+    @staticmethod
+    def claim_batch(batch_size=None):
+        """
+        Mark up to batch_size due emails as being sent and return them.
+        Locked rows are skipped, so concurrent jobs never send the same email.
+        """
+        batch_size = batch_size or EMAIL_OUTBOX_BATCH_SIZE
+        now = timezone.now()
+        stale = now - timedelta(seconds=EMAIL_OUTBOX_CLAIM_TIMEOUT)
+
+        with transaction.atomic():
+            ids = list(
+                OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+                    Q(status='pending', next_attempt_at__lte=now) |
+                    Q(status='sending', claimed_at__lt=stale)
+                ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+            )
+            OutboundEmail.objects.filter(id__in=ids).update(status='sending', claimed_at=now)
+        return list(OutboundEmail.objects.filter(id__in=ids).order_by('id'))
+
+    @staticmethod
+    def retry_delay(attempts):
+        delay = EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=min(delay, EMAIL_OUTBOX_MAX_RETRY_SECONDS))
+
+    @staticmethod
+    def send_batch(emails):
+        """
+        Send claimed emails over a single SMTP connection.
+        Returns the number sent; failures are rescheduled with backoff.
+        """
+        failures = []
+        sent_ids = []
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            EmailService.record_failures([(email, str(e)) for email in emails])
+            return 0
+
+        try:
+            for email in emails:
+                try:
+                    EmailMessage(
+                        email.subject,
+                        email.body,
+                        settings.EMAIL_HOST_USER,
+                        [email.to_email],
+                        connection=connection
+                    ).send()
+                    sent_ids.append(email.id)
+                except Exception as e:
+                    failures.append((email, str(e)))
+                    # The connection may be broken; continue on a fresh one
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception:
+                        pass
+        finally:
+            connection.close()
+
+        # Bodies may hold OTP and password reset codes; only the envelope is kept
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status='sent',
+            sent_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            last_error='',
+            body=''
+        )
+        EmailService.record_failures(failures)
+        return len(sent_ids)
+
+    @staticmethod
+    def record_failures(failures):
+        now = timezone.now()
+        for email, error in failures:
+            email.attempts += 1
+            email.last_error = error
+            email.claimed_at = None
+            if email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                email.status = 'failed'
+                email.body = ''
+            else:
+                email.status = 'pending'
+                email.next_attempt_at = now + EmailService.retry_delay(email.attempts)
+        OutboundEmail.objects.bulk_update(
+            [email for email, _ in failures],
+            ['attempts', 'last_error', 'claimed_at', 'status', 'next_attempt_at', 'body']
+        )
+
+    @staticmethod
+    def next_retry_at():
+        """When the earliest email waiting for a retry is due, or None"""
+        return OutboundEmail.objects.filter(
+            status='pending'
+        ).order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+
+    @staticmethod
+    def arm_retry(run_at):
+        """Make sure the outbox is sent again no later than run_at"""
+        return TimerService.arm(RETRY_TIMER_NAME, SEND_OUTBOX_FUNC, run_at)
+
+    @staticmethod
+    def send_outbox(batch_size=None):
+        """Send every due email, one connection per batch. Returns the number sent."""
+        sent = 0
+        while True:
+            emails = EmailService.claim_batch(batch_size)
+            if not emails:
+                break
+            sent += EmailService.send_batch(emails)
+
+        retry_at = EmailService.next_retry_at()
+        if retry_at is not None:
+            EmailService.arm_retry(retry_at)
+        return sent
@@ -1,65 +1,198 @@
 # quiz_scheduling_app/services/notification_service.py
 
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.db.models import Q
-from ..models import Notification, ProfessorAnnouncement, User, Section, Vote
+from django_q.tasks import async_task
+from ..models import Broadcast, Notification, ProfessorAnnouncement, User, Section, Vote
 from django.utils import timezone
 
+# Receipts written by one background fan-out job
+NOTIFICATION_FANOUT_BATCH_SIZE = getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 1000)
+
+# Unread badge counters are recomputed from the table at least this often
+UNREAD_COUNT_CACHE_TIMEOUT = getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 60 * 60)
+
+DELIVER_CHUNK_FUNC = 'quiz_scheduling_app.tasks.deliver_broadcast_chunk'
+DELIVER_CHUNK_HOOK = 'quiz_scheduling_app.tasks.broadcast_chunk_hook'
+
 class NotificationService:
     @staticmethod
-    def send_vote_created_notification(vote: Vote):
-        """Send notifications to students when a new vote is created"""
-        students = vote.section.students.all()
-        notifications = []
+    def broadcast_to_section(sender: User, notification_type: str, title: str, message: str,
+                             section: Section, vote: Vote = None, announcement_id: int = None,
+                             event_key: str = None):
+        """
+        Send one notification to every student of a section.
 
-        for student in students:
-            notifications.append(
-                Notification(
-                    recipient=student,
-                    sender=vote.professor,
-                    notification_type='vote_created',
-                    title='New Quiz Vote Available',
-                    message=f'A new vote has been created for {vote.section.course.code} - Section {vote.section.section_number}',
-                    section=vote.section,
-                    vote=vote  # All notifications reference the same vote
+        The content is stored once on a Broadcast; the per-student receipts
+        are written by background jobs on the django-q cluster, one chunk of
+        the roster per job, queued once the current transaction commits.
+        Returns the pending broadcast, whose delivery can be followed with
+        get_broadcast_status. With an event_key, the broadcast already sent
+        for that event is returned instead of sending a second one.
+        """
+        try:
+            with transaction.atomic():
+                broadcast = Broadcast.objects.create(
+                    sender=sender,
+                    notification_type=notification_type,
+                    title=title,
+                    message=message,
+                    section=section,
+                    vote=vote,
+                    announcement_id=announcement_id,
+                    recipient_count=section.students.count(),
+                    event_key=event_key
                 )
+        except IntegrityError:
+            if event_key is None:
+                raise
+            return Broadcast.objects.get(event_key=event_key)
+
+        transaction.on_commit(lambda: NotificationService.queue_chunk(broadcast.id, 0))
+        return broadcast
+
+    @staticmethod
+    def queue_chunk(broadcast_id: int, after_student_id: int):
+        async_task(DELIVER_CHUNK_FUNC, broadcast_id, after_student_id, hook=DELIVER_CHUNK_HOOK)
+
+    @staticmethod
+    def deliver_chunk(broadcast_id: int, after_student_id: int, batch_size: int = None):
+        """
+        Write the receipts of the next batch_size students of the roster,
+        in student id order after after_student_id.
+
+        Receipts are unique per (broadcast, recipient) and inserted with
+        ignore_conflicts, so running a chunk again after a crash never
+        duplicates notifications. Returns the last student id of the chunk,
+        or None once the roster is done.
+        """
+        batch_size = batch_size or NOTIFICATION_FANOUT_BATCH_SIZE
+        broadcast = Broadcast.objects.filter(id=broadcast_id).first()
+        if broadcast is None:
+            # Deleted (e.g. announcement cleared) before delivery finished
+            return None
+
+        Enrollment = Section.students.through
+        student_ids = list(
+            Enrollment.objects.filter(
+                section_id=broadcast.section_id,
+                user_id__gt=after_student_id
+            ).order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+        )
+        done = len(student_ids) < batch_size
+
+        with transaction.atomic():
+            Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=student_id,
+                    sender_id=broadcast.sender_id,
+                    notification_type=broadcast.notification_type,
+                    section_id=broadcast.section_id,
+                    vote_id=broadcast.vote_id,
+                    announcement_id=broadcast.announcement_id,
+                    broadcast=broadcast
+                ) for student_id in student_ids
+            ], ignore_conflicts=True)
+
+            # Counted rather than incremented, so retries stay accurate
+            delivered_count = Notification.objects.filter(broadcast=broadcast).count()
+            updates = {
+                'delivered_count': delivered_count,
+                'delivery_status': 'delivered' if done else 'sending',
+            }
+            if done:
+                updates['completed_at'] = timezone.now()
+            Broadcast.objects.filter(id=broadcast.id).update(**updates)
+
+            if delivered_count - broadcast.delivered_count == len(student_ids):
+                transaction.on_commit(lambda: NotificationService.increment_unread_counts(student_ids))
+            else:
+                # A retried chunk: some receipts already existed
+                transaction.on_commit(lambda: NotificationService.invalidate_unread_counts(student_ids))
+            transaction.on_commit(lambda: NotificationService.notify_streams(student_ids))
+
+        return None if done else student_ids[-1]
+
+    @staticmethod
+    def get_broadcast_status(broadcast: Broadcast):
+        return {
+            "id": broadcast.id,
+            "notification_type": broadcast.notification_type,
+            "delivery_status": broadcast.delivery_status,
+            "recipient_count": broadcast.recipient_count,
+            "delivered_count": broadcast.delivered_count,
+            "created_at": broadcast.created_at,
+            "completed_at": broadcast.completed_at
+        }
+
+    @staticmethod
+    def create_announcement(section: Section, professor: User, title: str, message: str):
+        """
+        Record a professor announcement and queue its delivery to the
+        section. Returns the broadcast.
+        """
+        with transaction.atomic():
+            announcement = ProfessorAnnouncement.objects.create(
+                professor=professor,
+                section=section,
+                title=title,
+                message=message
+            )
+
+            broadcast = NotificationService.broadcast_to_section(
+                sender=professor,
+                notification_type='announcement',
+                title=title,
+                message=message,
+                section=section,
+                announcement_id=announcement.id
             )
 
-        if notifications:
-            Notification.objects.bulk_create(notifications)
+            announcement.recipient_count = broadcast.recipient_count
+            announcement.save(update_fields=['recipient_count'])
+
+        return broadcast
+
+    @staticmethod
+    def send_vote_created_notification(vote: Vote, event_key: str = None):
+        """Send notifications to students when a new vote is created"""
+        return NotificationService.broadcast_to_section(
+            sender=vote.professor,
+            notification_type='vote_created',
+            title='New Quiz Vote Available',
+            message=f'A new vote has been created for {vote.section.course.code} - Section {vote.section.section_number}',
+            section=vote.section,
+            vote=vote,  # All notifications reference the same vote
+            event_key=event_key
+        )
 
     @staticmethod
-    def send_vote_completed_notification(vote: Vote):
+    def send_vote_completed_notification(vote: Vote, event_key: str = None):
         """Send notifications when a vote is completed"""
         if not vote.selected_option:
             return
-            
-        students = vote.section.students.all()
-        notifications = []
 
         selected_option = vote.selected_option
         period_time = f"{selected_option.period.start_time.strftime('%H:%M')} - {selected_option.period.end_time.strftime('%H:%M')}"
         online_text = " (Online)" if selected_option.period.number >= 9 else ""
 
-        for student in students:
-            notifications.append(
-                Notification(
-                    recipient=student,
-                    sender=vote.professor,
-                    notification_type='vote_completed',
-                    title='Quiz Time Confirmed',
-                    message=(
-                        f'Quiz for {vote.section.course.code} has been scheduled:\n'
-                        f'Date: {selected_option.date.strftime("%A, %B %d")}\n'
-                        f'Time: {period_time}\n'
-                        f'Room: {vote.room}{online_text}'
-                    ),
-                    section=vote.section,
-                    vote=vote  # Add this reference
-                )
-            )
-
-        if notifications:
-            Notification.objects.bulk_create(notifications)
+        return NotificationService.broadcast_to_section(
+            sender=vote.professor,
+            notification_type='vote_completed',
+            title='Quiz Time Confirmed',
+            message=(
+                f'Quiz for {vote.section.course.code} has been scheduled:\n'
+                f'Date: {selected_option.date.strftime("%A, %B %d")}\n'
+                f'Time: {period_time}\n'
+                f'Room: {vote.room}{online_text}'
+            ),
+            section=vote.section,
+            vote=vote,
+            event_key=event_key
+        )
 
     @staticmethod
     def send_announcement(section_id: int, professor_id: int, title: str, message: str):
@@ -74,33 +207,12 @@ class NotificationService:
                     "message": "Not authorized to send announcements for this section"
                 }
 
-            # Create single professor announcement
-            announcement = ProfessorAnnouncement.objects.create(
-                professor=professor,
-                section=section,
-                title=title,
-                message=message
-            )
-
-            # Create student notifications in bulk
-            notifications = [
-                Notification(
-                    recipient=student,
-                    sender=professor,
-                    notification_type='announcement',
-                    title=title,
-                    message=message,
-                    section=section,
-                    announcement_id=announcement.id  
-                ) for student in section.students.all()
-            ]
-
-            if notifications:
-                Notification.objects.bulk_create(notifications)
+            broadcast = NotificationService.create_announcement(section, professor, title, message)
 
             return {
                 "status": "success",
-                "message": f"Announcement sent to {len(notifications)} students"
+                "message": f"Announcement sent to {broadcast.recipient_count} students",
+                "broadcast_id": broadcast.id
             }
 
         except (Section.DoesNotExist, User.DoesNotExist) as e:
@@ -117,6 +229,14 @@ class NotificationService:
             announcements = ProfessorAnnouncement.objects.filter(professor_id=professor_id)
             
             # Delete related student notifications
+            NotificationService.invalidate_unread_for(Notification.objects.filter(
+                sender_id=professor_id,
+                notification_type='announcement'
+            ))
+            Broadcast.objects.filter(
+                sender_id=professor_id,
+                notification_type='announcement'
+            ).delete()
             Notification.objects.filter(
                 sender_id=professor_id,
                 notification_type='announcement'
@@ -138,6 +258,7 @@ class NotificationService:
     @staticmethod
     def delete_vote_notifications(vote_id: int):
         """Delete all notifications related to a vote"""
+        NotificationService.invalidate_unread_for(Notification.objects.filter(vote_id=vote_id))
         Notification.objects.filter(
             vote_id=vote_id
         ).delete()
@@ -145,16 +266,15 @@ class NotificationService:
     @staticmethod
     def mark_as_read(notification_id: int, user_id: int):
         """Mark a notification as read"""
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                recipient_id=user_id
-            )
-            notification.is_read = True
-            notification.save()
+        updated = Notification.objects.filter(
+            id=notification_id,
+            recipient_id=user_id,
+            is_read=False
+        ).update(is_read=True)
+        if updated:
+            NotificationService.decrement_unread_count(user_id)
             return True
-        except Notification.DoesNotExist:
-            return False
+        return Notification.objects.filter(id=notification_id, recipient_id=user_id).exists()
 
     @staticmethod
     def mark_all_as_read(user_id: int):
@@ -163,11 +283,110 @@ class NotificationService:
             recipient_id=user_id,
             is_read=False
         ).update(is_read=True)
+        cache.set(NotificationService.unread_count_key(user_id), 0, UNREAD_COUNT_CACHE_TIMEOUT)
+
+    # Unread badge counters, one cache key per user and version. Writers
+    # adjust the counter in place; when it is not cached they move the user
+    # to a new version instead, so a count read from the table before their
+    # write and cached after it lands on a key nobody reads any more.
+
+    @staticmethod
+    def unread_version_key(user_id: int) -> str:
+        return f'notif_unread_version_{user_id}'
+
+    @staticmethod
+    def unread_count_key(user_id: int, version: int = None) -> str:
+        if version is None:
+            # Seeded from the clock so an evicted version is never reused
+            version = cache.get_or_set(
+                NotificationService.unread_version_key(user_id), time.time_ns, timeout=None
+            )
+        return f'notif_unread_{user_id}_v{version}'
 
     @staticmethod
     def get_unread_count(user_id: int) -> int:
         """Get count of unread notifications for a user"""
-        return Notification.objects.filter(
-            recipient_id=user_id,
-            is_read=False
-        ).count()
\ No newline at end of file
+        # The version is read before counting, see above
+        key = NotificationService.unread_count_key(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = Notification.objects.filter(
+                recipient_id=user_id,
+                is_read=False
+            ).count()
+            cache.add(key, count, UNREAD_COUNT_CACHE_TIMEOUT)
+        return count
+
+    @staticmethod
+    def increment_unread_counts(user_ids, delta: int = 1):
+        user_ids = list(user_ids)
+        versions = cache.get_many([NotificationService.unread_version_key(user_id) for user_id in user_ids])
+        stale = []
+        for user_id in user_ids:
+            version = versions.get(NotificationService.unread_version_key(user_id))
+            try:
+                if version is None:
+                    raise ValueError
+                cache.incr(NotificationService.unread_count_key(user_id, version), delta)
+            except ValueError:
+                stale.append(user_id)
+        NotificationService.invalidate_unread_counts(stale)
+
+    @staticmethod
+    def write_version_key(user_id: int) -> str:
+        return f'notif_write_version_{user_id}'
+
+    @staticmethod
+    def get_write_version(user_id: int):
+        """Changes whenever notifications are written for the user; None if not cached"""
+        return cache.get(NotificationService.write_version_key(user_id))
+
+    @staticmethod
+    def notify_streams(user_ids):
+        """
+        Wake up the open notification streams of these users. Call it once
+        new notifications are committed: it also bumps their write version,
+        which streams in other processes check.
+        """
+        from .notification_stream_service import NotificationStreamService
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            key = NotificationService.write_version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+        NotificationStreamService.publish(user_ids)
+
+    @staticmethod
+    def decrement_unread_count(user_id: int):
+        key = NotificationService.unread_count_key(user_id)
+        try:
+            if cache.decr(key) >= 0:
+                return
+        except ValueError:
+            pass
+        NotificationService.invalidate_unread_counts([user_id])
+
+    @staticmethod
+    def invalidate_unread_counts(user_ids):
+        """Move these users to a new counter version, recomputed on the next read"""
+        for user_id in user_ids:
+            key = NotificationService.unread_version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    @staticmethod
+    def invalidate_unread_for(notifications):
+        """
+        Drop the counters of everyone with an unread notification among
+        `notifications` once the transaction commits. Call it before
+        deleting them.
+        """
+        recipient_ids = list(
+            notifications.filter(is_read=False).values_list('recipient_id', flat=True).distinct()
+        )
+        if recipient_ids:
+            transaction.on_commit(lambda: NotificationService.invalidate_unread_counts(recipient_ids))
\ No newline at end of file
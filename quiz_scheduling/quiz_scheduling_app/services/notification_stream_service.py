@@ -0,0 +1,200 @@
+# quiz_scheduling_app/services/notification_stream_service.py
+
+import asyncio
+import json
+import secrets
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+from ..models import Notification
+from ..pagination import FeedCursorPagination
+from .notification_service import NotificationService
+
+# How often an idle stream checks the user's cached write version for
+# notifications written by other processes (a cache read, not a query)
+NOTIFICATION_STREAM_CHECK_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_CHECK_SECONDS', 5)
+# Keep-alive comment interval, below typical proxy idle timeouts
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15)
+# Streams are closed after this long; EventSource reconnects on its own
+NOTIFICATION_STREAM_MAX_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+# Stream tickets are single use and expire quickly: they end up in access logs
+NOTIFICATION_STREAM_TICKET_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_TICKET_SECONDS', 30)
+# Pub/sub used to wake up streams, see InProcessNotificationBus
+NOTIFICATION_BUS = getattr(
+    settings, 'NOTIFICATION_BUS',
+    'quiz_scheduling_app.services.notification_stream_service.InProcessNotificationBus'
+)
+
+# Notifications sent in one batch of stream events
+STREAM_BATCH_SIZE = 50
+
+
+class InProcessNotificationBus:
+    """
+    Wakes up the open streams of a user when notifications are written in
+    the same process. Publishing is thread safe, so sync code can publish
+    to streams served by the event loop.
+
+    Fan-outs are delivered by django-q workers, which run in their own
+    processes, so with this bus their notifications only reach streams
+    through the periodic write version check (NOTIFICATION_STREAM_CHECK_SECONDS).
+    A cross-process bus, e.g. Redis pub/sub, with the same subscribe /
+    unsubscribe / publish methods can replace this one through the
+    NOTIFICATION_BUS setting, or NotificationStreamService.set_bus in tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        """Queue receiving a wake-up for every publish to user_id"""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = [entry for entry in self._subscribers.get(user_id, []) if entry[1] is not queue]
+            if subscribers:
+                self._subscribers[user_id] = subscribers
+            else:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_ids, message=None):
+        with self._lock:
+            targets = [entry for user_id in user_ids for entry in self._subscribers.get(user_id, [])]
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+
+class NotificationStreamService:
+    _bus = None
+
+    @staticmethod
+    def get_bus():
+        if NotificationStreamService._bus is None:
+            NotificationStreamService._bus = import_string(NOTIFICATION_BUS)()
+        return NotificationStreamService._bus
+
+    @staticmethod
+    def set_bus(bus):
+        NotificationStreamService._bus = bus
+
+    @staticmethod
+    def publish(user_ids):
+        """Tell the open streams of these users that they have new notifications"""
+        NotificationStreamService.get_bus().publish(list(user_ids))
+
+    @staticmethod
+    def ticket_key(ticket: str) -> str:
+        return f'notif_stream_ticket_{ticket}'
+
+    @staticmethod
+    def issue_ticket(user_id: int) -> str:
+        """Short-lived, single use ticket opening one stream for user_id"""
+        ticket = secrets.token_urlsafe(32)
+        cache.set(NotificationStreamService.ticket_key(ticket), user_id, NOTIFICATION_STREAM_TICKET_SECONDS)
+        return ticket
+
+    @staticmethod
+    def redeem_ticket(ticket: str):
+        """User id of a ticket, or None; a ticket is only accepted once"""
+        key = NotificationStreamService.ticket_key(ticket)
+        user_id = cache.get(key)
+        # Of two requests with the same ticket only one deletes it
+        if user_id is None or not cache.delete(key):
+            return None
+        return user_id
+
+    @staticmethod
+    def latest_cursor(user_id):
+        """Cursor of the user's newest notification, so a new stream only pushes newer ones"""
+        latest = Notification.objects.filter(
+            recipient_id=user_id
+        ).order_by('-created_at', '-id').only('id', 'created_at').first()
+        return FeedCursorPagination.encode_cursor(latest) if latest else None
+
+    @staticmethod
+    def fetch_since(request, cursor):
+        """New notifications of the requesting user as (cursor, payload) pairs, oldest first"""
+        from ..serializers import NotificationSerializer
+
+        queryset = Notification.objects.filter(recipient=request.user).select_related('sender', 'broadcast')
+        if cursor:
+            rows = FeedCursorPagination.newer_than(queryset, cursor, STREAM_BATCH_SIZE)
+        else:
+            rows = list(queryset.order_by('created_at', 'id')[:STREAM_BATCH_SIZE])
+
+        serializer = NotificationSerializer(rows, many=True, context={'request': request, 'expand': set()})
+        return [
+            (FeedCursorPagination.encode_cursor(row), payload)
+            for row, payload in zip(rows, serializer.data)
+        ]
+
+    @staticmethod
+    def format_event(cursor, payload):
+        data = json.dumps(payload, cls=DjangoJSONEncoder)
+        return f"id: {cursor}\nevent: notification\ndata: {data}\n\n"
+
+    @staticmethod
+    async def stream(request, cursor=None):
+        """
+        Server-sent events for the requesting user: one `notification`
+        event per new notification, with the feed cursor as event id so a
+        reconnecting client resumes with Last-Event-ID.
+
+        An idle stream waits on the bus and, every few seconds, compares the
+        user's write version (bumped by every notification insert, see
+        NotificationService.notify_streams); the database is only queried
+        when either says something changed. With the default in-process bus
+        the version check is what picks up fan-outs from the django-q
+        workers. A stream resumed from a cursor first sends what it missed.
+        """
+        user_id = request.user.id
+        bus = NotificationStreamService.get_bus()
+        queue = bus.subscribe(user_id)
+        loop = asyncio.get_running_loop()
+
+        try:
+            # Read before the cursor, so writes in between are not missed
+            write_version = await sync_to_async(NotificationService.get_write_version)(user_id)
+            if cursor is None:
+                cursor = await sync_to_async(NotificationStreamService.latest_cursor)(user_id)
+            else:
+                # Replay what was written since the cursor right away
+                queue.put_nowait(None)
+
+            yield "retry: 3000\n\n"
+            started = last_sent = loop.time()
+
+            while loop.time() - started < NOTIFICATION_STREAM_MAX_SECONDS:
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=NOTIFICATION_STREAM_CHECK_SECONDS)
+                    changed = True
+                except asyncio.TimeoutError:
+                    current = await sync_to_async(NotificationService.get_write_version)(user_id)
+                    changed = current != write_version
+                    write_version = current
+
+                if changed:
+                    events = await sync_to_async(NotificationStreamService.fetch_since)(request, cursor)
+                    for event_cursor, payload in events:
+                        cursor = event_cursor
+                        yield NotificationStreamService.format_event(event_cursor, payload)
+                    if events:
+                        last_sent = loop.time()
+                        if len(events) == STREAM_BATCH_SIZE:
+                            # More are waiting, fetch them right away
+                            queue.put_nowait(None)
+                        continue
+
+                if loop.time() - last_sent >= NOTIFICATION_STREAM_HEARTBEAT_SECONDS:
+                    last_sent = loop.time()
+                    yield ": keep-alive\n\n"
+        finally:
+            bus.unsubscribe(user_id, queue)
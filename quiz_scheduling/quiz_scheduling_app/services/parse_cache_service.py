@@ -0,0 +1,103 @@
+# quiz_scheduling_app/services/parse_cache_service.py
+
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from ..models import ParsedSchedule
+
+# Parsed PDFs kept; the least recently used ones are evicted beyond this
+PDF_PARSE_CACHE_MAX_ENTRIES = getattr(settings, 'PDF_PARSE_CACHE_MAX_ENTRIES', 5000)
+
+# Bump when PDFProcessor.parse_* changes what it returns
+PARSER_VERSION = 1
+
+HITS_KEY = 'pdf_parse_cache_hits'
+MISSES_KEY = 'pdf_parse_cache_misses'
+
+
+class ParseCacheService:
+    """
+    Parsed schedule rows cached by the SHA-256 of the PDF bytes. A repeat
+    upload of the same file skips tabula and goes straight to the import.
+    """
+
+    @staticmethod
+    def digest(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    @staticmethod
+    def get(sha256: str, kind: str):
+        """Cached rows of a PDF, or None"""
+        entry = ParsedSchedule.objects.filter(
+            sha256=sha256, kind=kind, parser_version=PARSER_VERSION
+        ).only('id', 'rows').first()
+        if entry is None:
+            return None
+        ParsedSchedule.objects.filter(id=entry.id).update(
+            hits=F('hits') + 1,
+            last_used_at=timezone.now()
+        )
+        return entry.rows
+
+    @staticmethod
+    def put(sha256: str, kind: str, rows):
+        # Two uploads of the same file may be parsed at the same time
+        ParsedSchedule.objects.bulk_create([
+            ParsedSchedule(sha256=sha256, kind=kind, parser_version=PARSER_VERSION, rows=rows)
+        ], ignore_conflicts=True)
+        ParseCacheService.evict()
+
+    @staticmethod
+    def evict(max_entries: int = None):
+        """Delete the least recently used entries beyond max_entries"""
+        max_entries = PDF_PARSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        excess = ParsedSchedule.objects.count() - max_entries
+        if excess <= 0:
+            return 0
+        ids = list(
+            ParsedSchedule.objects.order_by('last_used_at', 'id').values_list('id', flat=True)[:excess]
+        )
+        deleted, _ = ParsedSchedule.objects.filter(id__in=ids).delete()
+        return deleted
+
+    @staticmethod
+    def get_or_parse(file_bytes: bytes, kind: str, parse):
+        """Rows of a PDF from the cache, or from parse(file_bytes) on a miss"""
+        sha256 = ParseCacheService.digest(file_bytes)
+        rows = ParseCacheService.get(sha256, kind)
+        if rows is not None:
+            ParseCacheService.count(HITS_KEY)
+            return rows
+
+        ParseCacheService.count(MISSES_KEY)
+        rows = parse(file_bytes)
+        ParseCacheService.put(sha256, kind, rows)
+        return rows
+
+    @staticmethod
+    def count(key: str):
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr; losing one count is fine
+            pass
+
+    @staticmethod
+    def stats():
+        hits = cache.get(HITS_KEY, 0)
+        misses = cache.get(MISSES_KEY, 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": ParsedSchedule.objects.count(),
+            "max_entries": PDF_PARSE_CACHE_MAX_ENTRIES
+        }
+
+    @staticmethod
+    def reset_stats():
+        cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,185 @@
+# quiz_scheduling_app/services/schedule_importer.py
+
+import logging
+from typing import Dict, Iterable, List
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from ..models import Course, Period, Schedule, Section
+
+logger = logging.getLogger(__name__)
+
+# The period table only changes through initialize_periods; the map is also
+# dropped whenever a Period is saved or deleted (see signals.py)
+PERIOD_MAP_CACHE_TIMEOUT = getattr(settings, 'PERIOD_MAP_CACHE_TIMEOUT', 60 * 60)
+PERIOD_MAP_CACHE_KEY = 'period_ids_by_number'
+
+# Rows per INSERT statement
+IMPORT_BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+
+class ScheduleImporter:
+    """
+    Set-based writes of parsed schedules: every course, section and
+    schedule of an import is written with a fixed number of bulk queries,
+    however many rows there are. Bulk inserts send no post_save signals,
+    so callers add the busy slots of the classes that were inserted.
+    """
+
+    @staticmethod
+    def period_ids_by_number() -> Dict[int, int]:
+        period_ids = cache.get(PERIOD_MAP_CACHE_KEY)
+        if period_ids is None:
+            period_ids = dict(Period.objects.values_list('number', 'id'))
+            cache.set(PERIOD_MAP_CACHE_KEY, period_ids, PERIOD_MAP_CACHE_TIMEOUT)
+        return period_ids
+
+    @staticmethod
+    def invalidate_period_map():
+        cache.delete(PERIOD_MAP_CACHE_KEY)
+
+    @staticmethod
+    def upsert_courses(names_by_code: Dict[str, str]) -> Dict[str, int]:
+        """
+        Course ids by code, creating the missing courses. Course codes are
+        not unique in the table, so like get_or_create the oldest match wins.
+        """
+        course_ids = {}
+        for code, course_id in Course.objects.filter(
+            code__in=list(names_by_code)
+        ).order_by('-id').values_list('code', 'id'):
+            course_ids[code] = course_id
+
+        missing = [code for code in names_by_code if code not in course_ids]
+        if missing:
+            Course.objects.bulk_create(
+                [Course(code=code, name=names_by_code[code]) for code in missing],
+                batch_size=IMPORT_BATCH_SIZE
+            )
+            # Primary keys are not returned by bulk inserts on MySQL
+            for code, course_id in Course.objects.filter(
+                code__in=missing
+            ).order_by('-id').values_list('code', 'id'):
+                course_ids[code] = course_id
+        return course_ids
+
+    @staticmethod
+    def upsert_sections(keys: Iterable[tuple], professor_ids: Dict[tuple, int] = None) -> Dict[tuple, int]:
+        """
+        Section ids by (course_id, section_number, activity_type), creating
+        the missing sections. Sections listed in professor_ids are assigned
+        that professor, whether they are new or not; others keep theirs.
+        """
+        keys = list(dict.fromkeys(keys))
+        professor_ids = professor_ids or {}
+        assigned = [
+            Section(course_id=key[0], section_number=key[1], activity_type=key[2], professor_id=professor_ids[key])
+            for key in keys if key in professor_ids
+        ]
+        others = [
+            Section(course_id=key[0], section_number=key[1], activity_type=key[2])
+            for key in keys if key not in professor_ids
+        ]
+        if assigned:
+            # MySQL upserts on any unique key and does not accept a target
+            unique_fields = (
+                ['course', 'section_number', 'activity_type']
+                if connection.features.supports_update_conflicts_with_target else None
+            )
+            Section.objects.bulk_create(
+                assigned,
+                batch_size=IMPORT_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=['professor']
+            )
+        if others:
+            Section.objects.bulk_create(others, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True)
+
+        wanted = set(keys)
+        section_ids = {}
+        for section_id, course_id, number, activity_type in Section.objects.filter(
+            course_id__in={key[0] for key in keys}
+        ).values_list('id', 'course_id', 'section_number', 'activity_type'):
+            if (course_id, number, activity_type) in wanted:
+                section_ids[(course_id, number, activity_type)] = section_id
+        return section_ids
+
+    @staticmethod
+    def insert_schedules(slots: Iterable[tuple]) -> List[Schedule]:
+        """
+        Create the missing (section_id, day, period_id) classes. Returns
+        the Schedule rows this call inserted; existing ones are left alone.
+        """
+        slots = set(slots)
+        if not slots:
+            return []
+        section_ids = {section_id for section_id, _, _ in slots}
+        existing = set(Schedule.objects.filter(
+            section_id__in=section_ids
+        ).values_list('section_id', 'day', 'period_id'))
+        new_slots = slots - existing
+        if not new_slots:
+            return []
+
+        Schedule.objects.bulk_create(
+            [Schedule(section_id=section_id, day=day, period_id=period_id) for section_id, day, period_id in new_slots],
+            batch_size=IMPORT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        # Primary keys are not returned by bulk inserts on MySQL
+        return [
+            schedule for schedule in Schedule.objects.filter(
+                section_id__in={section_id for section_id, _, _ in new_slots}
+            )
+            if (schedule.section_id, schedule.day, schedule.period_id) in new_slots
+        ]
+
+    @staticmethod
+    def insert_enrollments(pairs: Iterable[tuple]):
+        """
+        Create the missing (section_id, student_id) enrollments. No
+        m2m_changed signal is sent, so busy slots must be rebuilt.
+        """
+        Enrollment = Section.students.through
+        Enrollment.objects.bulk_create(
+            [Enrollment(section_id=section_id, user_id=student_id) for section_id, student_id in pairs],
+            batch_size=IMPORT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def import_rows(rows: List[Dict], professor_id: int = None):
+        """
+        Write parsed PDF rows, assigning every section to professor_id if
+        given. Returns (section ids by row, periods found per row and day,
+        newly inserted Schedule rows); period numbers missing from the
+        period table are skipped.
+        """
+        period_ids = ScheduleImporter.period_ids_by_number()
+        course_ids = ScheduleImporter.upsert_courses({row['course_code']: row['course_name'] for row in rows})
+
+        row_keys = [
+            (course_ids[row['course_code']], row['section_number'], row['activity_type'])
+            for row in rows
+        ]
+        section_ids = ScheduleImporter.upsert_sections(
+            row_keys, {key: professor_id for key in row_keys} if professor_id else None
+        )
+
+        slots = []
+        found_periods = []
+        for row, key in zip(rows, row_keys):
+            found = {}
+            for day, period_numbers in row['schedule'].items():
+                found[day] = []
+                for period_number in period_numbers:
+                    if period_number not in period_ids:
+                        logger.warning(f"Period number {period_number} not found in database")
+                        continue
+                    slots.append((section_ids[key], day.lower(), period_ids[period_number]))
+                    found[day].append(period_number)
+            found_periods.append(found)
+        new_schedules = ScheduleImporter.insert_schedules(slots)
+
+        return [section_ids[key] for key in row_keys], found_periods, new_schedules
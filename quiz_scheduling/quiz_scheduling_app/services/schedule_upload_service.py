@@ -0,0 +1,149 @@
+# quiz_scheduling_app/services/schedule_upload_service.py
+
+import logging
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_q.tasks import async_task
+from ..models import (
+    Broadcast, Notification, ProfessorAnnouncement, Quiz, Section, StudentVote,
+    UploadJob, User, Vote, VoteOption
+)
+from .notification_service import NotificationService
+from .parse_cache_service import ParseCacheService
+from .pdf_processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+PROCESS_UPLOAD_FUNC = 'quiz_scheduling_app.tasks.process_upload_job'
+PROCESS_UPLOAD_HOOK = 'quiz_scheduling_app.tasks.upload_job_hook'
+
+
+class ScheduleUploadService:
+    @staticmethod
+    def create_job(user: User, pdf_file) -> UploadJob:
+        """Store an uploaded schedule PDF and queue its processing once committed"""
+        job = UploadJob.objects.create(user=user, file=pdf_file)
+        transaction.on_commit(
+            lambda: async_task(PROCESS_UPLOAD_FUNC, job.id, hook=PROCESS_UPLOAD_HOOK)
+        )
+        return job
+
+    @staticmethod
+    def get_job_status(job: UploadJob):
+        return {
+            "id": job.id,
+            "status": job.status,
+            "message": job.message,
+            "result": job.result,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at
+        }
+
+    @staticmethod
+    def run(job_id: int):
+        """
+        Parse the PDF of an upload job, then import it. Parsing (the slow
+        tabula step, skipped for a PDF already in the parse cache) runs
+        outside any transaction; only the writes of the import share one
+        short transaction.
+        """
+        job = UploadJob.objects.select_related('user').get(id=job_id)
+        user = job.user
+        UploadJob.objects.filter(id=job.id).update(status='parsing', started_at=timezone.now())
+
+        try:
+            with job.file.open('rb') as pdf_file:
+                file_bytes = pdf_file.read()
+
+            if user.user_type == 'faculty':
+                rows = ParseCacheService.get_or_parse(file_bytes, 'faculty', PDFProcessor.parse_faculty_schedule)
+            else:
+                rows = ParseCacheService.get_or_parse(file_bytes, 'student', PDFProcessor.parse_student_schedule)
+
+            UploadJob.objects.filter(id=job.id).update(status='importing')
+            with transaction.atomic():
+                if user.user_type == 'faculty':
+                    ScheduleUploadService.reset_faculty_schedule(user)
+                    result = PDFProcessor.import_faculty_schedule(rows, user)
+                else:
+                    result = PDFProcessor.import_student_schedule(rows, user)
+        except Exception as e:
+            logger.error(f"Upload job {job.id} failed: {str(e)}", exc_info=True)
+            ScheduleUploadService.mark_failed(job.id, str(e))
+            return None
+
+        # The parsed result is kept; the PDF itself is no longer needed
+        job.file.delete(save=False)
+        UploadJob.objects.filter(id=job.id).update(
+            status='done',
+            message=result['message'],
+            result=result,
+            file='',
+            finished_at=timezone.now()
+        )
+        return result
+
+    @staticmethod
+    def mark_failed(job_id: int, message: str):
+        """Record a failed job and drop its PDF, which will not be read again"""
+        job = UploadJob.objects.filter(id=job_id).first()
+        if job is None:
+            return
+        if job.file:
+            job.file.delete(save=False)
+        UploadJob.objects.filter(id=job_id).update(
+            status='failed',
+            message=message,
+            file='',
+            finished_at=timezone.now()
+        )
+
+    @staticmethod
+    def reset_faculty_schedule(professor: User):
+        """
+        Remove a professor's votes, announcements and section assignments
+        before a new faculty schedule is imported
+        """
+        # Get all sections where this professor teaches
+        old_sections = Section.objects.filter(professor=professor)
+
+        # Get all votes associated with this professor
+        votes_to_delete = Vote.objects.filter(professor=professor)
+
+        NotificationService.invalidate_unread_for(Notification.objects.filter(
+            Q(sender=professor) | Q(section__in=old_sections)
+        ))
+        Broadcast.objects.filter(notification_type='announcement', sender_id=professor.id).delete()
+        Notification.objects.filter(Q(notification_type='announcement'), sender_id=professor.id).delete()
+        Notification.objects.filter(section__in=old_sections, notification_type='announcement').delete()
+
+        ProfessorAnnouncement.objects.filter(professor=professor).delete()
+
+        # For each vote, delete related data
+        for vote in votes_to_delete:
+            # Delete notifications related to the vote
+            Notification.objects.filter(
+                Q(notification_type='vote_created') |
+                Q(notification_type='vote_completed'),
+                vote=vote
+            ).delete()
+
+            # Delete student votes
+            StudentVote.objects.filter(vote=vote).delete()
+
+            # Delete vote options
+            VoteOption.objects.filter(vote=vote).delete()
+
+            # Delete quizzes related to the vote
+            Quiz.objects.filter(
+                section=vote.section,
+                date__in=[opt.date for opt in vote.options.all()],
+            ).delete()
+
+        # Finally delete the votes
+        votes_to_delete.delete()
+
+        # Clear professor assignments
+        old_sections.update(professor=None)
@@ -0,0 +1,154 @@
+# quiz_scheduling_app/services/tabula_pool.py
+
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Parser processes kept per pool; 0 parses in the calling process instead
+TABULA_POOL_SIZE = getattr(settings, 'TABULA_POOL_SIZE', 1)
+# Parses handled by one process before it is replaced, bounding JVM heap growth
+TABULA_POOL_MAX_TASKS = getattr(settings, 'TABULA_POOL_MAX_TASKS', 200)
+# Create the pool when a django-q worker starts and start the JVM of every
+# pool process then, rather than on the first parse
+TABULA_POOL_WARM_UP = getattr(settings, 'TABULA_POOL_WARM_UP', True)
+# Seconds to wait for one parse; below the django-q task timeout
+TABULA_POOL_TIMEOUT = getattr(settings, 'TABULA_POOL_TIMEOUT', 50)
+# Options passed to the JVM when it is started
+TABULA_JAVA_OPTIONS = getattr(settings, 'TABULA_JAVA_OPTIONS', ['-Xmx512m'])
+
+
+def _blank_pdf() -> bytes:
+    """Smallest valid one page PDF, parsed to warm up a process"""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 72 72] >>',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return pdf
+
+
+BLANK_PDF = _blank_pdf()
+
+
+def warm_up():
+    """
+    Start the JVM of the current process by parsing a blank page through
+    tabula's public API. tabula-py keeps the JVM for the lifetime of the
+    process, so later parses here skip the JVM start and class loading.
+    """
+    try:
+        read_tables(BLANK_PDF, {'pages': 1, 'silent': True})
+    except Exception as e:
+        # Not fatal: the first parse starts the JVM instead
+        logger.warning(f"Tabula warm-up failed: {str(e)}")
+    return multiprocessing.current_process().pid
+
+
+def read_tables(file_bytes: bytes, options: dict):
+    import jpype
+    import tabula
+    # JVM options only apply when the JVM starts; tabula warns if they are
+    # passed again afterwards
+    if not jpype.isJVMStarted():
+        options = {'java_options': list(TABULA_JAVA_OPTIONS), **options}
+    return tabula.read_pdf(io.BytesIO(file_bytes), **options)
+
+
+class TabulaPool:
+    """
+    Long-lived processes running tabula, each keeping its JVM warm.
+
+    One pool is created per process that parses PDFs, in practice each
+    django-q worker when it starts (see signals.py). Pool processes are
+    spawned rather than forked, so they never inherit a JVM or database
+    connections. Each process is replaced after TABULA_POOL_MAX_TASKS
+    parses; a pool whose process died or whose parse timed out is
+    replaced as a whole.
+    """
+    _executor = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def create_executor(size=None, max_tasks=None, warm=None):
+        size = size or TABULA_POOL_SIZE
+        executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_up if (TABULA_POOL_WARM_UP if warm is None else warm) else None,
+            max_tasks_per_child=max_tasks or TABULA_POOL_MAX_TASKS
+        )
+        # Processes are started on demand; one no-op per slot starts them all
+        wait([executor.submit(int) for _ in range(size)])
+        return executor
+
+    @staticmethod
+    def get_executor():
+        with TabulaPool._lock:
+            if TabulaPool._executor is None:
+                TabulaPool._executor = TabulaPool.create_executor()
+            return TabulaPool._executor
+
+    @staticmethod
+    def start():
+        """Create the pool ahead of the first parse"""
+        if TABULA_POOL_SIZE:
+            TabulaPool.get_executor()
+
+    @staticmethod
+    def shutdown(kill=False):
+        """Drop the pool; kill also stops processes that are still parsing"""
+        with TabulaPool._lock:
+            executor, TabulaPool._executor = TabulaPool._executor, None
+        if executor is None:
+            return
+        # concurrent.futures has no public way to stop a running call
+        processes = list((executor._processes or {}).values()) if kill else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    @staticmethod
+    def _call(func, args):
+        future = TabulaPool.get_executor().submit(func, *args)
+        try:
+            return future.result(timeout=TABULA_POOL_TIMEOUT)
+        except TimeoutError:
+            # The call keeps its process busy (e.g. a stuck JVM) until it is
+            # killed; the next call starts a new pool
+            logger.warning(f"Tabula parse timed out after {TABULA_POOL_TIMEOUT}s, restarting the pool")
+            TabulaPool.shutdown(kill=True)
+            raise
+
+    @staticmethod
+    def run(func, *args):
+        """func(*args) in a pool process, or in this process when the pool size is 0"""
+        if not TABULA_POOL_SIZE:
+            return func(*args)
+
+        try:
+            return TabulaPool._call(func, args)
+        except BrokenProcessPool:
+            # A pool process died (e.g. the JVM crashed): start a new pool once
+            logger.warning("Tabula pool broke, restarting it")
+            TabulaPool.shutdown(kill=True)
+            return TabulaPool._call(func, args)
+
+    @staticmethod
+    def read_pdf(file_bytes: bytes, **options):
+        """tabula.read_pdf on PDF bytes, run by a warm pool process"""
+        return TabulaPool.run(read_tables, file_bytes, options)
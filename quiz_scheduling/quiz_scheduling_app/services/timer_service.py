@@ -0,0 +1,42 @@
+# quiz_scheduling_app/services/timer_service.py
+
+from django.db import transaction
+from django_q.models import Schedule as TaskSchedule
+
+
+class TimerService:
+    """
+    Named wake-up timers on the django-q scheduler. Each timer is one ONCE
+    schedule that is moved to the earliest time it is needed, instead of
+    one schedule per pending item.
+    """
+
+    @staticmethod
+    def arm(name, func, run_at):
+        """
+        Make sure the timer runs func no later than run_at.
+        Returns the time the timer is set to.
+        """
+        with transaction.atomic():
+            timer = TaskSchedule.objects.select_for_update().filter(name=name).first()
+
+            if timer is None:
+                TaskSchedule.objects.create(
+                    name=name,
+                    func=func,
+                    schedule_type=TaskSchedule.ONCE,
+                    repeats=1,
+                    next_run=run_at
+                )
+                return run_at
+
+            # Already armed for an earlier (or the same) time
+            if timer.repeats != 0 and timer.next_run <= run_at:
+                return timer.next_run
+
+            # A fired ONCE schedule is kept with repeats=0; re-enable it
+            timer.func = func
+            timer.next_run = run_at
+            timer.repeats = 1
+            timer.save(update_fields=['func', 'next_run', 'repeats'])
+            return run_at
@@ -0,0 +1,74 @@
+# quiz_scheduling_app/services/vote_expiry_service.py
+
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from ..models import Vote
+from .timer_service import TimerService
+
+# Deadlines are rounded up to slots of this many seconds, so votes that end
+# close together are completed by the same run
+VOTE_EXPIRY_GRANULARITY_SECONDS = getattr(settings, 'VOTE_EXPIRY_GRANULARITY_SECONDS', 60)
+# Pause before votes a run left overdue (a chunk failed) are tried again
+VOTE_EXPIRY_RETRY_SECONDS = getattr(settings, 'VOTE_EXPIRY_RETRY_SECONDS', 5 * 60)
+
+TIMER_NAME = 'vote-expiry-timer'
+TIMER_FUNC = 'quiz_scheduling_app.tasks.process_vote_expiry_timer'
+
+
+class VoteExpiryService:
+    """
+    Single wake-up timer for vote expiry.
+
+    Instead of one django-q schedule per vote, one named timer (see
+    TimerService) is kept pointing at the earliest pending deadline. Open votes themselves
+    form the queue: the (is_active, ends_at) index on Vote gives the next
+    deadline with one indexed lookup, so the overhead does not depend on
+    how many votes are open.
+    """
+
+    @staticmethod
+    def slot_for(deadline):
+        """Round a deadline up to the end of its timer slot"""
+        granularity = VOTE_EXPIRY_GRANULARITY_SECONDS
+        timestamp = math.ceil(deadline.timestamp() / granularity) * granularity
+        return deadline + timedelta(seconds=timestamp - deadline.timestamp())
+
+    @staticmethod
+    def arm(deadline):
+        """
+        Make sure the timer fires no later than the slot of a deadline.
+        Returns the time the timer is set to.
+        """
+        return TimerService.arm(TIMER_NAME, TIMER_FUNC, VoteExpiryService.slot_for(deadline))
+
+    @staticmethod
+    def next_deadline(after=None):
+        """
+        Earliest end time among open votes (after a given time, if any), or
+        None; in the past if a vote is overdue
+        """
+        votes = Vote.objects.filter(is_active=True, ends_at__isnull=False)
+        if after is not None:
+            votes = votes.filter(ends_at__gt=after)
+        return votes.order_by('ends_at').values_list('ends_at', flat=True).first()
+
+    @staticmethod
+    def rearm():
+        """
+        Point the timer at the next pending deadline after a run. Votes the
+        run left overdue are retried VOTE_EXPIRY_RETRY_SECONDS later, or at
+        the next upcoming deadline if that comes first, since every run
+        sweeps all votes that are due.
+        """
+        deadline = VoteExpiryService.next_deadline()
+        if deadline is None:
+            return None
+        now = timezone.now()
+        if deadline <= now:
+            deadline = now + timedelta(seconds=VOTE_EXPIRY_RETRY_SECONDS)
+            upcoming = VoteExpiryService.next_deadline(after=now)
+            if upcoming is not None:
+                deadline = min(deadline, upcoming)
+        return VoteExpiryService.arm(deadline)
@@ -1,42 +1,30 @@
 # quiz_scheduling_app/services/vote_service.py
 
 from typing import List, Dict
-from django.db.models import Q
-from ..models import Schedule, Section, Period, User, Vote, VoteOption, StudentVote
+from ..models import Section, Period, User, Vote, VoteOption, StudentVote
+from .availability_service import AvailabilityService
 
 class VoteService:
     @staticmethod
     def get_common_periods(section_id: int) -> List[Dict]:
-        """Get common free periods for all students in a section"""
+        """
+        Get common free periods for all students in a section.
+        A (day, period) slot is common when no enrolled student has a class
+        in it, so the result is the complement of the occupied slots.
+        """
         section = Section.objects.get(id=section_id)
-        students = section.students.all()
         
         # Get all periods 1-12 
         available_periods = Period.objects.filter(number__lte=12).order_by('number')
+
+        occupied = AvailabilityService.occupied_weekly_slots(section.id, max_period=12)
         
         common_periods = []
         days = ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday']
         
         for day in days:
             for period in available_periods:
-                # Check if period is free for all students
-                is_common = True
-                for student in students:
-                    # Get all sections student is enrolled in
-                    student_sections = student.enrolled_sections.all()
-                    
-                    # Check if student has any class in this period
-                    has_class = Schedule.objects.filter(
-                        section__in=student_sections,
-                        day=day,
-                        period=period
-                    ).exists()
-                    
-                    if has_class:
-                        is_common = False
-                        break
-                
-                if is_common:
+                if (day, period.number) not in occupied:
                     common_periods.append({
                         'day': day,
                         'period': period.number,
@@ -1,11 +1,80 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import Vote
+from django_q.conf import Conf
+from django_q.signals import post_spawn
+from . import events
+from .models import Period, Quiz, Schedule, Section, Vote
+from .services.busy_slot_service import BusySlotService
 from .services.notification_service import NotificationService
+from .services import tabula_pool
+from .services.schedule_importer import ScheduleImporter
 
 @receiver(post_save, sender=Vote)
 def handle_vote_notifications(sender, instance, created, **kwargs):
     if created:
-        NotificationService.send_vote_created_notification(instance)
+        events.publish(events.VOTE_CREATED, vote_id=instance.id)
     elif not instance.is_active and instance.room:
-        NotificationService.send_vote_completed_notification(instance)
\ No newline at end of file
+        events.publish(events.VOTE_COMPLETED, vote_id=instance.id)
+
+
+# Domain event handlers
+
+@events.subscribe(events.VOTE_CREATED)
+def notify_vote_created(event_key, vote_id):
+    vote = Vote.objects.select_related('section__course', 'professor').filter(id=vote_id).first()
+    if vote:
+        NotificationService.send_vote_created_notification(vote, event_key=event_key)
+
+@events.subscribe(events.VOTE_COMPLETED)
+def notify_vote_completed(event_key, vote_id):
+    vote = Vote.objects.select_related(
+        'section__course', 'professor', 'selected_option__period'
+    ).filter(id=vote_id).first()
+    if vote:
+        NotificationService.send_vote_completed_notification(vote, event_key=event_key)
+
+
+# Busy slot maintenance. Deleting a schedule, quiz, section or student
+# removes the matching StudentBusySlot rows through their CASCADE foreign keys.
+
+@receiver(m2m_changed, sender=Section.students.through)
+def handle_enrollment_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and pk_set:
+        if reverse:
+            # student.enrolled_sections.add(...)
+            BusySlotService.add_student_sections(instance.pk, pk_set)
+        else:
+            # section.students.add(...)
+            BusySlotService.add_enrollments(instance.pk, pk_set)
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            BusySlotService.remove_enrollments(pk_set, [instance.pk])
+        else:
+            BusySlotService.remove_enrollments([instance.pk], pk_set)
+    elif action == 'post_clear':
+        if reverse:
+            BusySlotService.clear_student(instance.pk)
+        else:
+            BusySlotService.clear_section(instance.pk)
+
+@receiver(post_save, sender=Schedule)
+def handle_schedule_saved(sender, instance, **kwargs):
+    BusySlotService.sync_schedule(instance)
+
+@receiver(post_save, sender=Quiz)
+def handle_quiz_saved(sender, instance, **kwargs):
+    BusySlotService.sync_quiz(instance)
+
+@receiver(post_save, sender=Period)
+@receiver(post_delete, sender=Period)
+def handle_period_changes(sender, **kwargs):
+    ScheduleImporter.invalidate_period_map()
+
+
+# Background workers
+
+@receiver(post_spawn)
+def start_tabula_pool(sender, proc_name, **kwargs):
+    # In sync mode tasks run in the calling process, which is not a worker
+    if tabula_pool.TABULA_POOL_WARM_UP and not Conf.SYNC:
+        tabula_pool.TabulaPool.start()
@@ -1,91 +1,275 @@
 # quiz_scheduling_app/tasks.py
 
+import logging
+import time
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Count
+from django.db.models import Count, Q
 import random
-from django.db import transaction  
-from .models import Notification, Vote, VoteOption, Quiz
+from django.db import transaction
+from . import events
+from .models import Broadcast, Notification, Section, Vote, VoteOption, Quiz
+from .services.busy_slot_service import BusySlotService
+from .services.digest_service import DigestService
+from .services.email_service import EmailService
+from .services.notification_service import NotificationService
+from .services.schedule_upload_service import ScheduleUploadService
+from .services.vote_expiry_service import VoteExpiryService
 
+logger = logging.getLogger(__name__)
+
+# Number of expired votes completed per transaction
+VOTE_EXPIRY_CHUNK_SIZE = getattr(settings, 'VOTE_EXPIRY_CHUNK_SIZE', 200)
+
+
+def complete_expired_votes(chunk_size=None):
+    """
+    Complete every expired but still active vote.
+
+    Votes are processed in chunks: each chunk tallies all of its options in
+    one grouped query, validates them against one query of its students'
+    quizzes, then writes the vote updates, quizzes and notifications with
+    bulk queries in a single transaction.
+    Returns processing statistics, including votes processed per second.
+    """
+    chunk_size = chunk_size or VOTE_EXPIRY_CHUNK_SIZE
+    started = time.perf_counter()
+    now = timezone.now()
 
-def complete_expired_votes():
     # Get all expired but still active votes
-    expired_votes = Vote.objects.filter(
-        is_active=True,
-        ends_at__lte=timezone.now()
+    expired_ids = list(
+        Vote.objects.filter(
+            is_active=True,
+            ends_at__lte=now
+        ).order_by('id').values_list('id', flat=True)
     )
 
-    for vote in expired_votes:
-        # Get vote options with their counts
-        options_with_counts = VoteOption.objects.filter(
-            vote=vote
-        ).annotate(
-            vote_count=Count('studentvote')
-        ).order_by('-vote_count')
-
-        if not options_with_counts:
+    processed = 0
+    for start in range(0, len(expired_ids), chunk_size):
+        chunk = expired_ids[start:start + chunk_size]
+        try:
+            processed += _complete_vote_chunk(chunk)
+        except Exception as e:
+            logger.error(f"Error completing votes {chunk[0]}-{chunk[-1]}: {str(e)}", exc_info=True)
             continue
 
-        # Get maximum vote count
-        max_votes = options_with_counts.first().vote_count
-
-        # Get all options with maximum votes
-        top_options = list(options_with_counts.filter(vote_count=max_votes))
-        
-        # Try each top option until we find one that works
-        valid_option = None
-        error_message = None
-        
-        for option in top_options:
-            is_valid, message = vote.validate_quiz_time(option)
-            if is_valid:
-                valid_option = option
-                break
-            error_message = message
-        
-        if not valid_option:
-            # If no valid option was found, mark vote as needing attention
+    elapsed = time.perf_counter() - started
+    stats = {
+        "processed": processed,
+        "seconds": round(elapsed, 3),
+        "votes_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    logger.info(
+        f"Completed {stats['processed']} expired votes in {stats['seconds']}s "
+        f"({stats['votes_per_second']} votes/s)"
+    )
+    return stats
+
+
+def process_vote_expiry_timer():
+    """
+    Entry point of the single vote expiry timer: completes the votes that
+    are due, then points the timer at the next pending deadline.
+    """
+    try:
+        return complete_expired_votes()
+    finally:
+        VoteExpiryService.rearm()
+
+
+def deliver_broadcast_chunk(broadcast_id, after_student_id=0):
+    """
+    Background job writing one chunk of a broadcast's receipts, then
+    queueing the job for the next chunk once this one is committed.
+    """
+    last_student_id = NotificationService.deliver_chunk(broadcast_id, after_student_id)
+    if last_student_id is not None:
+        transaction.on_commit(
+            lambda: NotificationService.queue_chunk(broadcast_id, last_student_id)
+        )
+    return last_student_id
+
+
+def broadcast_chunk_hook(task):
+    """Mark a broadcast as failed when one of its chunk jobs raised"""
+    if not task.success:
+        broadcast_id = task.args[0]
+        logger.error(f"Delivery of broadcast {broadcast_id} failed: {task.result}")
+        Broadcast.objects.filter(id=broadcast_id).update(delivery_status='failed')
+
+
+def process_upload_job(job_id):
+    """Background job parsing and importing an uploaded schedule PDF"""
+    return ScheduleUploadService.run(job_id)
+
+
+def upload_job_hook(task):
+    """Mark an upload job as failed when its task raised or timed out"""
+    if not task.success:
+        job_id = task.args[0]
+        logger.error(f"Upload job {job_id} failed: {task.result}")
+        ScheduleUploadService.mark_failed(job_id, str(task.result))
+
+
+def send_outbound_emails():
+    """Background job sending the email outbox; queued whenever an email is added"""
+    sent = EmailService.send_outbox()
+    if sent:
+        logger.info(f"Sent {sent} outbound emails")
+    return sent
+
+
+def send_notification_digests():
+    """Recurring job queueing the email digests of every due user"""
+    queued = DigestService.send_digests()
+    if queued:
+        logger.info(f"Queued {queued} notification digests")
+    return queued
+
+
+def _tally_top_options(vote_ids):
+    """Top voted options of every vote in a chunk, from one grouped query"""
+    options_with_counts = VoteOption.objects.filter(
+        vote_id__in=vote_ids
+    ).select_related('period').annotate(
+        vote_count=Count('studentvote')
+    ).order_by('vote_id', '-vote_count', 'id')
+
+    top_options = {}
+    for option in options_with_counts:
+        tied = top_options.setdefault(option.vote_id, [])
+        # Options arrive sorted by count, so only ties with the first are kept
+        if not tied or option.vote_count == tied[0].vote_count:
+            tied.append(option)
+    return top_options
+
+
+def _section_rosters(section_ids):
+    """{section_id: {student_id: university_id}} of several sections, from one query"""
+    rosters = {}
+    enrollments = Section.students.through.objects.filter(
+        section_id__in=section_ids
+    ).values_list('section_id', 'user_id', 'user__university_id')
+    for section_id, student_id, university_id in enrollments:
+        rosters.setdefault(section_id, {})[student_id] = university_id
+    return rosters
+
+
+def _book_quiz(busy_days, roster, option):
+    """Count a quiz queued in this chunk, so later votes of the chunk see it"""
+    day = busy_days.setdefault(option.date, {})
+    for student_id, university_id in roster.items():
+        busy = day.setdefault(student_id, {'university_id': university_id, 'quizzes': 0, 'periods': {}})
+        busy['quizzes'] += 1
+        busy['periods'][option.period_id] = busy['periods'].get(option.period_id, 0) + 1
+
+
+def _insert_quizzes(quizzes, rosters):
+    """Bulk insert quizzes and add their busy slots (bulk_create sends no signals)"""
+    Quiz.objects.bulk_create(quizzes, ignore_conflicts=True)
+
+    keys = Q()
+    for quiz in quizzes:
+        keys |= Q(section_id=quiz.section_id, date=quiz.date, period_id=quiz.period_id)
+    BusySlotService.add_quizzes(Quiz.objects.filter(keys), rosters)
+
+
+def _complete_vote_chunk(vote_ids):
+    with transaction.atomic():
+        # Lock the chunk so concurrent sweeps never complete a vote twice
+        votes = list(
+            Vote.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                id__in=vote_ids,
+                is_active=True
+            ).select_related('section__course', 'professor')
+        )
+        top_options = _tally_top_options([vote.id for vote in votes])
+        section_ids = {vote.section_id for vote in votes}
+        rosters = _section_rosters(section_ids)
+
+        # Quizzes of every student of the chunk on every candidate date, in
+        # one query; quizzes created by this chunk are added as they are queued
+        candidates = [option for options in top_options.values() for option in options]
+        busy_days = Vote.busy_quiz_days(
+            Section.students.through.objects.filter(section_id__in=section_ids).values('user_id'),
+            {option.date for option in candidates},
+            {option.period_id for option in candidates}
+        ) if candidates else {}
+
+        completed_votes = []
+        quizzes = []
+        notifications = []
+
+        for vote in votes:
+            options = top_options.get(vote.id)
+            if not options:
+                # Nothing to choose from: close the vote so it is not due forever
+                vote.is_active = False
+                completed_votes.append(vote)
+                notifications.append(Notification(
+                    recipient=vote.professor,
+                    sender=vote.professor,  # System notification
+                    notification_type='vote_error',
+                    title='Vote Completion Failed',
+                    message=f'Vote for {vote.section.course.code} ended without any options',
+                    section=vote.section
+                ))
+                continue
+
+            # Validate every top option at once and keep the first that works
+            roster = rosters.get(vote.section_id, {})
+            valid_option, error_message = vote.select_valid_option(options, busy_days, roster)
+
             vote.is_active = False
             vote.needs_room = True
-            vote.save()
-            
-            # Create notification for professor about the issue
-            Notification.objects.create(
-                recipient=vote.professor,
-                sender=vote.professor,  # System notification
-                notification_type='vote_error',
-                title='Vote Completion Failed',
-                message=f'Vote for {vote.section.course.code} could not be automatically completed: {error_message}',
-                section=vote.section
-            )
-            continue
+            completed_votes.append(vote)
 
-        try:
-            with transaction.atomic():
-                # Update vote with valid option
-                vote.selected_option = valid_option
-                vote.is_active = False
-                vote.needs_room = True
-                vote.save()
-
-                # If the vote has a room already (like for online quizzes), create the quiz
-                if vote.room:
-                    Quiz.objects.create(
-                        section=vote.section,
-                        date=valid_option.date,
-                        period=valid_option.period,
-                        room=vote.room,
-                        created_at=timezone.now()
-                    )
-
-                # Create a notification for professor to set room
-                Notification.objects.create(
+            if not valid_option:
+                # Notify the professor that the vote needs attention
+                notifications.append(Notification(
                     recipient=vote.professor,
                     sender=vote.professor,  # System notification
-                    notification_type='room_needed',
-                    title='Room Assignment Needed',
-                    message=f'Please assign a room for the quiz in {vote.section.course.code}',
+                    notification_type='vote_error',
+                    title='Vote Completion Failed',
+                    message=f'Vote for {vote.section.course.code} could not be automatically completed: {error_message}',
                     section=vote.section
-                )
-        except Exception as e:
-            print(f"Error completing vote {vote.id}: {str(e)}")
-            continue
\ No newline at end of file
+                ))
+                continue
+
+            vote.selected_option = valid_option
+
+            # If the vote has a room already (like for online quizzes), create the quiz
+            if vote.room:
+                quizzes.append(Quiz(
+                    section=vote.section,
+                    date=valid_option.date,
+                    period=valid_option.period,
+                    room=vote.room
+                ))
+                _book_quiz(busy_days, roster, valid_option)
+
+            # Ask the professor to set the room
+            notifications.append(Notification(
+                recipient=vote.professor,
+                sender=vote.professor,  # System notification
+                notification_type='room_needed',
+                title='Room Assignment Needed',
+                message=f'Please assign a room for the quiz in {vote.section.course.code}',
+                section=vote.section
+            ))
+
+        if completed_votes:
+            Vote.objects.bulk_update(completed_votes, ['selected_option', 'is_active', 'needs_room'])
+            # bulk_update sends no post_save, so publish the completions here
+            for vote in completed_votes:
+                if vote.selected_option_id and vote.room:
+                    events.publish(events.VOTE_COMPLETED, vote_id=vote.id)
+        if quizzes:
+            _insert_quizzes(quizzes, rosters)
+        if notifications:
+            Notification.objects.bulk_create(notifications)
+            professor_ids = [notification.recipient_id for notification in notifications]
+            transaction.on_commit(lambda: NotificationService.increment_unread_counts(professor_ids))
+            transaction.on_commit(lambda: NotificationService.notify_streams(professor_ids))
+
+    return len(completed_votes)
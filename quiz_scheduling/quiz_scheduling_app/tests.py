@@ -1,3 +1,1623 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from io import StringIO
+from unittest import mock
+from datetime import date, timedelta, time as dtime
+from types import SimpleNamespace
+from concurrent.futures.process import BrokenProcessPool
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_q.conf import Conf
+from django_q.models import Schedule as TaskSchedule
+from django_q.signals import post_spawn
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Broadcast, Course, Notification, OutboundEmail, Period, ProfessorAnnouncement, Quiz, Schedule, Section, StudentBusySlot, StudentVote, UploadJob, User, Vote, VoteOption
+from .pagination import FeedCursorPagination
+from .serializers import VoteSerializer
+from .services.common_time_service import CommonTimeService
+from .services.digest_service import DigestService
+from .services.email_service import EmailService
+from .services.pdf_processor import PDFProcessor
+from .services.schedule_importer import ScheduleImporter
+from .services.tabula_pool import TabulaPool
+from .services.notification_service import NotificationService
+from .services.parse_cache_service import ParseCacheService
+from .services.notification_stream_service import NotificationStreamService
+from .services.vote_expiry_service import VoteExpiryService
+from .services.vote_service import VoteService
+from .views import NotificationViewSet, SectionViewSet, VoteViewSet, notification_stream
+from .services import email_service, notification_stream_service, tabula_pool, vote_expiry_service
+from .management.commands import check_query_plans
+from . import events, tasks
+
+
+def setUpModule():
+    # Jobs queued with async_task run inline, whatever Q_CLUSTER says. Conf
+    # is read at import, so it is patched rather than overridden; the ORM
+    # broker is only created, never used, and needs no server.
+    patcher = mock.patch.multiple(Conf, SYNC=True, ORM='default')
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+
+def legacy_common_periods(section_id):
+    """Original VoteService.get_common_periods loop, used as the parity reference"""
+    section = Section.objects.get(id=section_id)
+    students = section.students.all()
+    available_periods = Period.objects.filter(number__lte=12).order_by('number')
+
+    common_periods = []
+    for day in ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday']:
+        for period in available_periods:
+            is_common = True
+            for student in students:
+                has_class = Schedule.objects.filter(
+                    section__in=student.enrolled_sections.all(),
+                    day=day,
+                    period=period
+                ).exists()
+                if has_class:
+                    is_common = False
+                    break
+
+            if is_common:
+                common_periods.append({
+                    'day': day,
+                    'period': period.number,
+                    'start_time': period.start_time.strftime('%H:%M'),
+                    'end_time': period.end_time.strftime('%H:%M'),
+                    'is_online': period.is_online
+                })
+    return common_periods
+
+
+def legacy_available_periods(section_id, date):
+    """Original CommonTimeService.get_available_periods loop, used as the parity reference"""
+    section = Section.objects.get(id=section_id)
+    students = section.students.all()
+    day_of_week = date.strftime('%A').lower()
+    periods = Period.objects.filter(number__lte=15).order_by('number')
+
+    for student in students:
+        if Quiz.objects.filter(section__students=student, date=date).count() >= 2:
+            return []
+
+    available_periods = []
+    for period in periods:
+        is_available = True
+        for student in students:
+            has_class = Schedule.objects.filter(
+                section__in=student.enrolled_sections.all(),
+                day=day_of_week,
+                period=period
+            ).exists()
+            has_quiz = Quiz.objects.filter(
+                section__students=student,
+                date=date,
+                period=period
+            ).exists()
+            if has_class or has_quiz:
+                is_available = False
+                break
+
+        if is_available:
+            available_periods.append({
+                'period_number': period.number,
+                'start_time': period.start_time.strftime('%H:%M'),
+                'end_time': period.end_time.strftime('%H:%M'),
+                'is_online': period.number >= 9,
+            })
+    return available_periods
+
+
+class ScheduleFixtureMixin:
+    @classmethod
+    def create_periods(cls):
+        cls.periods = {
+            number: Period.objects.create(
+                number=number,
+                start_time=dtime(6 + number),
+                end_time=dtime(6 + number, 50),
+                is_online=number >= 9
+            )
+            for number in range(1, 16)
+        }
+
+    @classmethod
+    def create_students(cls, count, prefix='s'):
+        return User.objects.bulk_create([
+            User(
+                university_id=f'{prefix}{i}',
+                username=f'{prefix}{i}',
+                email=f'{prefix}{i}@example.com',
+                user_type='student',
+                phone=''
+            )
+            for i in range(count)
+        ])
+
+
+class VoteServiceCommonPeriodsTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        course = Course.objects.create(code='CS101', name='Intro')
+        cls.section = Section.objects.create(course=course, section_number='1', activity_type='Lecture')
+        cls.lab = Section.objects.create(course=course, section_number='2', activity_type='Lab')
+        cls.other = Section.objects.create(course=course, section_number='3', activity_type='Tutorial')
+
+        students = cls.create_students(6)
+        cls.section.students.add(*students)
+        cls.lab.students.add(*students[:3])
+        cls.other.students.add(students[5])
+
+        Schedule.objects.create(section=cls.section, day='sunday', period=cls.periods[1])
+        Schedule.objects.create(section=cls.lab, day='monday', period=cls.periods[4])
+        Schedule.objects.create(section=cls.lab, day='tuesday', period=cls.periods[11])
+        Schedule.objects.create(section=cls.other, day='thursday', period=cls.periods[7])
+        # Outside the 1-12 window, must not affect the result
+        Schedule.objects.create(section=cls.other, day='thursday', period=cls.periods[14])
+
+    def test_matches_legacy_output(self):
+        self.assertEqual(
+            VoteService.get_common_periods(self.section.id),
+            legacy_common_periods(self.section.id)
+        )
+
+    def test_occupied_slots_are_excluded(self):
+        slots = {(p['day'], p['period']) for p in VoteService.get_common_periods(self.section.id)}
+        self.assertNotIn(('sunday', 1), slots)
+        self.assertNotIn(('monday', 4), slots)
+        self.assertNotIn(('tuesday', 11), slots)
+        self.assertNotIn(('thursday', 7), slots)
+        self.assertEqual(len(slots), 5 * 12 - 4)
+
+    def test_large_section_uses_constant_queries(self):
+        course = Course.objects.create(code='CS500', name='Large')
+        section = Section.objects.create(course=course, section_number='1', activity_type='Lecture')
+        students = self.create_students(1000, prefix='big')
+        section.students.add(*students)
+        Schedule.objects.create(section=section, day='wednesday', period=self.periods[2])
+
+        start = time.perf_counter()
+        with self.assertNumQueries(3):
+            result = VoteService.get_common_periods(section.id)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(result), 5 * 12 - 1)
+        self.assertLess(elapsed, 1.0)
+
+
+class CommonTimeServiceTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        course = Course.objects.create(code='CS110', name='Programming')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.lab = Section.objects.create(course=course, section_number='2', activity_type='Lab')
+        cls.other = Section.objects.create(course=course, section_number='3', activity_type='Tutorial')
+
+        students = cls.create_students(4)
+        cls.section.students.add(*students)
+        cls.lab.students.add(*students[:2])
+        cls.other.students.add(students[3])
+
+        # A Sunday a few weeks ahead, and the days after it
+        today = date.today()
+        cls.sunday = today + timedelta(days=(6 - today.weekday()) % 7 + 14)
+        Schedule.objects.create(section=cls.section, day='sunday', period=cls.periods[1])
+        Schedule.objects.create(section=cls.lab, day='monday', period=cls.periods[4])
+        Schedule.objects.create(section=cls.other, day='sunday', period=cls.periods[12])
+        Quiz.objects.create(section=cls.lab, date=cls.sunday, period=cls.periods[6], room='A1')
+        # Two quizzes on Tuesday leave no period free that day
+        Quiz.objects.create(section=cls.other, date=cls.sunday + timedelta(days=2), period=cls.periods[2], room='A1')
+        Quiz.objects.create(section=cls.other, date=cls.sunday + timedelta(days=2), period=cls.periods[9], room='A2')
+
+    def test_matches_legacy_output(self):
+        for offset in range(5):
+            day = self.sunday + timedelta(days=offset)
+            result = CommonTimeService.get_available_periods(self.section.id, day)
+            self.assertEqual(result['status'], 'success')
+            self.assertEqual(result['data'], legacy_available_periods(self.section.id, day), day)
+
+    def test_large_section_uses_constant_queries(self):
+        course = Course.objects.create(code='CS510', name='Large')
+        section = Section.objects.create(course=course, section_number='1', activity_type='Lecture')
+        section.students.add(*self.create_students(1000, prefix='big'))
+        Schedule.objects.create(section=section, day='sunday', period=self.periods[3])
+
+        with CaptureQueriesContext(connection) as small:
+            CommonTimeService.get_available_periods(self.section.id, self.sunday)
+        with CaptureQueriesContext(connection) as large:
+            result = CommonTimeService.get_available_periods(section.id, self.sunday)
+
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(result['data']), 14)
+
+    def common_periods(self, **params):
+        request = APIRequestFactory().get('/sections/common-periods/', params)
+        force_authenticate(request, user=self.professor)
+        return VoteViewSet.as_view({'get': 'common_periods'})(request, pk=self.section.id)
+
+    def test_range_matches_single_dates(self):
+        end = self.sunday + timedelta(days=6)
+        response = self.common_periods(start=str(self.sunday), end=str(end))
+
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(len(response.data['data']), 7)
+        for offset in range(7):
+            day = self.sunday + timedelta(days=offset)
+            self.assertEqual(
+                response.data['data'][day.strftime('%Y-%m-%d')],
+                CommonTimeService.get_available_periods(self.section.id, day)['data'],
+                day
+            )
+
+    def test_range_parameters_are_validated(self):
+        response = self.common_periods(start=str(self.sunday))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Both start and end parameters are required')
+
+        response = self.common_periods(start=str(self.sunday), end='2024-13-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Invalid date format. Use YYYY-MM-DD')
+
+        too_long = self.common_periods(start=str(self.sunday), end=str(self.sunday + timedelta(days=31)))
+        self.assertEqual(
+            (too_long.data['status'], too_long.data['message']), ('error', 'Date range cannot exceed 31 days')
+        )
+        self.assertEqual(
+            self.common_periods(start=str(self.sunday), end=str(self.sunday + timedelta(days=30))).data['status'],
+            'success'
+        )
+
+        reversed_range = self.common_periods(start=str(self.sunday), end=str(self.sunday - timedelta(days=1)))
+        self.assertEqual(
+            (reversed_range.data['status'], reversed_range.data['message']),
+            ('error', 'End date must not be before start date')
+        )
+
+
+class BusySlotSyncTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        course = Course.objects.create(code='CS150', name='Discrete Math')
+        cls.section = Section.objects.create(course=course, section_number='1', activity_type='Lecture')
+        cls.other = Section.objects.create(course=course, section_number='2', activity_type='Lab')
+        cls.students = cls.create_students(3)
+        cls.day = date.today() + timedelta(days=7)
+
+    def slots(self, student):
+        return sorted(
+            (str(slot.day or slot.date), slot.period.number)
+            for slot in StudentBusySlot.objects.filter(student=student).select_related('period')
+        )
+
+    def test_enrollment_changes_copy_the_section_slots(self):
+        Schedule.objects.create(section=self.section, day='sunday', period=self.periods[1])
+        Quiz.objects.create(section=self.section, date=self.day, period=self.periods[2], room='A1')
+        expected = [(str(self.day), 2), ('sunday', 1)]
+        s0, s1, s2 = self.students
+
+        self.section.students.add(s0)
+        s1.enrolled_sections.add(self.section)
+        self.assertEqual(self.slots(s0), expected)
+        self.assertEqual(self.slots(s1), expected)
+
+        self.section.students.remove(s0)
+        s1.enrolled_sections.remove(self.section)
+        self.assertEqual(self.slots(s0), [])
+        self.assertEqual(self.slots(s1), [])
+
+        self.section.students.add(s0, s1)
+        self.section.students.clear()
+        self.assertFalse(StudentBusySlot.objects.exists())
+
+        s2.enrolled_sections.add(self.section, self.other)
+        s2.enrolled_sections.clear()
+        self.assertEqual(self.slots(s2), [])
+
+    def test_schedule_changes_reach_the_roster(self):
+        self.section.students.add(*self.students[:2])
+        schedule = Schedule.objects.create(section=self.section, day='monday', period=self.periods[3])
+        self.assertEqual(self.slots(self.students[1]), [('monday', 3)])
+        self.assertEqual(self.slots(self.students[2]), [])
+
+        schedule.period = self.periods[4]
+        schedule.save()
+        self.assertEqual(self.slots(self.students[0]), [('monday', 4)])
+
+        schedule.delete()
+        self.assertFalse(StudentBusySlot.objects.exists())
+
+    def test_quiz_changes_reach_the_roster(self):
+        self.section.students.add(*self.students)
+        quiz = Quiz.objects.create(section=self.section, date=self.day, period=self.periods[5], room='A1')
+        self.assertEqual(self.slots(self.students[2]), [(str(self.day), 5)])
+
+        quiz.period = self.periods[6]
+        quiz.save()
+        self.assertEqual(StudentBusySlot.objects.filter(quiz=quiz, period=self.periods[6]).count(), 3)
+        self.assertEqual(StudentBusySlot.objects.count(), 3)
+
+        quiz.delete()
+        self.assertFalse(StudentBusySlot.objects.exists())
+
+    def test_rebuild_busy_slots_restores_the_table(self):
+        self.section.students.add(*self.students)
+        self.other.students.add(self.students[0])
+        Schedule.objects.create(section=self.section, day='sunday', period=self.periods[1])
+        Schedule.objects.create(section=self.other, day='tuesday', period=self.periods[2])
+        Quiz.objects.create(section=self.other, date=self.day, period=self.periods[3], room='A1')
+        expected = {student.id: self.slots(student) for student in self.students}
+
+        StudentBusySlot.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_busy_slots', stdout=out)
+        self.assertIn('5 rows', out.getvalue())
+        self.assertEqual({student.id: self.slots(student) for student in self.students}, expected)
+
+        # Only the given section is rebuilt
+        StudentBusySlot.objects.all().delete()
+        call_command('rebuild_busy_slots', section=[self.other.id], stdout=StringIO())
+        self.assertEqual(self.slots(self.students[0]), [(str(self.day), 3), ('tuesday', 2)])
+        self.assertEqual(self.slots(self.students[1]), [])
+
+
+class QuizConflictTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(4)
+        course = Course.objects.create(code='CS301', name='Algorithms')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+        lab = Section.objects.create(course=course, section_number='2', activity_type='Lab')
+        lab.students.add(*cls.students[:2])
+        tutorial = Section.objects.create(course=course, section_number='3', activity_type='Tutorial')
+        tutorial.students.add(*cls.students[1:3])
+
+        cls.day = date.today() + timedelta(days=7)
+        Quiz.objects.create(section=lab, date=cls.day, period=cls.periods[2], room='A1')
+        Quiz.objects.create(section=tutorial, date=cls.day, period=cls.periods[5], room='A2')
+
+        cls.vote = Vote.objects.create(section=cls.section, professor=cls.professor)
+        cls.same_time = VoteOption.objects.create(vote=cls.vote, date=cls.day, period=cls.periods[2])
+        cls.third_quiz = VoteOption.objects.create(vote=cls.vote, date=cls.day, period=cls.periods[3])
+        cls.free = VoteOption.objects.create(
+            vote=cls.vote, date=cls.day + timedelta(days=1), period=cls.periods[2]
+        )
+
+    def test_conflicts_of_each_option(self):
+        with self.assertNumQueries(1):
+            conflicts = self.vote.get_quiz_conflicts_for_options([self.same_time, self.third_quiz, self.free])
+
+        self.assertEqual(
+            [(c['university_id'], c['reason']) for c in conflicts[self.same_time.id]],
+            [('s0', 'same_time'), ('s1', 'same_time')]
+        )
+        self.assertEqual(
+            [(c['university_id'], c['reason']) for c in conflicts[self.third_quiz.id]],
+            [('s1', 'two_quizzes')]
+        )
+        self.assertEqual(conflicts[self.free.id], [])
+
+    def test_queries_do_not_grow_with_options_or_students(self):
+        with self.assertNumQueries(1):
+            self.vote.get_quiz_conflicts(self.free)
+        self.section.students.add(*self.create_students(200, prefix='more'))
+        with self.assertNumQueries(1):
+            self.vote.get_quiz_conflicts_for_options([self.same_time, self.third_quiz, self.free])
+
+    def test_first_valid_option_is_selected(self):
+        with self.assertNumQueries(1):
+            option, error = self.vote.select_valid_option([self.same_time, self.third_quiz, self.free])
+        self.assertEqual((option, error), (self.free, ""))
+
+    def test_no_valid_option_reports_the_last_error(self):
+        option, error = self.vote.select_valid_option([self.same_time, self.third_quiz])
+        self.assertIsNone(option)
+        self.assertEqual(error, 'Student s1 already has two quizzes on this date')
+
+    def test_confirm_vote_reports_conflicts(self):
+        request = APIRequestFactory().post(
+            f'/votes/{self.vote.id}/confirm_vote/', {'option_id': self.same_time.id, 'room': 'B1'}, format='json'
+        )
+        force_authenticate(request, user=self.professor)
+        response = VoteViewSet.as_view({'post': 'confirm_vote'})(request, pk=self.vote.id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_type'], 'quiz_conflict')
+        self.assertEqual(response.data['message'], 'Student s0 already has a quiz scheduled at this time')
+        self.assertEqual(
+            [c['student_id'] for c in response.data['conflicts']], [self.students[0].id, self.students[1].id]
+        )
+        self.vote.refresh_from_db()
+        self.assertTrue(self.vote.is_active)
+
+
+class ExpiredVoteFixtureMixin(ScheduleFixtureMixin):
+    @classmethod
+    def create_professor(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.course = Course.objects.create(code='CS401', name='Systems')
+        cls.day = date.today() + timedelta(days=7)
+
+    def expired_vote(self, students, periods, room='R1'):
+        """An overdue vote of a new section, with tied options in the given periods"""
+        section = Section.objects.create(
+            course=self.course, section_number=str(Section.objects.count()), activity_type='Lecture',
+            professor=self.professor
+        )
+        section.students.add(*students)
+        vote = Vote.objects.create(section=section, professor=self.professor, room=room)
+        for number in periods:
+            VoteOption.objects.create(vote=vote, date=self.day, period=self.periods[number])
+        Vote.objects.filter(id=vote.id).update(ends_at=timezone.now() - timedelta(minutes=1))
+        return vote
+
+
+class VoteExpirySweepTests(ExpiredVoteFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.create_professor()
+
+    def test_sweep_completes_votes_across_chunks(self):
+        votes = [self.expired_vote(self.create_students(2, prefix=f'c{i}-'), [2]) for i in range(5)]
+
+        with mock.patch.object(tasks, '_complete_vote_chunk', wraps=tasks._complete_vote_chunk) as chunk:
+            stats = tasks.complete_expired_votes(chunk_size=2)
+
+        self.assertEqual(chunk.call_count, 3)
+        self.assertEqual(stats['processed'], 5)
+        self.assertFalse(Vote.objects.filter(id__in=[vote.id for vote in votes], is_active=True).exists())
+        self.assertEqual(Quiz.objects.filter(date=self.day).count(), 5)
+        self.assertEqual(StudentBusySlot.objects.filter(quiz__isnull=False).count(), 10)
+
+    def test_vote_without_options_is_closed(self):
+        vote = self.expired_vote(self.create_students(1), [])
+
+        self.assertEqual(tasks.complete_expired_votes()['processed'], 1)
+
+        vote.refresh_from_db()
+        self.assertFalse(vote.is_active)
+        self.assertIsNone(vote.selected_option)
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.professor, notification_type='vote_error', section=vote.section
+        ).exists())
+        self.assertIsNone(VoteExpiryService.rearm())
+
+    def test_votes_completed_meanwhile_are_skipped(self):
+        first = self.expired_vote(self.create_students(1, prefix='a'), [2])
+        second = self.expired_vote(self.create_students(1, prefix='b'), [2])
+        # Completed by another sweep after the ids were listed
+        Vote.objects.filter(id=second.id).update(is_active=False)
+
+        self.assertEqual(tasks._complete_vote_chunk([first.id, second.id]), 1)
+        self.assertEqual(Quiz.objects.filter(section=second.section).count(), 0)
+
+    def test_shared_students_see_quizzes_queued_in_the_same_chunk(self):
+        students = self.create_students(3)
+        first = self.expired_vote(students, [2])
+        # Tied options: the first one clashes with the quiz queued above
+        second = self.expired_vote(students[:2], [2, 4])
+        # A third quiz that day is not allowed
+        third = self.expired_vote(students[1:], [6])
+
+        self.assertEqual(tasks._complete_vote_chunk([first.id, second.id, third.id]), 3)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual(first.selected_option.period.number, 2)
+        self.assertEqual(second.selected_option.period.number, 4)
+        self.assertIsNone(third.selected_option)
+        self.assertEqual(
+            Notification.objects.get(notification_type='vote_error').message,
+            'Vote for CS401 could not be automatically completed: Student s1 already has two quizzes on this date'
+        )
+        self.assertEqual(
+            sorted(Quiz.objects.values_list('period__number', flat=True)), [2, 4]
+        )
+
+    def test_queries_per_chunk_do_not_grow_with_votes(self):
+        small = [self.expired_vote(self.create_students(2, prefix=f's{i}-'), [2, 3]) for i in range(2)]
+        large = [self.expired_vote(self.create_students(3, prefix=f'l{i}-'), [2, 3]) for i in range(8)]
+
+        with CaptureQueriesContext(connection) as small_queries:
+            tasks._complete_vote_chunk([vote.id for vote in small])
+        with CaptureQueriesContext(connection) as large_queries:
+            processed = tasks._complete_vote_chunk([vote.id for vote in large])
+
+        self.assertEqual(processed, 8)
+        self.assertEqual(len(large_queries), len(small_queries))
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class VoteExpiryLockTests(ExpiredVoteFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        self.create_periods()
+        self.create_professor()
+
+    def test_votes_locked_by_another_sweep_are_skipped(self):
+        free = self.expired_vote(self.create_students(1, prefix='a'), [2])
+        locked = self.expired_vote(self.create_students(1, prefix='b'), [3])
+        is_locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Vote.objects.select_for_update().get(id=locked.id)
+                    is_locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            self.assertTrue(is_locked.wait(10))
+            self.assertEqual(tasks._complete_vote_chunk([free.id, locked.id]), 1)
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertTrue(Vote.objects.get(id=locked.id).is_active)
+        self.assertFalse(Vote.objects.get(id=free.id).is_active)
+
+
+class VoteExpiryTimerTests(ExpiredVoteFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.create_professor()
+
+    def timer(self):
+        return TaskSchedule.objects.get(name=vote_expiry_service.TIMER_NAME)
+
+    def test_deadlines_are_rounded_up_to_their_slot(self):
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.assertEqual(VoteExpiryService.slot_for(noon), noon)
+        self.assertEqual(VoteExpiryService.slot_for(noon + timedelta(seconds=1)), noon + timedelta(minutes=1))
+        self.assertEqual(VoteExpiryService.slot_for(noon + timedelta(seconds=59.5)), noon + timedelta(minutes=1))
+
+    def test_timer_is_only_moved_earlier(self):
+        deadline = VoteExpiryService.slot_for(timezone.now() + timedelta(hours=1))
+        self.assertEqual(VoteExpiryService.arm(deadline), deadline)
+        self.assertEqual(VoteExpiryService.arm(deadline + timedelta(minutes=10)), deadline)
+        self.assertEqual(self.timer().next_run, deadline)
+
+        earlier = deadline - timedelta(minutes=10)
+        VoteExpiryService.arm(earlier)
+        self.assertEqual(self.timer().next_run, earlier)
+        self.assertEqual(TaskSchedule.objects.filter(name=vote_expiry_service.TIMER_NAME).count(), 1)
+
+    def test_fired_timer_is_armed_again(self):
+        deadline = VoteExpiryService.slot_for(timezone.now() + timedelta(hours=1))
+        VoteExpiryService.arm(deadline)
+        # django-q keeps a fired ONCE schedule with repeats=0
+        TaskSchedule.objects.filter(name=vote_expiry_service.TIMER_NAME).update(repeats=0)
+
+        later = deadline + timedelta(hours=1)
+        VoteExpiryService.arm(later)
+        timer = self.timer()
+        self.assertEqual((timer.next_run, timer.repeats), (later, 1))
+
+    def test_rearm_points_at_the_next_deadline(self):
+        self.assertIsNone(VoteExpiryService.rearm())
+
+        section = Section.objects.create(course=self.course, section_number='1', activity_type='Lecture')
+        vote = Vote.objects.create(section=section, professor=self.professor, duration=2)
+        self.assertEqual(VoteExpiryService.rearm(), VoteExpiryService.slot_for(vote.ends_at))
+
+    def test_rearm_retries_overdue_votes_after_a_pause(self):
+        self.expired_vote([], [2])
+        before = timezone.now()
+        run_at = VoteExpiryService.rearm()
+
+        retry = timedelta(seconds=vote_expiry_service.VOTE_EXPIRY_RETRY_SECONDS)
+        self.assertGreaterEqual(run_at, before + retry)
+        self.assertLessEqual(
+            run_at, timezone.now() + retry + timedelta(seconds=vote_expiry_service.VOTE_EXPIRY_GRANULARITY_SECONDS)
+        )
+        self.assertEqual(self.timer().next_run, run_at)
+
+    def test_overdue_votes_do_not_delay_an_earlier_deadline(self):
+        self.expired_vote([], [])
+        section = Section.objects.create(course=self.course, section_number='due', activity_type='Lecture')
+        vote = Vote.objects.create(section=section, professor=self.professor, duration=2)
+        Vote.objects.filter(id=vote.id).update(ends_at=timezone.now() + timedelta(seconds=90))
+        vote.refresh_from_db()
+
+        self.assertEqual(VoteExpiryService.rearm(), VoteExpiryService.slot_for(vote.ends_at))
+
+
+class CheckQueryPlansTests(TestCase):
+    @unittest.skipUnless(
+        connection.vendor == 'sqlite', 'Other optimizers may pick full scans on the nearly empty test tables'
+    )
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('OK         expired active votes', out.getvalue())
+        self.assertIn('OK         next vote deadline', out.getvalue())
+        self.assertIn('OK         quiz conflicts of a roster', out.getvalue())
+        self.assertIn('OK         weekly busy slots of a section', out.getvalue())
+        self.assertIn('OK         users due a digest', out.getvalue())
+        self.assertNotIn('FULL SCAN', out.getvalue())
+
+    def test_full_scan_fails_the_check(self):
+        unindexed = [('votes by room', Vote._meta.db_table, Vote.objects.filter(room='A1'))]
+        out = StringIO()
+        with mock.patch.object(check_query_plans, 'hot_queries', return_value=unindexed):
+            with self.assertRaisesMessage(CommandError, 'votes by room'):
+                call_command('check_query_plans', stdout=out)
+        self.assertIn('FULL SCAN  votes by room', out.getvalue())
+
+
+class VoteSerializerQueryTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(5)
+        cls.course = Course.objects.create(code='CS201', name='Data Structures')
+
+    def create_votes(self, count):
+        offset = Section.objects.count()
+        for i in range(offset, offset + count):
+            section = Section.objects.create(
+                course=self.course, section_number=f'{i}', activity_type='Lecture', professor=self.professor
+            )
+            section.students.add(*self.students)
+            vote = Vote.objects.create(section=section, professor=self.professor)
+            options = [
+                VoteOption.objects.create(
+                    vote=vote, date=date.today() + timedelta(days=day), period=self.periods[day + 1]
+                )
+                for day in range(4)
+            ]
+            vote.selected_option = options[0]
+            vote.save(update_fields=['selected_option'])
+            for index, student in enumerate(self.students):
+                StudentVote.objects.create(vote=vote, student=student, option=options[index % 4])
+
+    def serialize(self, user):
+        votes = VoteSerializer.setup_eager_loading(Vote.objects.filter(professor=self.professor))
+        context = {'request': SimpleNamespace(user=user)}
+        return VoteSerializer(votes, many=True, context=context).data
+
+    def assert_constant_queries(self, user, expected):
+        self.create_votes(2)
+        with self.assertNumQueries(expected):
+            self.serialize(user)
+
+        self.create_votes(18)
+        with self.assertNumQueries(expected):
+            data = self.serialize(user)
+        self.assertEqual(len(data), 20)
+        return data
+
+    def test_student_list_uses_constant_queries(self):
+        student = self.students[1]
+        data = self.assert_constant_queries(student, 6)
+
+        for vote in data:
+            self.assertEqual(vote['student_vote']['option_id'], vote['options'][1]['id'])
+            self.assertEqual([option['vote_count'] for option in vote['options']], [2, 1, 1, 1])
+            self.assertEqual([option['has_voted'] for option in vote['options']], [False, True, False, False])
+
+    def test_faculty_list_uses_constant_queries(self):
+        data = self.assert_constant_queries(self.professor, 5)
+
+        for vote in data:
+            self.assertIsNone(vote['student_vote'])
+            voters = vote['options'][0]['voters']
+            self.assertEqual(
+                sorted(voter['university_id'] for voter in voters),
+                [self.students[0].university_id, self.students[4].university_id]
+            )
+
+
+class NotificationFeedTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.student = cls.create_students(1)[0]
+        course = Course.objects.create(code='CS301', name='Algorithms')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=cls.student,
+                sender=cls.professor,
+                notification_type='announcement',
+                title=f'Announcement {i}',
+                message='Hello',
+                section=cls.section
+            )
+            for i in range(45)
+        ])
+
+    def get_feed(self, user=None, **params):
+        request = APIRequestFactory().get('/notifications/', params)
+        force_authenticate(request, user=user or self.student)
+        return NotificationViewSet.as_view({'get': 'list'})(request).data
+
+    def test_pages_cover_the_feed_once(self):
+        seen = []
+        data = self.get_feed(limit=20)
+        latest = data['latest']
+        while True:
+            seen.extend(notification['id'] for notification in data['notifications'])
+            if not data['next']:
+                break
+            data = self.get_feed(limit=20, cursor=data['next'])
+
+        expected = list(
+            Notification.objects.filter(recipient=self.student)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(data['has_more'], False)
+
+        # Polling from the newest cursor only returns newer notifications
+        self.assertEqual(self.get_feed(since=latest)['notifications'], [])
+        new = Notification.objects.create(
+            recipient=self.student, sender=self.professor,
+            notification_type='announcement', title='New', message='Hello'
+        )
+        polled = self.get_feed(since=latest)
+        self.assertEqual([n['id'] for n in polled['notifications']], [new.id])
+        self.assertNotEqual(polled['latest'], latest)
+
+    def test_page_queries_do_not_grow_with_history(self):
+        with self.assertNumQueries(1):
+            data = self.get_feed(limit=20)
+        self.assertEqual(len(data['notifications']), 20)
+        self.assertNotIn('vote_details', data['notifications'][0])
+        self.assertNotIn('section_details', data['notifications'][0])
+
+        data = self.get_feed(limit=5, fields='section_details')
+        self.assertEqual(data['notifications'][0]['section_details']['id'], self.section.id)
+        self.assertNotIn('vote_details', data['notifications'][0])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get_feed(cursor='bogus')['status'], 'error')
+
+    def test_faculty_recipient_count_is_read_without_extra_queries(self):
+        Notification.objects.all().delete()
+        self.section.students.add(*self.create_students(3, prefix='r'))
+        for i in range(5):
+            with self.captureOnCommitCallbacks(execute=True):
+                NotificationService.send_announcement(self.section.id, self.professor.id, f'Title {i}', 'Body')
+
+        with self.assertNumQueries(1):
+            data = self.get_feed(user=self.professor, limit=100)
+        self.assertEqual(len(data['notifications']), 15)
+        self.assertEqual({n['recipient_count'] for n in data['notifications']}, {3})
+
+        # Announcements sent before counts were stored fall back to counting
+        ProfessorAnnouncement.objects.update(recipient_count=None)
+        data = self.get_feed(user=self.professor, limit=100)
+        self.assertEqual({n['recipient_count'] for n in data['notifications']}, {3})
+
+
+class BroadcastTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(4)
+        course = Course.objects.create(code='CS401', name='Compilers')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+
+    def get_feed(self, user):
+        request = APIRequestFactory().get('/notifications/')
+        force_authenticate(request, user=user)
+        return NotificationViewSet.as_view({'get': 'list'})(request).data['notifications']
+
+    def test_announcement_stores_content_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.send_announcement(self.section.id, self.professor.id, 'Midterm', 'Bring a pencil')
+
+        broadcast = Broadcast.objects.get()
+        self.assertEqual(broadcast.recipient_count, 4)
+        receipts = Notification.objects.filter(broadcast=broadcast)
+        self.assertEqual(receipts.count(), 4)
+        self.assertFalse(receipts.exclude(title='', message='').exists())
+
+        notification = self.get_feed(self.students[0])[0]
+        self.assertEqual(notification['title'], 'Midterm')
+        self.assertEqual(notification['message'], 'Bring a pencil')
+        self.assertEqual(self.get_feed(self.professor)[0]['recipient_count'], 4)
+
+    def test_convert_legacy_notifications(self):
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=student, sender=self.professor, notification_type='announcement',
+                title='Old', message='Legacy copy', section=self.section, announcement_id=7
+            )
+            for student in self.students
+        ] + [
+            Notification(
+                recipient=self.professor, sender=self.professor, notification_type='room_needed',
+                title='Room Assignment Needed', message='Please assign a room'
+            )
+        ])
+
+        call_command('convert_notifications_to_broadcasts', batch_size=3, stdout=StringIO())
+        call_command('convert_notifications_to_broadcasts', stdout=StringIO())
+
+        broadcast = Broadcast.objects.get()
+        self.assertEqual((broadcast.title, broadcast.message, broadcast.recipient_count), ('Old', 'Legacy copy', 4))
+        self.assertEqual(Notification.objects.filter(broadcast=broadcast, title='').count(), 4)
+        # Single recipient notifications are left as they are
+        self.assertEqual(Notification.objects.get(broadcast__isnull=True).title, 'Room Assignment Needed')
+        self.assertEqual(self.get_feed(self.students[2])[0]['message'], 'Legacy copy')
+
+    def test_convert_groups_fan_outs_by_gap(self):
+        def legacy(student, created_at):
+            notification = Notification.objects.create(
+                recipient=student, sender=self.professor, notification_type='announcement',
+                title='Old', message='Same text', section=self.section, announcement_id=7
+            )
+            Notification.objects.filter(id=notification.id).update(created_at=created_at)
+
+        start = timezone.now().replace(second=59, microsecond=0)
+        # One fan-out crossing a minute boundary, then the same text again later
+        legacy(self.students[0], start)
+        legacy(self.students[1], start + timedelta(seconds=2))
+        legacy(self.students[2], start + timedelta(seconds=4))
+        legacy(self.students[0], start + timedelta(hours=2))
+
+        call_command('convert_notifications_to_broadcasts', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            list(Broadcast.objects.order_by('created_at').values_list('recipient_count', flat=True)), [3, 1]
+        )
+
+    def test_announcement_is_delivered_by_background_chunks(self):
+        self.section.students.add(*self.create_students(6, prefix='extra'))
+
+        request = APIRequestFactory().post('/notifications/create-announcement/', {
+            'section_id': self.section.id, 'title': 'Lab', 'message': 'Moved to room 2'
+        })
+        force_authenticate(request, user=self.professor)
+        # 10 students in chunks of 4: three chained jobs, run inline by the sync cluster
+        with mock.patch('quiz_scheduling_app.services.notification_service.NOTIFICATION_FANOUT_BATCH_SIZE', 4), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = NotificationViewSet.as_view({'post': 'create_announcement'})(request)
+
+        request = APIRequestFactory().get('/notifications/broadcasts/status/')
+        force_authenticate(request, user=self.professor)
+        response = NotificationViewSet.as_view({'get': 'broadcast_status'})(request, pk=response.data['broadcast_id'])
+        broadcast = response.data['broadcast']
+        self.assertEqual(broadcast['delivery_status'], 'delivered')
+        self.assertEqual((broadcast['recipient_count'], broadcast['delivered_count']), (10, 10))
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            set(self.section.students.values_list('id', flat=True))
+        )
+
+    def test_retried_chunk_does_not_duplicate_receipts(self):
+        # Delivery jobs are only queued on commit, which never happens here
+        broadcast = NotificationService.create_announcement(self.section, self.professor, 'Lab', 'Cancelled')
+        self.assertEqual(broadcast.delivery_status, 'pending')
+
+        last_student_id = NotificationService.deliver_chunk(broadcast.id, 0, batch_size=3)
+        self.assertEqual(
+            NotificationService.deliver_chunk(broadcast.id, 0, batch_size=3), last_student_id
+        )
+        self.assertIsNone(NotificationService.deliver_chunk(broadcast.id, last_student_id, batch_size=3))
+
+        broadcast.refresh_from_db()
+        self.assertEqual(Notification.objects.filter(broadcast=broadcast).count(), 4)
+        self.assertEqual((broadcast.delivered_count, broadcast.delivery_status), (4, 'delivered'))
+
+
+class VoteEventTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(7)
+        course = Course.objects.create(code='CS501', name='Networks')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+
+    def call(self, action, method, data, **kwargs):
+        request = getattr(APIRequestFactory(), method)('/votes/', data, format='json')
+        force_authenticate(request, user=self.professor)
+        return VoteViewSet.as_view({method: action})(request, **kwargs)
+
+    def receipts(self, notification_type):
+        return Notification.objects.filter(notification_type=notification_type).count()
+
+    def test_each_vote_event_notifies_every_student_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call('create_vote', 'post', {
+                'section_id': self.section.id,
+                'options': [{'date': str(date.today() + timedelta(days=3)), 'period_id': self.periods[2].id}]
+            })
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(self.receipts('vote_created'), 7)
+
+        vote = Vote.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call(
+                'confirm_vote', 'post',
+                {'option_id': vote.options.get().id, 'room': 'A101'},
+                pk=vote.id
+            )
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(self.receipts('vote_completed'), 7)
+
+        # Saving the completed vote again publishes the event again, but it
+        # is only ever dispatched once
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.get().save()
+        self.assertEqual(self.receipts('vote_completed'), 7)
+        self.assertEqual(Broadcast.objects.count(), 2)
+
+    def test_event_published_twice_in_a_transaction_is_dispatched_once(self):
+        handler = mock.Mock(__name__='handler')
+        handlers = {events.VOTE_CREATED: [handler], events.VOTE_COMPLETED: [handler]}
+        with mock.patch.object(events, '_handlers', handlers):
+            with self.captureOnCommitCallbacks(execute=True):
+                events.publish(events.VOTE_CREATED, vote_id=1)
+                events.publish(events.VOTE_CREATED, vote_id=1)
+                events.publish(events.VOTE_COMPLETED, vote_id=1)
+            self.assertEqual(
+                [call.kwargs['event_key'] for call in handler.call_args_list],
+                ['vote_created:vote_id=1', 'vote_completed:vote_id=1']
+            )
+
+            # A copy queued in a rolled back savepoint does not hide the
+            # one published after it
+            handler.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        events.publish(events.VOTE_CREATED, vote_id=2)
+                        raise ValueError
+                except ValueError:
+                    pass
+                events.publish(events.VOTE_CREATED, vote_id=2)
+            self.assertEqual(handler.call_count, 1)
+
+
+class UnreadCountTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(3)
+        course = Course.objects.create(code='CS601', name='Security')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+
+    def setUp(self):
+        cache.clear()
+        self.student = self.students[0]
+
+    def call(self, action, method='get', **kwargs):
+        request = getattr(APIRequestFactory(), method)('/notifications/')
+        force_authenticate(request, user=self.student)
+        return NotificationViewSet.as_view({method: action})(request, **kwargs).data
+
+    def announce(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.send_announcement(self.section.id, self.professor.id, title, 'Body')
+
+    def test_badge_is_served_from_cache(self):
+        self.announce('First')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.call('unread_count')['unread_count'], 1)
+        # Cache hit: the notification table is not read
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call('unread_count')['unread_count'], 1)
+
+        self.announce('Second')
+        self.announce('Third')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call('unread_count')['unread_count'], 3)
+
+        notification = Notification.objects.filter(recipient=self.student).first()
+        self.call('mark_read', method='post', pk=notification.id)
+        self.call('mark_read', method='post', pk=notification.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call('unread_count')['unread_count'], 2)
+
+        self.call('mark_all_read', method='post')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call('unread_count')['unread_count'], 0)
+
+    def test_deleting_notifications_drops_the_counter(self):
+        self.announce('First')
+        self.assertEqual(self.call('unread_count')['unread_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.clear_professor_announcements(self.professor.id)
+        self.assertIsNone(cache.get(NotificationService.unread_count_key(self.student.id)))
+        self.assertEqual(self.call('unread_count')['unread_count'], 0)
+
+    def test_count_read_before_a_new_notification_is_not_kept(self):
+        real_count = QuerySet.count
+        announced = []
+
+        def count_then_announce(queryset):
+            # A fan-out commits while the badge is being recomputed
+            count = real_count(queryset)
+            if not announced:
+                announced.append(True)
+                self.announce('During recount')
+            return count
+
+        with mock.patch.object(QuerySet, 'count', count_then_announce):
+            self.assertEqual(NotificationService.get_unread_count(self.student.id), 0)
+        self.assertEqual(self.call('unread_count')['unread_count'], 1)
+
+
+class StandInNotificationBus:
+    """Records publishes and hands out plain queues, in place of the in-process bus"""
+
+    def __init__(self):
+        self.published = []
+        self.queues = {}
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue()
+        self.queues[user_id] = queue
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        self.queues.pop(user_id, None)
+
+    def publish(self, user_ids, message=None):
+        self.published.append(list(user_ids))
+        for user_id in user_ids:
+            if user_id in self.queues:
+                self.queues[user_id].put_nowait(message)
+
+
+class NotificationStreamTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(2)
+        course = Course.objects.create(code='CS701', name='Networks')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+
+    def setUp(self):
+        cache.clear()
+        self.bus = StandInNotificationBus()
+        NotificationStreamService.set_bus(self.bus)
+        self.addCleanup(NotificationStreamService.set_bus, None)
+
+    def announce(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.send_announcement(self.section.id, self.professor.id, title, 'Body')
+
+    def test_delivery_wakes_up_recipient_streams(self):
+        self.announce('Hello')
+        self.assertEqual(
+            sorted(user_id for user_ids in self.bus.published for user_id in user_ids),
+            sorted(student.id for student in self.students)
+        )
+
+    def test_stream_pushes_only_new_notifications(self):
+        self.announce('Old')
+        request = RequestFactory().get('/notifications/stream/')
+        request.user = self.students[0]
+
+        async def read_stream():
+            stream = NotificationStreamService.stream(request)
+            events = [await stream.__anext__()]
+            await sync_to_async(self.announce)('New')
+            events.append(await stream.__anext__())
+            await stream.aclose()
+            return events
+
+        retry, event = async_to_sync(read_stream)()
+
+        self.assertTrue(retry.startswith('retry:'))
+        notification = Notification.objects.filter(recipient=self.students[0]).latest('id')
+        self.assertIn(f"id: {FeedCursorPagination.encode_cursor(notification)}\n", event)
+        payload = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(payload['id'], notification.id)
+        self.assertEqual(payload['title'], 'New')
+        # Closing the stream unsubscribes it
+        self.assertEqual(self.bus.queues, {})
+
+    def test_stream_picks_up_writes_of_other_processes(self):
+        self.announce('Read meanwhile')
+        request = RequestFactory().get('/notifications/stream/')
+        request.user = self.students[0]
+
+        def write_elsewhere():
+            # A worker process inserts a notification (no bus wake-up here)
+            # while the user reads another, so the unread count is unchanged
+            with mock.patch.object(NotificationStreamService, 'publish'):
+                self.announce('New')
+            notification = Notification.objects.filter(recipient=self.students[0]).earliest('id')
+            NotificationService.mark_as_read(notification.id, self.students[0].id)
+
+        async def read_stream():
+            stream = NotificationStreamService.stream(request)
+            await stream.__anext__()
+            await sync_to_async(write_elsewhere)()
+            event = await asyncio.wait_for(stream.__anext__(), timeout=5)
+            await stream.aclose()
+            return event
+
+        with mock.patch.object(notification_stream_service, 'NOTIFICATION_STREAM_CHECK_SECONDS', 0.05):
+            event = async_to_sync(read_stream)()
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['title'], 'New')
+
+    def test_resumed_stream_replays_missed_notifications(self):
+        self.announce('Seen')
+        cursor = FeedCursorPagination.encode_cursor(Notification.objects.get(recipient=self.students[0]))
+        self.announce('Missed')
+        request = RequestFactory().get('/notifications/stream/')
+        request.user = self.students[0]
+
+        async def read_stream():
+            stream = NotificationStreamService.stream(request, cursor)
+            await stream.__anext__()
+            event = await asyncio.wait_for(stream.__anext__(), timeout=5)
+            await stream.aclose()
+            return event
+
+        event = async_to_sync(read_stream)()
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['title'], 'Missed')
+
+    def test_stream_ticket_opens_one_stream(self):
+        request = APIRequestFactory().post('/notifications/stream-ticket/')
+        force_authenticate(request, user=self.students[0])
+        ticket = NotificationViewSet.as_view({'post': 'stream_ticket'})(request).data['ticket']
+
+        def open_stream(query):
+            return async_to_sync(notification_stream)(RequestFactory().get('/notifications/stream/', query))
+
+        response = open_stream({'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Single use, and access tokens are not accepted in the URL
+        self.assertEqual(open_stream({'ticket': ticket}).status_code, 401)
+        access = str(RefreshToken.for_user(self.students[0]).access_token)
+        self.assertEqual(open_stream({'token': access}).status_code, 401)
+
+
+class EmailOutboxTests(TestCase):
+    def test_email_is_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            EmailService.send_otp_email('student@example.com', '123456')
+        # Nothing is sent while the request is still running
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, 'pending')
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@example.com'])
+        self.assertIn('123456', mail.outbox[0].body)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), ('sent', 1))
+        # The code is not kept once sent
+        self.assertEqual(email.body, '')
+
+    def test_batch_shares_one_connection(self):
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(to_email=f's{i}@example.com', subject='Code', body='Body') for i in range(5)
+        ])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            self.assertEqual(EmailService.send_outbox(batch_size=5), 5)
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failures_are_retried_with_backoff(self):
+        email = OutboundEmail.objects.create(to_email='s@example.com', subject='Code', body='Body')
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('Connection reset')
+        ):
+            self.assertEqual(EmailService.send_outbox(), 0)
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'Connection reset'))
+        self.assertEqual(email.body, 'Body')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Not due yet, and a retry run is scheduled
+        self.assertEqual(EmailService.send_outbox(), 0)
+        self.assertTrue(TaskSchedule.objects.filter(name='email-outbox-retry', repeats=1).exists())
+
+        OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(EmailService.send_outbox(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('sent', 2, ''))
+
+    def test_body_is_dropped_after_the_last_attempt(self):
+        email = OutboundEmail.objects.create(
+            to_email='s@example.com', subject='Code', body='Your OTP code is: 123456',
+            attempts=email_service.EMAIL_OUTBOX_MAX_ATTEMPTS - 1
+        )
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('Connection reset')
+        ):
+            EmailService.send_outbox()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body), ('failed', ''))
+
+
+class NotificationDigestTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(3)
+        course = Course.objects.create(code='CS801', name='Databases')
+        cls.section = Section.objects.create(
+            course=course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+        cls.section.students.add(*cls.students)
+
+    def announce(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.send_announcement(self.section.id, self.professor.id, title, f'{title} details')
+
+    def test_one_digest_per_user_per_window(self):
+        for title in ('Midterm', 'Lab', 'Project'):
+            self.announce(title)
+        Notification.objects.filter(recipient=self.students[2]).update(is_read=True)
+
+        # Nothing is due until the window has passed
+        self.assertEqual(DigestService.send_digests(), 0)
+
+        later = timezone.now() + timedelta(hours=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(DigestService.send_digests(now=later), 2)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(student.email for student in self.students[:2])
+        )
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, 'Quiz Scheduling - 3 new notifications')
+        for title in ('Midterm', 'Lab', 'Project'):
+            self.assertIn(f'- {title} (CS801)', message.body)
+
+        # Emailed notifications are not sent again
+        self.assertEqual(DigestService.send_digests(now=later), 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.students[0], emailed_at__isnull=True).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ScheduleUploadTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.student = cls.create_students(1)[0]
+        cls.course = Course.objects.create(code='CS901', name='Graphics')
+        cls.section = Section.objects.create(
+            course=cls.course, section_number='1', activity_type='Lecture', professor=cls.professor
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self, user):
+        request = APIRequestFactory().post('/sections/upload-schedule/', {
+            'file': SimpleUploadedFile('schedule.pdf', b'%PDF-1.4', content_type='application/pdf')
+        }, format='multipart')
+        force_authenticate(request, user=user)
+        # The job is queued on commit and run inline by the sync cluster
+        with self.captureOnCommitCallbacks(execute=True):
+            response = SectionViewSet.as_view({'post': 'upload_schedule'})(request)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['job']['status'], 'queued')
+
+        request = APIRequestFactory().get('/sections/upload-jobs/')
+        force_authenticate(request, user=user)
+        return SectionViewSet.as_view({'get': 'upload_status'})(request, pk=response.data['job']['id']).data['job']
+
+    def test_student_upload_is_imported_by_a_job(self):
+        rows = [{
+            'course_code': 'CS902', 'course_name': 'Vision', 'activity_type': 'Lab',
+            'section_number': '3', 'schedule': {'Sunday': [], 'Monday': []}
+        }]
+        with mock.patch.object(PDFProcessor, 'parse_student_schedule', return_value=rows) as parse:
+            job = self.upload(self.student)
+
+        self.assertEqual(parse.call_args.args[0], b'%PDF-1.4')
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['sections'][0]['course_code'], 'CS902')
+        self.assertEqual(
+            list(self.student.enrolled_sections.values_list('course__code', flat=True)), ['CS902']
+        )
+        # The PDF is removed once imported
+        self.assertFalse(UploadJob.objects.get(id=job['id']).file)
+
+    def test_repeat_upload_skips_parsing(self):
+        rows = [{
+            'course_code': 'CS903', 'course_name': 'Robotics', 'activity_type': 'Lecture',
+            'section_number': '1', 'schedule': {}
+        }]
+        with mock.patch.object(PDFProcessor, 'parse_student_schedule', return_value=rows) as parse:
+            self.upload(self.student)
+            job = self.upload(self.student)
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['sections'][0]['course_code'], 'CS903')
+        stats = ParseCacheService.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        # The same bytes parsed as a faculty schedule are a different entry
+        self.assertIsNone(ParseCacheService.get(ParseCacheService.digest(b'%PDF-1.4'), 'faculty'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for content in (b'a', b'b', b'c'):
+            ParseCacheService.put(ParseCacheService.digest(content), 'student', [])
+        ParseCacheService.get(ParseCacheService.digest(b'a'), 'student')
+
+        self.assertEqual(ParseCacheService.evict(max_entries=2), 1)
+        self.assertIsNone(ParseCacheService.get(ParseCacheService.digest(b'b'), 'student'))
+        self.assertEqual(ParseCacheService.get(ParseCacheService.digest(b'a'), 'student'), [])
+
+    def test_failed_parse_leaves_faculty_schedule_untouched(self):
+        with mock.patch.object(PDFProcessor, 'read_tables', side_effect=Exception('Not a schedule PDF')):
+            job = self.upload(self.professor)
+
+        self.assertEqual((job['status'], job['message']), ('failed', 'Not a schedule PDF'))
+        self.assertFalse(UploadJob.objects.get(id=job['id']).file)
+        self.section.refresh_from_db()
+        self.assertEqual(self.section.professor, self.professor)
+
+
+class ScheduleImportTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.student = cls.create_students(1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def rows(count, prefix='CS'):
+        return [{
+            'course_code': f'{prefix}{100 + i}', 'course_name': f'Course {i}', 'activity_type': 'Lecture',
+            'section_number': '1', 'schedule': {'Sunday': [1, 3], 'Tuesday': [2], 'Monday': [99]}
+        } for i in range(count)]
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        PDFProcessor.import_faculty_schedule(self.rows(2, prefix='WARM'), self.professor)
+        with CaptureQueriesContext(connection) as small:
+            PDFProcessor.import_faculty_schedule(self.rows(2, prefix='AB'), self.professor)
+        with CaptureQueriesContext(connection) as large:
+            result = PDFProcessor.import_faculty_schedule(self.rows(12, prefix='CD'), self.professor)
+
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Section.objects.filter(professor=self.professor).count(), 16)
+        self.assertEqual(Schedule.objects.filter(section__course__code__startswith='CD').count(), 36)
+        # Unknown period numbers are skipped
+        self.assertEqual(result['sections'][0]['schedule'], {'Sunday': '1,3', 'Tuesday': '2'})
+
+    def test_student_import_enrolls_and_builds_busy_slots(self):
+        PDFProcessor.import_student_schedule(self.rows(3), self.student)
+        PDFProcessor.import_student_schedule(self.rows(2), self.student)
+
+        self.assertEqual(
+            sorted(self.student.enrolled_sections.values_list('course__code', flat=True)), ['CS100', 'CS101']
+        )
+        busy = StudentBusySlot.objects.filter(student=self.student)
+        self.assertEqual(busy.count(), 6)
+        self.assertEqual(
+            set(busy.values_list('period__number', flat=True)), {1, 2, 3}
+        )
+        # Existing sections keep their professor
+        Section.objects.filter(course__code='CS100').update(professor=self.professor)
+        PDFProcessor.import_student_schedule(self.rows(1), self.student)
+        self.assertEqual(Section.objects.get(course__code='CS100').professor, self.professor)
+
+    def test_upload_keeps_classmates_busy_slots(self):
+        classmate = self.create_students(1, prefix='classmate')[0]
+        PDFProcessor.import_student_schedule(self.rows(2), classmate)
+        slot_ids = set(StudentBusySlot.objects.filter(student=classmate).values_list('id', flat=True))
+
+        rows = self.rows(2)
+        rows[0]['schedule'] = {'Sunday': [1, 3], 'Tuesday': [2], 'Thursday': [4]}
+        PDFProcessor.import_student_schedule(rows, self.student)
+
+        busy = StudentBusySlot.objects.filter(student=classmate)
+        self.assertTrue(slot_ids <= set(busy.values_list('id', flat=True)))
+        # Only the class the upload added is copied to the classmate
+        self.assertEqual(busy.count(), len(slot_ids) + 1)
+        self.assertTrue(busy.filter(day='thursday', period__number=4).exists())
+        self.assertEqual(StudentBusySlot.objects.filter(student=self.student).count(), 7)
+
+
+class RegistrarRosterImportTests(ScheduleFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_periods()
+        cls.professor = User.objects.create(
+            university_id='p1', username='p1', email='p1@example.com', user_type='faculty', phone=''
+        )
+        cls.students = cls.create_students(3)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'roster.csv')
+        with open(self.path, 'w', newline='') as roster:
+            roster.write(
+                'student_id,course_code,course_name,section_number,activity_type,professor_id,schedule\n'
+                's0,CS101,Intro,1,Lecture,p1,"Sunday:1,3;Tue:2"\n'
+                's1,CS101,Intro,1,Lecture,p1,"Sunday:1,3;Tue:2"\n'
+                's0,CS102,Data,2,Lab,,"Mon:4"\n'
+                's2,CS102,Data,2,Lab,,"Mon:4"\n'
+                'unknown,CS102,Data,2,Lab,,"Mon:4"\n'
+                's1,CS103,Bad,1,Lecture,,"Friday:1"\n'
+                ',CS104,No students,1,Lecture,,"Wed:5"\n'
+            )
+
+    def run_import(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_registrar_roster', self.path, chunk_size=2, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def assert_imported(self):
+        self.assertEqual(
+            sorted(Section.objects.values_list('course__code', 'professor__university_id')),
+            [('CS101', 'p1'), ('CS102', None), ('CS104', None)]
+        )
+        self.assertEqual(
+            sorted(Section.students.through.objects.values_list('section__course__code', 'user__university_id')),
+            [('CS101', 's0'), ('CS101', 's1'), ('CS102', 's0'), ('CS102', 's2')]
+        )
+        self.assertEqual(Schedule.objects.count(), 5)
+        self.assertEqual(
+            sorted(StudentBusySlot.objects.filter(student=self.students[0]).values_list('day', 'period__number')),
+            [('monday', 4), ('sunday', 1), ('sunday', 3), ('tuesday', 2)]
+        )
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+    def test_import_validates_rows_and_builds_busy_slots(self):
+        out, err = self.run_import()
+
+        self.assert_imported()
+        self.assertIn("Line 7: Unknown day: 'friday'", err)
+        self.assertIn("Imported 5 of 7 rows", out)
+        self.assertIn("1 rejected, 1 with an unregistered student", out)
+
+    def test_import_resumes_from_checkpoint(self):
+        insert_enrollments = ScheduleImporter.insert_enrollments
+        calls = []
+
+        def fail_second_chunk(pairs):
+            calls.append(pairs)
+            if len(calls) == 2:
+                raise RuntimeError('lost connection')
+            insert_enrollments(pairs)
+
+        with mock.patch.object(ScheduleImporter, 'insert_enrollments', side_effect=fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+        with open(f"{self.path}.checkpoint") as checkpoint:
+            self.assertEqual(json.load(checkpoint)['rows'], 2)
+
+        out, _ = self.run_import()
+
+        self.assertIn("Resuming after row 2", out)
+        self.assert_imported()
+
+
+class TabulaPoolTests(SimpleTestCase):
+    """Pool handling with stdlib functions standing in for the tabula parse"""
+
+    def setUp(self):
+        for name, value in (('TABULA_POOL_SIZE', 1), ('TABULA_POOL_WARM_UP', False), ('TABULA_POOL_TIMEOUT', 10)):
+            patcher = mock.patch.object(tabula_pool, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(TabulaPool.shutdown, kill=True)
+
+    def test_pool_size_zero_parses_in_this_process(self):
+        with mock.patch.object(tabula_pool, 'TABULA_POOL_SIZE', 0), \
+                mock.patch.object(tabula_pool, 'read_tables', return_value=['table']) as read_tables:
+            self.assertEqual(TabulaPool.read_pdf(b'%PDF-1.4', pages='all'), ['table'])
+
+        read_tables.assert_called_once_with(b'%PDF-1.4', {'pages': 'all'})
+        self.assertIsNone(TabulaPool._executor)
+
+    def test_broken_pool_is_restarted(self):
+        executor = TabulaPool.get_executor()
+        # A process dying mid-parse, as a JVM crash would
+        with self.assertRaises(BrokenProcessPool):
+            executor.submit(os._exit, 1).result()
+
+        self.assertEqual(TabulaPool.run(abs, -3), 3)
+        self.assertIsNot(TabulaPool._executor, executor)
+
+    def test_timed_out_parse_is_killed(self):
+        processes = list(TabulaPool.get_executor()._processes.values())
+        with mock.patch.object(tabula_pool, 'TABULA_POOL_TIMEOUT', 0.5):
+            with self.assertRaises(TimeoutError):
+                TabulaPool.run(time.sleep, 30)
+
+        self.assertIsNone(TabulaPool._executor)
+        for process in processes:
+            process.join(5)
+            self.assertFalse(process.is_alive())
+        self.assertEqual(TabulaPool.run(abs, -3), 3)
+
+    def test_pool_is_created_when_a_worker_starts(self):
+        with mock.patch.object(tabula_pool, 'TABULA_POOL_WARM_UP', True), \
+                mock.patch.object(TabulaPool, 'start') as start:
+            post_spawn.send(sender='django_q', proc_name='Process-1')
+            # Tasks run inline in sync mode, see setUpModule
+            start.assert_not_called()
+            with mock.patch.object(Conf, 'SYNC', False):
+                post_spawn.send(sender='django_q', proc_name='Process-1')
+            start.assert_called_once_with()
@@ -60,6 +60,7 @@ urlpatterns = [
     
     # Schedule endpoints
     path('sections/upload-schedule/', views.SectionViewSet.as_view({'post': 'upload_schedule'}), name='upload-schedule'),
+    path('sections/upload-jobs/<int:pk>/', views.SectionViewSet.as_view({'get': 'upload_status'}), name='upload-status'),
 
     path('students/quizzes/', views.get_student_quizzes, name='student-quizzes'),
     
@@ -84,8 +85,12 @@ urlpatterns = [
     path('notifications/', views.NotificationViewSet.as_view({'get': 'list'}), name='notification-list'),
     path('notifications/professor-announcements/', views.NotificationViewSet.as_view({'get': 'professor_announcements'}), name='professor-announcements'),
     path('notifications/create-announcement/', views.NotificationViewSet.as_view({'post': 'create_announcement'}), name='create-announcement'),
+    path('notifications/stream/', views.notification_stream, name='notification-stream'),
+    path('notifications/stream-ticket/', views.NotificationViewSet.as_view({'post': 'stream_ticket'}), name='notification-stream-ticket'),
+    path('notifications/unread-count/', views.NotificationViewSet.as_view({'get': 'unread_count'}), name='notification-unread-count'),
     path('notifications/mark-read/<int:pk>/', views.NotificationViewSet.as_view({'post': 'mark_read'}), name='mark-notification-read'),
     path('notifications/mark-all-read/', views.NotificationViewSet.as_view({'post': 'mark_all_read'}), name='mark-all-notifications-read'),
     path('notifications/clear-announcements/', views.NotificationViewSet.as_view({'delete': 'clear_announcements'}),name='clear-announcements'),
     path('notifications/delete-announcement/<int:pk>/', views.NotificationViewSet.as_view({'delete': 'delete_announcement'}), name='delete-announcement'),
+    path('notifications/broadcasts/<int:pk>/status/', views.NotificationViewSet.as_view({'get': 'broadcast_status'}), name='broadcast-status'),
 ]
\ No newline at end of file
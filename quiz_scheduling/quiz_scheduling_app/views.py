@@ -1,5 +1,4 @@
 from typing import Dict
-from django_q.tasks import schedule
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -10,8 +9,13 @@ from django.core.cache import cache  # Needed for password reset cache
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import authenticate
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework.exceptions import AuthenticationFailed
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 import pyotp
 import random
 from datetime import datetime, timedelta
@@ -32,7 +36,7 @@ logger = logging.getLogger(__name__)
 
 from .models import (
     ProfessorAnnouncement, Quiz, Schedule, Section, User, Course, Period, Vote, VoteOption, 
-    StudentVote, Notification, OTPCode
+    StudentVote, Notification, OTPCode, Broadcast, UploadJob
 )
 from .serializers import (
     PasswordResetSerializer, UserRegisterSerializer, CourseSerializer,
@@ -40,9 +44,12 @@ from .serializers import (
     NotificationSerializer, LoginSerializer, OTPVerificationSerializer,
     
 )
-from .services.pdf_processor import PDFProcessor
+from .services.schedule_upload_service import ScheduleUploadService
 from .services.notification_service import NotificationService
+from .services.notification_stream_service import NOTIFICATION_STREAM_TICKET_SECONDS, NotificationStreamService
 from .services.email_service import EmailService
+from .services.vote_expiry_service import VoteExpiryService
+from .pagination import FeedCursorPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -333,84 +340,41 @@ class SectionViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Process based on user type
-            if request.user.user_type == 'faculty':
-                # Start transaction
-                with transaction.atomic():
-                    print("just here")
-                    # Get all sections where this professor teaches
-                    old_sections = Section.objects.filter(professor=request.user)
-                    print(old_sections)
-                    
-                    # Get all votes associated with this professor
-                    votes_to_delete = Vote.objects.filter(professor=request.user)
-
-
-                    Notification.objects.filter(Q(notification_type='announcement'), sender_id=request.user.id).delete()
-                    Notification.objects.filter(section__in=old_sections, notification_type='announcement').delete()
-
-
-                    announcements_to_delete = ProfessorAnnouncement.objects.filter(professor=request.user)
-                    print(announcements_to_delete)
-                    ProfessorAnnouncement.objects.filter(professor=request.user).delete()
-
-                    # Notification.objects.filter(Q(notification_type='announcement'), professor = request.user)
-                    
-                    # For each vote, delete related data
-                    for vote in votes_to_delete:
-                        # Delete notifications related to the vote
-                        Notification.objects.filter(
-                            Q(notification_type='vote_created') |
-                            Q(notification_type='vote_completed'),
-                            vote=vote
-                        ).delete()
-                        
-                        
-                        # Delete student votes
-                        StudentVote.objects.filter(vote=vote).delete()
-                        
-                        # Delete vote options
-                        VoteOption.objects.filter(vote=vote).delete()
-                        
-                        # Delete quizzes related to the vote
-                        Quiz.objects.filter(
-                            section=vote.section,
-                            date__in=[opt.date for opt in vote.options.all()],
-                        ).delete()
-                    
-                    # Finally delete the votes
-                    votes_to_delete.delete()
-                    
-                    print("Votes to delete:", votes_to_delete.count())
-                    print("SQL Query:", votes_to_delete.query)
-
-                    # Clear professor assignments
-                    old_sections.update(professor=None)
-                    print("Deleted all")
-                    # Process new schedule
-                    result = PDFProcessor.process_faculty_schedule(
-                        pdf_file,
-                        request.user.university_id
-                    )
-            else:
-                print("we are here")
-                result = PDFProcessor.process_student_schedule(
-                    pdf_file,
-                    request.user.university_id
-                )
+            # Parsed and imported by a background job, see ScheduleUploadService
+            job = ScheduleUploadService.create_job(request.user, pdf_file)
+            return Response({
+                "status": "success",
+                "message": "Schedule uploaded, processing started",
+                "job": ScheduleUploadService.get_job_status(job)
+            }, status=status.HTTP_202_ACCEPTED)
 
-            return Response(result,
-                status=status.HTTP_200_OK if result["status"] == "success"
-                else status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error uploading PDF: {str(e)}", exc_info=True)
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['GET'])
+    def upload_status(self, request, pk=None):
+        """Progress of a schedule upload job of the current user"""
+        try:
+            job = UploadJob.objects.get(id=pk, user=request.user)
+            return Response({
+                "status": "success",
+                "job": ScheduleUploadService.get_job_status(job)
+            })
+        except UploadJob.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "Upload not found"
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"Error processing PDF: {str(e)}")
             return Response({
                 "status": "error",
                 "message": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        
 
 
 
@@ -462,6 +426,28 @@ class VoteViewSet(viewsets.ModelViewSet):
                     "message": "Not authorized for this section"
                 }, status=status.HTTP_403_FORBIDDEN)
 
+            # Week-at-a-glance: ?start=YYYY-MM-DD&end=YYYY-MM-DD
+            start_str = request.query_params.get('start')
+            end_str = request.query_params.get('end')
+            if start_str or end_str:
+                if not (start_str and end_str):
+                    return Response({
+                        "status": "error",
+                        "message": "Both start and end parameters are required"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                try:
+                    start = datetime.strptime(start_str, '%Y-%m-%d').date()
+                    end = datetime.strptime(end_str, '%Y-%m-%d').date()
+                except ValueError:
+                    return Response({
+                        "status": "error",
+                        "message": "Invalid date format. Use YYYY-MM-DD"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                result = CommonTimeService.get_available_periods_range(pk, start, end)
+                return Response(result)
+
             # Get date from query params
             date_str = request.query_params.get('date')
             if not date_str:
@@ -517,19 +503,18 @@ class VoteViewSet(viewsets.ModelViewSet):
                 )
 
             # Schedule automatic completion
-            schedule(
-                'quiz_scheduling_app.tasks.complete_expired_votes',
-                schedule_type='O',
-                next_run=timezone.now() + timezone.timedelta(days=duration)
-            )
+            VoteExpiryService.arm(vote.ends_at)
 
-            # Sending vote created notification to all students
-            NotificationService.send_vote_created_notification(vote)
+            # Students are notified in the background, queued by the post_save signal on Vote
+            broadcast_id = Broadcast.objects.filter(
+                vote=vote, notification_type='vote_created'
+            ).values_list('id', flat=True).first()
 
             return Response({
                 "status": "success",
                 "message": "Vote created successfully",
-                "vote": VoteSerializer(vote).data
+                "vote": VoteSerializer(vote).data,
+                "broadcast_id": broadcast_id
             })
 
         except Section.DoesNotExist:
@@ -557,6 +542,7 @@ class VoteViewSet(viewsets.ModelViewSet):
                     section__students=request.user,
                     is_active=True
                 )
+            votes = VoteSerializer.setup_eager_loading(votes)
 
             serializer = VoteSerializer(votes, many=True, context={'request': request})
             
@@ -585,6 +571,7 @@ class VoteViewSet(viewsets.ModelViewSet):
                     section__students=request.user,
                     is_active=False
                 )
+            votes = VoteSerializer.setup_eager_loading(votes)
 
             serializer = VoteSerializer(votes, many=True, context={'request': request})
             
@@ -623,18 +610,11 @@ class VoteViewSet(viewsets.ModelViewSet):
                 votes = votes.filter(section_id=section_id)
 
             # Include related data
-            votes = votes.select_related(
-                'section',
-                'section__course',
-                'selected_period'
-            ).prefetch_related(
-                'options',
-                'options__period'
-            )
+            votes = VoteSerializer.setup_eager_loading(votes)
 
             return Response({
                 "status": "success",
-                "votes": VoteSerializer(votes, many=True).data
+                "votes": VoteSerializer(votes, many=True, context={'request': request}).data
             })
         except Exception as e:
             return Response({
@@ -844,12 +824,13 @@ class VoteViewSet(viewsets.ModelViewSet):
 
             # Validate quiz time
             try:
-                is_valid, error_message = vote.validate_quiz_time(option)
-                if not is_valid:
+                conflicts = vote.get_quiz_conflicts(option)
+                if conflicts:
                     return Response({
                         "status": "error",
-                        "message": error_message,
-                        "error_type": "quiz_conflict"  # Add error type for specific handling
+                        "message": conflicts[0]['message'],
+                        "error_type": "quiz_conflict",  # Add error type for specific handling
+                        "conflicts": conflicts
                     }, status=status.HTTP_400_BAD_REQUEST)
 
                 # Start a transaction to ensure both vote and quiz are saved or neither is
@@ -869,12 +850,15 @@ class VoteViewSet(viewsets.ModelViewSet):
                         created_at=timezone.now()
                     )
 
-                # Send notifications
-                NotificationService.send_vote_completed_notification(vote)
+                # Students are notified in the background, queued by the post_save signal on Vote
+                broadcast_id = Broadcast.objects.filter(
+                    vote=vote, notification_type='vote_completed'
+                ).order_by('-id').values_list('id', flat=True).first()
 
                 return Response({
                     "status": "success",
-                    "message": "Quiz time confirmed successfully"
+                    "message": "Quiz time confirmed successfully",
+                    "broadcast_id": broadcast_id
                 })
 
             except ValidationError as e:
@@ -917,6 +901,7 @@ class VoteViewSet(viewsets.ModelViewSet):
             # Use transaction to ensure all related data is deleted
             with transaction.atomic():
                 # Delete related notifications
+                NotificationService.invalidate_unread_for(Notification.objects.filter(vote=vote))
                 Notification.objects.filter(
                     Q(notification_type='vote_created') | 
                     Q(notification_type='vote_completed'),
@@ -1075,6 +1060,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
             return Notification.objects.filter(
                 sender=user,
                 notification_type='announcement'
+            ).annotate(
+                # Stored once per announcement at fan-out
+                recipient_count=Subquery(
+                    ProfessorAnnouncement.objects.filter(
+                        id=OuterRef('announcement_id')
+                    ).values('recipient_count')[:1]
+                )
             ).order_by('-created_at').distinct()
         else:
             # For students, get all notifications where they are the recipient
@@ -1082,17 +1074,43 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['GET'])
     def list(self, request):
-        print("DEBUG: List method called")
-        print(f"DEBUG: Current user: {request.user.university_id}")
-        print(f"DEBUG: User type: {request.user.user_type}")
-        
-        notifications = self.get_queryset()
-        print(f"DEBUG: Found {notifications.count()} notifications")
-        
-        serializer = self.get_serializer(notifications, many=True)
+        """
+        Notifications feed, newest first, one page at a time.
+        ?cursor= pages back, ?since= polls for newer notifications and
+        ?fields=section_details,vote_details adds the nested details.
+        """
+        expand = {
+            name.strip()
+            for name in request.query_params.get('fields', '').split(',')
+            if name.strip() in NotificationSerializer.EXPANDABLE_FIELDS
+        }
+
+        notifications = self.get_queryset().select_related('sender', 'broadcast')
+        if 'section_details' in expand:
+            notifications = notifications.select_related('section__course', 'section__professor')
+        if 'vote_details' in expand:
+            notifications = notifications.prefetch_related(
+                Prefetch('vote', queryset=VoteSerializer.setup_eager_loading(Vote.objects.all()))
+            )
+
+        paginator = FeedCursorPagination()
+        try:
+            page = paginator.paginate_queryset(notifications, request)
+        except ValidationError as e:
+            return Response({
+                "status": "error",
+                "message": str(next(iter(e.detail.values())))
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = NotificationSerializer(
+            page,
+            many=True,
+            context={'request': request, 'expand': expand}
+        )
         return Response({
             "status": "success",
-            "notifications": serializer.data
+            "notifications": serializer.data,
+            **paginator.get_pagination_data()
         })
 
     @action(detail=False, methods=['POST'])
@@ -1123,35 +1141,16 @@ class NotificationViewSet(viewsets.ModelViewSet):
                     "message": "Not authorized for this section"
                 }, status=status.HTTP_403_FORBIDDEN)
 
-            with transaction.atomic():
-                # Create ProfessorAnnouncement record
-                announcement = ProfessorAnnouncement.objects.create(
-                    professor=request.user,
-                    section=section,
-                    title=title,
-                    message=message
-                )
-
-                # Create notifications for all students in section
-                notifications = []
-                for student in section.students.all():
-                    notification = Notification.objects.create(
-                        recipient=student,
-                        sender=request.user,
-                        notification_type='announcement',
-                        title=title,
-                        message=message,
-                        section=section,
-                        announcement_id=announcement.id  
-                    )
-                    notifications.append(notification)
-
-                print(f"DEBUG: Created announcement and {len(notifications)} notifications")
+            # Receipts are written in the background, see broadcast_status
+            broadcast = NotificationService.create_announcement(
+                section, request.user, title, message
+            )
 
-                return Response({
-                    "status": "success",
-                    "message": f"Announcement sent to {len(notifications)} students"
-                })
+            return Response({
+                "status": "success",
+                "message": f"Announcement sent to {broadcast.recipient_count} students",
+                "broadcast_id": broadcast.id
+            })
 
         except Section.DoesNotExist:
             return Response({
@@ -1165,6 +1164,26 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 "message": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+    @action(detail=True, methods=['GET'])
+    def broadcast_status(self, request, pk=None):
+        """Delivery progress of a broadcast sent by the current user"""
+        try:
+            broadcast = Broadcast.objects.get(id=pk, sender=request.user)
+            return Response({
+                "status": "success",
+                "broadcast": NotificationService.get_broadcast_status(broadcast)
+            })
+        except Broadcast.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "Broadcast not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     @action(detail=False, methods=['DELETE'])
     def clear_announcements(self, request):
         try:
@@ -1181,6 +1200,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 # Delete both announcements and notifications
                 announcements_count = announcements.count()
                 announcements.delete()
+                NotificationService.invalidate_unread_for(notifications)
+                Broadcast.objects.filter(
+                    sender=request.user,
+                    notification_type='announcement'
+                ).delete()
                 notifications.delete()
 
                 return Response({
@@ -1207,7 +1231,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
             announcements = ProfessorAnnouncement.objects.filter(
                 professor=request.user
-            ).select_related('section').order_by('-created_at')
+            ).select_related('section__course').order_by('-created_at')
 
             data = []
             for announcement in announcements:
@@ -1221,6 +1245,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
                         'section_number': announcement.section.section_number,
                     },
                     'created_at': announcement.created_at,
+                    'recipient_count': announcement.recipient_count,
                 })
 
             return Response({
@@ -1246,6 +1271,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
             
             with transaction.atomic():
                 # Delete related notifications
+                NotificationService.invalidate_unread_for(Notification.objects.filter(
+                    announcement_id=announcement.id,
+                    notification_type='announcement'
+                ))
+                Broadcast.objects.filter(
+                    announcement_id=announcement.id,
+                    notification_type='announcement'
+                ).delete()
                 Notification.objects.filter(
                     announcement_id=announcement.id,
                     notification_type='announcement'
@@ -1291,18 +1324,100 @@ class NotificationViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 
+    @action(detail=False, methods=['GET'])
+    def unread_count(self, request):
+        """Unread badge, served from the per-user cache counter"""
+        try:
+            return Response({
+                "status": "success",
+                "unread_count": NotificationService.get_unread_count(request.user.id)
+            })
+        except Exception as e:
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['POST'])
+    def stream_ticket(self, request):
+        """Single use ticket for opening the notification stream from EventSource"""
+        return Response({
+            "status": "success",
+            "ticket": NotificationStreamService.issue_ticket(request.user.id),
+            "expires_in": NOTIFICATION_STREAM_TICKET_SECONDS
+        })
+
     @action(detail=True, methods=['POST'])
     def mark_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
-        return Response(NotificationSerializer(notification).data)
+        if not notification.is_read:
+            NotificationService.mark_as_read(notification.id, notification.recipient_id)
+            notification.is_read = True
+        return Response(NotificationSerializer(notification, context={'request': request}).data)
 
     @action(detail=False, methods=['POST'])
     def mark_all_read(self, request):
-        self.get_queryset().update(is_read=True)
+        if request.user.user_type == 'student':
+            NotificationService.mark_all_as_read(request.user.id)
+        else:
+            notifications = self.get_queryset()
+            NotificationService.invalidate_unread_for(notifications)
+            notifications.update(is_read=True)
         return Response({'message': 'All notifications marked as read'})
-    
+
+
+async def notification_stream(request):
+    """
+    Server-sent events stream of the user's new notifications.
+
+    A plain async Django view (DRF views are sync only), so it has to be
+    served by ASGI to hold connections without tying up a worker thread.
+    EventSource cannot send headers, so browsers open it with ?ticket=
+    from notifications/stream-ticket/ instead of the JWT, which would
+    otherwise end up in access logs. Tickets are single use: get a new one
+    before reconnecting. Resumes from the Last-Event-ID header or ?since=
+    (a feed cursor); otherwise only notifications created from now on
+    are sent.
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user_id = await sync_to_async(NotificationStreamService.redeem_ticket)(ticket)
+        user = await User.objects.filter(id=user_id, is_active=True).afirst() if user_id else None
+        if user is None:
+            return JsonResponse(
+                {"status": "error", "message": "Invalid or expired stream ticket"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user = user
+    else:
+        try:
+            auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            return JsonResponse({"status": "error", "message": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return JsonResponse(
+                {"status": "error", "message": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user = auth[0]
+
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if cursor:
+        try:
+            FeedCursorPagination.decode_cursor(cursor)
+        except ValidationError:
+            return JsonResponse({"status": "error", "message": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        NotificationStreamService.stream(request, cursor),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class ProfileViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = UserSerializer